@@ -4,6 +4,7 @@ Will fall back to a default"""
 
 import json
 import os
+import threading
 from copy import deepcopy
 from pathlib import Path
 
@@ -19,6 +20,10 @@ CONFIG_PATH_FILE = os.path.join(Path.home(), ".shiver", "configuration.ini")
 # locate the template configuration file
 TEMPLATE_PATH_FILE = os.path.join(Path(__file__).resolve().parent, "configuration_template.json")
 
+# parsed configuration files: path -> ((modification time, size), ConfigUpdater)
+_config_cache = {}
+_config_cache_lock = threading.Lock()
+
 
 class Configuration:
     """Load and validate Configuration Data"""
@@ -48,6 +53,7 @@ class Configuration:
                         os.makedirs(os.path.dirname(self.config_file_path))
                     with open(self.config_file_path, "w", encoding="utf-8") as configfile:
                         self.template_config_ini.write(configfile)
+                    invalidate_config_cache()
                 self.config = ConfigUpdater(allow_no_value=True)
 
                 # the file already exists, check the version
@@ -58,6 +64,7 @@ class Configuration:
                     # update the whole configuration file and the version
                     with open(self.config_file_path, "w", encoding="utf-8") as configfile:
                         self.template_config_ini.write(configfile)
+                    invalidate_config_cache()
                     version_update = current_version
 
                 # parse the file
@@ -107,6 +114,7 @@ class Configuration:
         # write in the file
         with open(self.config_file_path, "w", encoding="utf8") as config_file:
             self.config.write(config_file)
+        invalidate_config_cache()
         self.valid = True
 
     def is_valid(self):
@@ -142,6 +150,7 @@ class Configuration:
             self.set_field_data(conf_variable, settings[conf_variable]["section"], settings[conf_variable]["value"])
         with open(self.config_file_path, "w", encoding="utf8") as config_file:
             self.config.write(config_file)
+        invalidate_config_cache()
         self.valid = True
 
     def set_field_data(self, name, section, value):
@@ -153,14 +162,38 @@ class Configuration:
             self.config[section][name] = value
 
 
+def invalidate_config_cache():
+    """forces the configuration file to be parsed again on the next get_data call"""
+    with _config_cache_lock:
+        _config_cache.clear()
+
+
+def get_config(config_file_path):
+    """returns the parsed configuration file, or None if it does not exist
+
+    The file is parsed once and kept in memory until its modification time or size changes"""
+    try:
+        stat = os.stat(config_file_path)
+    except OSError:
+        return None
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _config_cache_lock:
+        cached = _config_cache.get(config_file_path)
+        if cached and cached[0] == signature:
+            return cached[1]
+    config = ConfigUpdater()
+    # parse the file
+    config.read(config_file_path)
+    with _config_cache_lock:
+        _config_cache[config_file_path] = (signature, config)
+    return config
+
+
 def get_data(section, name=None):
     """retrieves the configuration data for a variable with name"""
     # default file path location
-    config_file_path = CONFIG_PATH_FILE
-    if os.path.exists(config_file_path):
-        config = ConfigUpdater()
-        # parse the file
-        config.read(config_file_path)
+    config = get_config(CONFIG_PATH_FILE)
+    if config is not None:
         try:
             if name and config.has_section(section):
                 if not config.has_option(section, name):
@@ -180,10 +213,54 @@ def get_data(section, name=None):
     return None
 
 
+def get_bool(section, name, default=False):
+    """retrieves a configuration variable as a boolean, or default if it is missing or invalid"""
+    value = get_data(section, name)
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        if value.strip().lower() in ("true", "yes", "on", "1"):
+            return True
+        if value.strip().lower() in ("false", "no", "off", "0"):
+            return False
+        logger.warning(f"Invalid boolean value {value} for {section} {name}")
+    return default
+
+
+def get_int(section, name, default=None):
+    """retrieves a configuration variable as an integer, or default if it is missing or invalid"""
+    value = get_data(section, name)
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        if value not in (None, ""):
+            logger.warning(f"Invalid integer value {value} for {section} {name}")
+    return default
+
+
+def get_float(section, name, default=None):
+    """retrieves a configuration variable as a float, or default if it is missing or invalid"""
+    value = get_data(section, name)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        if value not in (None, ""):
+            logger.warning(f"Invalid float value {value} for {section} {name}")
+    return default
+
+
+def get_list(section, name):
+    """retrieves a comma or line separated configuration variable as a list of strings"""
+    value = get_data(section, name)
+    if not isinstance(value, str):
+        return []
+    return [item.strip() for item in value.replace("\n", ",").split(",") if item.strip()]
+
+
 def get_data_logs():
     """Get the logs to keep in the generation of MDE workspaces"""
-    keep_logs = get_data("generate_tab.parameters", "keep_logs")
-    logs = get_data("generate_tab.parameters", "additional_logs")
+    keep_logs = get_bool("generate_tab.parameters", "keep_logs")
+    logs = get_list("generate_tab.parameters", "additional_logs")
 
     default_logs = [
         "SequenceName",
@@ -203,7 +280,5 @@ def get_data_logs():
 
     if keep_logs is True:
         return ""
-    if len(logs) > 0:
-        parts = logs.split(",")
-        default_logs.extend([p.strip() for p in parts])
+    default_logs.extend(logs)
     return default_logs
@@ -0,0 +1,144 @@
+"""The Shiver ApplyCorrectionsMD mantid algorithm"""
+
+# pylint: disable=no-name-in-module
+from mantid.api import (
+    AlgorithmFactory,
+    DataProcessorAlgorithm,
+    IMDEventWorkspaceProperty,
+    mtd,
+)
+from mantid.kernel import (
+    Direction,
+    FloatBoundedValidator,
+    Property,
+    StringListValidator,
+)
+from mantid.simpleapi import (
+    ApplyDetailedBalanceMD,
+    CloneMDWorkspace,
+    DebyeWallerFactorCorrectionMD,
+    DgsScatteredTransmissionCorrectionMD,
+    _create_algorithm_function,
+)
+
+from shiver.models.corrections import get_ions_list
+
+
+class ApplyCorrectionsMD(DataProcessorAlgorithm):
+    # pylint: disable=invalid-name,missing-function-docstring
+    """ApplyCorrectionsMD algorithm
+
+    The selected corrections are run one after the other by the existing correction algorithms, in
+    the order detailed balance, scattered transmission, magnetic form factor and Debye-Waller factor.
+    Only the first one copies the events, the next ones are applied in place on the output workspace.
+    """
+
+    def name(self):
+        return "ApplyCorrectionsMD"
+
+    def category(self):
+        return "Shiver"
+
+    def summary(self):
+        return (
+            "Applies any combination of detailed balance, scattered transmission, magnetic form factor and"
+            " Debye-Waller corrections to an MDEvent workspace, one after the other on a single copy of the events"
+        )
+
+    def PyInit(self):
+        self.declareProperty(
+            IMDEventWorkspaceProperty("InputWorkspace", defaultValue="", direction=Direction.Input),
+            doc="Input MDEvent workspace",
+        )
+
+        self.declareProperty(
+            name="Temperature",
+            defaultValue="",
+            direction=Direction.Input,
+            doc="Temperature value or sample log name for the detailed balance correction (empty: no correction)",
+        )
+
+        self.declareProperty(
+            name="ScatteredTransmissionCorrection",
+            defaultValue=False,
+            direction=Direction.Input,
+            doc="Apply the HYSPEC polarizer scattered transmission correction",
+        )
+
+        self.declareProperty(
+            name="ExponentFactor",
+            defaultValue=1.0 / 11.0,
+            validator=FloatBoundedValidator(lower=0.0),
+            direction=Direction.Input,
+            doc="Exponent factor of the scattered transmission correction",
+        )
+
+        # MagneticFormFactorCorrectionMD is not available in all the mantid versions
+        self.declareProperty(
+            name="IonName",
+            defaultValue="",
+            validator=StringListValidator([""] + get_ions_list()),
+            direction=Direction.Input,
+            doc="Ion name for the magnetic form factor correction (empty: no correction)",
+        )
+
+        self.declareProperty(
+            name="MeanSquaredDisplacement",
+            defaultValue=Property.EMPTY_DBL,
+            validator=FloatBoundedValidator(lower=0.0),
+            direction=Direction.Input,
+            doc="Mean squared displacement for the Debye-Waller factor correction (empty: no correction)",
+        )
+
+        self.declareProperty(
+            IMDEventWorkspaceProperty("OutputWorkspace", defaultValue="", direction=Direction.Output),
+            doc="Output MDEvent workspace",
+        )
+
+    def PyExec(self):
+        input_ws = self.getPropertyValue("InputWorkspace")
+        output_ws = self.getPropertyValue("OutputWorkspace")
+        temperature = self.getPropertyValue("Temperature").strip()
+        ion_name = self.getPropertyValue("IonName")
+        u2 = self.getProperty("MeanSquaredDisplacement").value
+
+        corrections = []
+        if temperature:
+            corrections.append((ApplyDetailedBalanceMD, {"Temperature": temperature}))
+        if self.getProperty("ScatteredTransmissionCorrection").value:
+            corrections.append(
+                (DgsScatteredTransmissionCorrectionMD, {"ExponentFactor": self.getProperty("ExponentFactor").value})
+            )
+        if ion_name:
+            from mantid.simpleapi import (  # pylint: disable=import-outside-toplevel
+                MagneticFormFactorCorrectionMD,
+            )
+
+            corrections.append((MagneticFormFactorCorrectionMD, {"IonName": ion_name}))
+        if u2 != Property.EMPTY_DBL:
+            corrections.append((DebyeWallerFactorCorrectionMD, {"MeanSquaredDisplacement": u2}))
+
+        if not corrections:
+            self.log().warning("No correction selected")
+            if output_ws != input_ws:
+                CloneMDWorkspace(InputWorkspace=input_ws, OutputWorkspace=output_ws)
+
+        # only the first correction copies the events, the next ones are applied in place on the output
+        for index, (correction, parameters) in enumerate(corrections):
+            correction(
+                InputWorkspace=input_ws if index == 0 else output_ws,
+                OutputWorkspace=output_ws,
+                **parameters,
+                startProgress=index / len(corrections),
+                endProgress=(index + 1) / len(corrections),
+            )
+
+        self.setProperty("OutputWorkspace", mtd[output_ws])
+
+
+AlgorithmFactory.subscribe(ApplyCorrectionsMD)
+
+# Puts function in simpleapi globals
+applycorrections = ApplyCorrectionsMD()
+applycorrections.initialize()
+_create_algorithm_function("ApplyCorrectionsMD", 1, applycorrections)
@@ -1,9 +1,17 @@
 """The Shiver ConvertDGSToSingleMDE mantid algorithm"""
 
 # pylint: disable=no-name-in-module
+import hashlib
+import json
+import math
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
 import numpy
 from mantid.api import (
     AlgorithmFactory,
+    AlgorithmManager,
     FileAction,
     IMDWorkspaceProperty,
     MatrixWorkspaceProperty,
@@ -14,6 +22,8 @@ from mantid.api import (
 )
 from mantid.kernel import (
     Direction,
+    IntArrayProperty,
+    IntBoundedValidator,
     Property,
     StringArrayProperty,
     StringListValidator,
@@ -22,6 +32,7 @@ from mantid.kernel import (
 from mantid.simpleapi import (
     CheckForSampleLogs,
     CNCSSuggestTIB,
+    CompressEvents,
     ConvertToMD,
     ConvertToMDMinMaxGlobal,
     CropWorkspace,
@@ -33,24 +44,31 @@ from mantid.simpleapi import (
     GetEi,
     GetEiT0atSNS,
     HYSPECSuggestTIB,
-    LoadEventNexus,
     LoadNexusMonitors,
     LoadNexusProcessed,
     MaskBTP,
     MaskDetectors,
     RotateInstrumentComponent,
+    SaveMD,
     SetGoniometer,
     _create_algorithm_function,
     mtd,
 )
 
 from shiver.configuration import get_data_logs
+from shiver.models.ei_t0_cache import EiT0Cache
+from shiver.models.run_index import read_run_metadata
 from shiver.models.utils import flatten_list
 
 
-def get_Ei_T0(data, data_m, Ei_supplied, T0_supplied, filenames, progress=None):
-    # pylint: disable=invalid-name,too-many-branches
-    """Determines the Ei and T0 values from the data supplied"""
+def get_Ei_T0(data, data_m, Ei_supplied, T0_supplied, filenames, progress=None, cache=None):
+    # pylint: disable=invalid-name,too-many-branches,too-many-arguments,too-many-positional-arguments
+    """Determines the Ei and T0 values from the data supplied
+
+    How they were determined ("user", "log" or "monitors") is added to the sample logs of the data, as
+    EiSource and T0Source. The values fitted from the monitors of the files are stored in the cache, if any,
+    and read back from it for the same files, without loading the monitors.
+    """
     if Ei_supplied == Property.EMPTY_DBL:
         Ei_supplied = None
     if T0_supplied == Property.EMPTY_DBL:
@@ -64,39 +82,207 @@ def get_Ei_T0(data, data_m, Ei_supplied, T0_supplied, filenames, progress=None):
         Ei = None
         if Ei_supplied:
             Ei = Ei_supplied
+            Ei_source = "user"
         elif "EnergyRequest" in run_obj:
             Ei = run_obj["EnergyRequest"].getStatistics().mean
+            Ei_source = "log"
         else:
             raise ValueError("EnergyRequest is not defined")
         T0 = T0_supplied if (T0_supplied is not None) else GetEi(data).Tzero
+        T0_source = "user" if (T0_supplied is not None) else "log"
     else:
         if (Ei_supplied is not None) and (T0_supplied is not None):
             Ei = Ei_supplied
             T0 = T0_supplied
+            Ei_source = T0_source = "user"
         else:
-            delete_monitors = False
-            if not data_m:
-                # load monitors
-                if progress:
-                    progress.report("Loading monitors")
-                delete_monitors = True
-                data_m = LoadNexusMonitors(filenames[0])
-                for i in range(1, len(filenames)):
-                    __temp = LoadNexusMonitors(filenames[i])
-                    data_m += __temp
-            # handles if the monitors are histograms or event
-            if data_m.id() == "EventWorkspace":
-                Ei, T0 = GetEiT0atSNS(data_m)  # event monitors
-            elif data_m.id() == "Workspace2D":
-                Ei, _, _, T0 = GetEi(data_m)  # histogram monitors
+            # only the monitors loaded from the files can be cached
+            use_cache = cache is not None and not data_m and len(filenames) > 0
+            cached = cache.get(filenames) if use_cache else None
+            if cached:
+                Ei, T0, Ei_source = cached
+                T0_source = Ei_source
             else:
-                raise RuntimeError("Invalid monitor Data type")
-            if delete_monitors:
-                DeleteWorkspace(data_m)
-
+                delete_monitors = False
+                if not data_m:
+                    # load monitors
+                    if progress:
+                        progress.report("Loading monitors")
+                    delete_monitors = True
+                    data_m = LoadNexusMonitors(filenames[0])
+                    for i in range(1, len(filenames)):
+                        __temp = LoadNexusMonitors(filenames[i])
+                        data_m += __temp
+                # handles if the monitors are histograms or event
+                if data_m.id() == "EventWorkspace":
+                    Ei, T0 = GetEiT0atSNS(data_m)  # event monitors
+                elif data_m.id() == "Workspace2D":
+                    Ei, _, _, T0 = GetEi(data_m)  # histogram monitors
+                else:
+                    raise RuntimeError("Invalid monitor Data type")
+                if delete_monitors:
+                    DeleteWorkspace(data_m)
+                Ei_source = T0_source = "monitors"
+                if use_cache:
+                    cache.set(filenames, Ei, T0, Ei_source)
+
+    data.mutableRun().addProperty("EiSource", Ei_source, True)
+    data.mutableRun().addProperty("T0Source", T0_source, True)
     return Ei, T0
 
 
+def get_hyspec_tof_window(Ei, msd):
+    # pylint: disable=invalid-name
+    """Return the time of flight range of the HYSPEC events for the incident energy and moderator to sample distance"""
+    tel = (39000 + msd + 4500) * 1000 / numpy.sqrt(Ei / 5.227e-6)
+    return tel - 1e6 / 120 - 470, tel + 1e6 / 120 + 470
+
+
+# margin (in microseconds) of the TOF window of the loaded events, the exact window is cropped after loading
+TOF_WINDOW_MARGIN = 100.0
+# maximum number of files of a group loaded at the same time
+MAX_LOADING_THREADS = 4
+
+
+def get_load_tof_window(filename, Ei_supplied=Property.EMPTY_DBL):
+    # pylint: disable=invalid-name
+    """Return the time of flight window of the events to load from a raw file, or None to load all the events
+
+    Only the HYSPEC events outside the window are known to be discarded. The window is computed from the
+    incident energy and the moderator to sample distance, read from the file without loading it.
+    """
+    try:
+        metadata = read_run_metadata(filename, logs=("msd", "EnergyRequest"))
+    except (OSError, KeyError, ValueError, IndexError):
+        return None
+    if metadata.get("instrument") != "HYSPEC":
+        return None
+    Ei = Ei_supplied
+    if Ei == Property.EMPTY_DBL:
+        Ei = metadata["daslogs"].get("energyrequest", {}).get("average_value")
+    msd = metadata["daslogs"].get("msd", {}).get("average_value")
+    if not Ei or Ei <= 0 or msd is None:
+        return None
+    tofmin, tofmax = get_hyspec_tof_window(Ei, msd)
+    return tofmin - TOF_WINDOW_MARGIN, tofmax + TOF_WINDOW_MARGIN
+
+
+def load_event_file(filename, allowed_logs, tof_window=None):
+    """Load a raw event file, keeping only the events in the time of flight window if any
+
+    The loader is a child algorithm, so it can run in any thread, and the workspace is not in the ADS.
+    """
+    alg = AlgorithmManager.createUnmanaged("LoadEventNexus")
+    alg.initialize()
+    alg.setChild(True)
+    alg.setProperty("Filename", filename)
+    if allowed_logs:
+        alg.setProperty("AllowList", allowed_logs)
+    if tof_window:
+        alg.setProperty("FilterByTofMin", tof_window[0])
+        alg.setProperty("FilterByTofMax", tof_window[1])
+    alg.setProperty("OutputWorkspace", "__load_event_file")
+    alg.execute()
+    return alg.getProperty("OutputWorkspace").value
+
+
+# default box splitting of ConvertToMD
+DEFAULT_SPLIT_INTO = 5
+DEFAULT_SPLIT_THRESHOLD = 1000
+# default tolerance of the event compression, in microseconds for TOF events,
+# or as a fraction of the energy transfer range for DeltaE events
+DEFAULT_TOF_TOLERANCE = 0.1
+DEFAULT_DELTAE_TOLERANCE_FRACTION = 0.001
+
+
+def get_preprocessed_detectors_name(workspace):
+    """Return the name of the preprocessed detectors table for the geometry and mask of the workspace
+
+    The name is a hash of the instrument, the positions (rounded to 0.1 mm) and rotations of the components that
+    are not detectors (source, sample, banks, tubes), the positions of one detector in a thousand, and the masked
+    detectors. Moving a bank or a tube moves its detectors, so the detectors are not read one by one, which would
+    take longer than computing the table again. ConvertToMD stores the table in the ADS under this name, so it is
+    computed once for all the runs with the same geometry.
+    """
+    instrument = workspace.getInstrument()
+    component_info = workspace.componentInfo()
+    # the detectors come first in the component indices
+    number_of_detectors = workspace.detectorInfo().size()
+    indices = list(range(0, number_of_detectors, 1000)) + list(range(number_of_detectors, component_info.size()))
+    positions = numpy.array([list(component_info.position(index)) for index in indices])
+    rotations = numpy.array(
+        [
+            [rotation.real(), rotation.imagI(), rotation.imagJ(), rotation.imagK()]
+            for rotation in (component_info.rotation(index) for index in indices)
+        ]
+    )
+    # adding 0 turns the rounded -0.0 into 0.0
+    positions = numpy.round(positions, 4) + 0.0
+    rotations = numpy.round(rotations, 6) + 0.0
+    masked_detectors = numpy.sort(numpy.asarray(workspace.maskedDetectorIDs(), dtype=numpy.int64))
+    key = {
+        "instrument": instrument.getName(),
+        "valid_from": str(instrument.getValidFromDate()),
+        "positions": hashlib.sha256(positions.tobytes()).hexdigest(),
+        "rotations": hashlib.sha256(rotations.tobytes()).hexdigest(),
+        "mask": hashlib.sha256(masked_detectors.tobytes()).hexdigest(),
+    }
+    digest = hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+    return f"__preprocessed_detectors_{digest[:16]}"
+
+
+def get_max_recursion_depth(number_of_events, number_of_dimensions, split_into=None, split_threshold=None):
+    """Return the box recursion depth needed for the leaf boxes to hold about split_threshold events
+
+    Each level splits a box in the product of split_into (or split_into to the power of the number of
+    dimensions for a single value). The depth is between 1 and 10.
+    """
+    split_into = list(split_into) if split_into is not None and len(split_into) else [DEFAULT_SPLIT_INTO]
+    if len(split_into) == 1:
+        split_into = split_into * number_of_dimensions
+    split_threshold = split_threshold or DEFAULT_SPLIT_THRESHOLD
+    boxes_per_level = math.prod(split_into)
+    if number_of_events <= split_threshold or boxes_per_level <= 1:
+        return 1
+    depth = math.ceil(math.log(number_of_events / split_threshold) / math.log(boxes_per_level))
+    return min(max(depth, 1), 10)
+
+
+def compress_events(workspace, output_workspace, tolerance=Property.EMPTY_DBL):
+    """Merge the events of an event workspace that are closer than the tolerance into weighted events
+
+    The tolerance is in the units of the workspace. If it is not set, 0.1 microsecond is used for TOF, and
+    0.1% of the range of the workspace for other units (energy transfer).
+    """
+    if workspace.id() != "EventWorkspace":
+        return workspace
+    if tolerance == Property.EMPTY_DBL:
+        if workspace.getAxis(0).getUnit().unitID() == "TOF":
+            tolerance = DEFAULT_TOF_TOLERANCE
+        else:
+            tolerance = DEFAULT_DELTAE_TOLERANCE_FRACTION * (workspace.getTofMax() - workspace.getTofMin())
+    return CompressEvents(InputWorkspace=workspace, Tolerance=tolerance, OutputWorkspace=output_workspace)
+
+
+def convert_to_mde_file(filenames, output_filename, cdsm_dict, mask_filename=None):
+    """Converts a group of raw files to an MDEvent workspace and saves it to disk
+
+    This is the unit of work of the parallel mode of GenerateDGSMDE. It runs in a separate process,
+    so the mask is passed as a filename, and the result is returned as the name of the saved file.
+    """
+    # the algorithm is only registered with mantid once this module has been imported
+    from mantid.simpleapi import (  # pylint: disable=import-outside-toplevel
+        ConvertDGSToSingleMDE as convert_dgs_to_single_mde,
+    )
+
+    if mask_filename:
+        cdsm_dict = dict(cdsm_dict, MaskWorkspace=LoadNexusProcessed(Filename=mask_filename))
+    md = convert_dgs_to_single_mde(Filenames="+".join(filenames), OutputWorkspace="__part", **cdsm_dict)
+    SaveMD(InputWorkspace=md, Filename=output_filename)
+    mtd.clear()
+    return output_filename
+
+
 class ConvertDGSToSingleMDE(PythonAlgorithm):
     # pylint: disable=invalid-name,missing-function-docstring
     """ConvertDGSToSingleMDE algorithm"""
@@ -211,6 +397,54 @@ class ConvertDGSToSingleMDE(PythonAlgorithm):
             doc="Comma separated list containing sample log name, minimum, maximum values",
         )
 
+        self.declareProperty(
+            name="CompressEvents",
+            defaultValue=False,
+            doc="Merge the events closer than CompressEventsTolerance into weighted events before the conversion."
+            " The TOF events are compressed after the filtering, so the pulse times are not needed",
+        )
+
+        self.declareProperty(
+            name="CompressEventsTolerance",
+            defaultValue=Property.EMPTY_DBL,
+            doc="Tolerance of the event compression, in microseconds for TOF data, in meV for DeltaE data."
+            " If empty, 0.1 microsecond for TOF data, 0.1% of the energy transfer range for DeltaE data",
+        )
+
+        self.declareProperty(
+            IntArrayProperty(name="SplitInto", values=[], direction=Direction.Input),
+            doc="Number of bins into which each box is split, one value or one per dimension."
+            f" If empty, {DEFAULT_SPLIT_INTO}",
+        )
+
+        self.declareProperty(
+            name="SplitThreshold",
+            defaultValue=Property.EMPTY_INT,
+            doc=f"Number of events in a box above which it is split. If empty, {DEFAULT_SPLIT_THRESHOLD}",
+        )
+
+        self.declareProperty(
+            name="MaxRecursionDepth",
+            defaultValue=2,
+            validator=IntBoundedValidator(lower=0),
+            doc="Maximum depth of the box structure. If 0, it is chosen from the number of events, so that the"
+            " smallest boxes hold about SplitThreshold events",
+        )
+
+        self.declareProperty(
+            name="CacheEiT0",
+            defaultValue=True,
+            doc="Keep the Ei and T0 fitted from the monitors in a cache in the user directory, to be reused"
+            " for the same files without loading the monitors",
+        )
+
+        self.declareProperty(
+            name="CachePreprocessedDetectors",
+            defaultValue=True,
+            doc="Keep the preprocessed detector positions in a hidden table workspace, to be reused for the"
+            " runs with the same instrument geometry and mask",
+        )
+
         self.declareProperty(
             IMDWorkspaceProperty(
                 "OutputWorkspace", defaultValue="", optional=PropertyMode.Mandatory, direction=Direction.Output
@@ -268,7 +502,15 @@ class ConvertDGSToSingleMDE(PythonAlgorithm):
         if psda == Property.EMPTY_DBL:
             psda = None
         Q_frame = self.getPropertyValue("QFrame")
+        cache_detectors = self.getProperty("CachePreprocessedDetectors").value
         additional_dimensions = self.getProperty("AdditionalDimensions").value
+        compress = self.getProperty("CompressEvents").value
+        compress_tolerance = self.getProperty("CompressEventsTolerance").value
+        split_into = self.getProperty("SplitInto").value
+        split_threshold = self.getProperty("SplitThreshold").value
+        if split_threshold == Property.EMPTY_INT:
+            split_threshold = None
+        max_recursion_depth = self.getProperty("MaxRecursionDepth").value
         output_name = self.getPropertyValue("OutputWorkspace")
 
         endrange = 100
@@ -283,12 +525,7 @@ class ConvertDGSToSingleMDE(PythonAlgorithm):
         if not data:
             filenames = list(flatten_list([filenames]))
             if loader == "Raw Event":
-                progress.report("Loading")
-                data = LoadEventNexus(filenames[0], AllowList=allowed_logs)
-                for i in range(1, len(filenames)):
-                    progress.report("Loading")
-                    __temp = LoadEventNexus(filenames[i], AllowList=allowed_logs)
-                    data += __temp
+                data = self._load_event_files(filenames, allowed_logs, Ei_supplied, progress)
             else:
                 progress.report("Loading")
                 data = LoadNexusProcessed(filenames[0])
@@ -321,7 +558,8 @@ class ConvertDGSToSingleMDE(PythonAlgorithm):
 
         # If units not DeltaE (from InputWorkspace) convert using DgsReduction
         if units != "DeltaE":
-            Ei, T0 = get_Ei_T0(data, data_m, Ei_supplied, T0_supplied, filenames, progress)
+            ei_t0_cache = EiT0Cache() if self.getProperty("CacheEiT0").value else None
+            Ei, T0 = get_Ei_T0(data, data_m, Ei_supplied, T0_supplied, filenames, progress, ei_t0_cache)
 
             # Instrument specific adjustments
             # HYSPEC specific:
@@ -329,9 +567,7 @@ class ConvertDGSToSingleMDE(PythonAlgorithm):
                 run_obj = data.getRun()
                 # get tofmin and tofmax, and filter out anything else
                 msd = run_obj["msd"].getStatistics().mean
-                tel = (39000 + msd + 4500) * 1000 / numpy.sqrt(Ei / 5.227e-6)
-                tofmin = tel - 1e6 / 120 - 470
-                tofmax = tel + 1e6 / 120 + 470
+                tofmin, tofmax = get_hyspec_tof_window(Ei, msd)
                 data = CropWorkspace(InputWorkspace=data, XMin=tofmin, XMax=tofmax)
                 if psda is None:
                     psda = run_obj["psda"].getStatistics().mean
@@ -363,6 +599,10 @@ class ConvertDGSToSingleMDE(PythonAlgorithm):
                 else:
                     tib = tib_window.split(",")
 
+            if compress:
+                progress.report(int(endrange * 0.45), "CompressEvents")
+                data = compress_events(data, "data", compress_tolerance)
+
             progress.report(int(endrange * 0.5), "DgsReduction")
 
             # DgsReduction
@@ -395,6 +635,8 @@ class ConvertDGSToSingleMDE(PythonAlgorithm):
 
         # Crop workspace
         dgs_data = CropWorkspaceForMDNorm(InputWorkspace=dgs_data, XMin=e_min, XMax=e_max)
+        if compress and units == "DeltaE":
+            dgs_data = compress_events(dgs_data, "dgs_data", compress_tolerance)
 
         # Convert to MD
         minValues, maxValues = ConvertToMDMinMaxGlobal(
@@ -414,7 +656,21 @@ class ConvertDGSToSingleMDE(PythonAlgorithm):
                     maxValues.append(float(value))
 
         progress.report(int(endrange * 0.8), "ConvertToMD")
-        convert_params = {"MaxRecursionDepth": 2}
+        if max_recursion_depth == 0:
+            if dgs_data.id() == "EventWorkspace":
+                number_of_events = dgs_data.getNumberEvents()
+            else:
+                number_of_events = dgs_data.getNumberHistograms() * dgs_data.blocksize()
+            max_recursion_depth = get_max_recursion_depth(number_of_events, len(minValues), split_into, split_threshold)
+            self.log().information(f"MaxRecursionDepth {max_recursion_depth} for {number_of_events} events")
+        convert_params = {"MaxRecursionDepth": max_recursion_depth}
+        if len(split_into):
+            convert_params["SplitInto"] = split_into
+        if split_threshold:
+            convert_params["SplitThreshold"] = split_threshold
+        preprocessed_detectors = "-"
+        if cache_detectors:
+            preprocessed_detectors = get_preprocessed_detectors_name(dgs_data)
         ConvertToMD(
             InputWorkspace=dgs_data,
             QDimensions="Q3D",
@@ -423,7 +679,7 @@ class ConvertDGSToSingleMDE(PythonAlgorithm):
             MinValues=minValues,
             MaxValues=maxValues,
             OtherDimensions=OtherDimensions,
-            PreprocDetectorsWS="-",
+            PreprocDetectorsWS=preprocessed_detectors,
             OutputWorkspace=output_name,
             **convert_params,
         )
@@ -436,6 +692,45 @@ class ConvertDGSToSingleMDE(PythonAlgorithm):
             pass
         progress.report(endrange, "Done")
 
+    def _load_event_files(self, filenames, allowed_logs, Ei_supplied, progress):
+        # pylint: disable=invalid-name
+        """Load and add the raw event files of a group
+
+        A few files are loaded at the same time in threads, and added in the order of the files to the first
+        one, in place, as soon as they are loaded. For HYSPEC, the events outside the time of flight window of
+        the incident energy are not loaded.
+        """
+        tof_window = get_load_tof_window(filenames[0], Ei_supplied)
+        if tof_window:
+            self.log().information(f"Loading the events between {tof_window[0]:.0f} and {tof_window[1]:.0f} us")
+        data = None
+        with ThreadPoolExecutor(max_workers=min(MAX_LOADING_THREADS, len(filenames))) as executor:
+            remaining = iter(filenames)
+            # only a few loaded files wait to be added at the same time
+            pending = deque(
+                executor.submit(load_event_file, filename, allowed_logs, tof_window)
+                for filename in islice(remaining, MAX_LOADING_THREADS)
+            )
+            while pending:
+                progress.report("Loading")
+                workspace = pending.popleft().result()
+                for filename in remaining:
+                    pending.append(executor.submit(load_event_file, filename, allowed_logs, tof_window))
+                    break
+                if data is None:
+                    data = workspace
+                    continue
+                plus = self.createChildAlgorithm("Plus", enableLogging=False)
+                plus.setProperty("LHSWorkspace", data)
+                plus.setProperty("RHSWorkspace", workspace)
+                plus.setProperty("OutputWorkspace", data)
+                plus.execute()
+                data = plus.getProperty("OutputWorkspace").value
+                del workspace
+        # in the ADS, as the workspaces loaded with the other loaders
+        mtd.addOrReplace("data", data)
+        return data
+
 
 AlgorithmFactory.subscribe(ConvertDGSToSingleMDE)
 
@@ -3,7 +3,7 @@
 # pylint: disable=no-name-in-module
 # pylint: disable=too-many-branches
 # pylint: disable=invalid-name
-import time
+import threading
 from typing import Tuple
 
 from mantid.api import AlgorithmManager, AlgorithmObserver, mtd
@@ -16,8 +16,9 @@ class CorrectionsModel:
     """Corrections table model"""
 
     def __init__(self) -> None:
-        self.algorithms_observers = set()  # need to add them here so they stay in scope
+        self.jobs = set()  # need to add them here so they stay in scope
         self.error_callback = None
+        self.progress_callback = None
         self.algorithm_running = False
 
     def apply(
@@ -30,9 +31,12 @@ class CorrectionsModel:
         u2: str = "",
         magentic_structure_factor: bool = False,
         ion_name: str = "",
-    ) -> None:
+    ) -> "CorrectionsJob":
         """Apply corrections.
 
+        The selected corrections are applied by ApplyCorrectionsMD in a single background job, the first
+        correction creates the output workspace and the next ones are applied in place.
+
         Parameters
         ----------
         ws_name : str
@@ -46,7 +50,13 @@ class CorrectionsModel:
 
         Return
         ------
-        None
+        CorrectionsJob
+            The running job, None if it could not be started
+
+        Raises
+        ------
+        ValueError
+            If the correction parameters are invalid, or the temperature is missing for the detailed balance
 
         Note
         ----
@@ -65,56 +75,31 @@ class CorrectionsModel:
         if magentic_structure_factor:
             output_ws_name = f"{output_ws_name}_MSF"
 
+        if not (detailed_balance or hyspec_polarizer_transmission or magentic_structure_factor or debye_waller_factor):
+            return None
+        if detailed_balance and not temperature.strip():
+            raise ValueError("The temperature is required for the detailed balance correction")
+
+        # all the corrections are applied by ApplyCorrectionsMD, with a single copy of the events
+        properties = {}
         if detailed_balance:
-            self.apply_detailed_balance(
-                ws_name,
-                temperature,
-                output_ws_name,
-            )
-        #
+            properties["Temperature"] = temperature
         if hyspec_polarizer_transmission:
-            input_ws_name = ws_name
-            if detailed_balance:
-                # wait for detailed balance to finish
-                while self.algorithm_running:
-                    time.sleep(0.1)
-                input_ws_name = output_ws_name
-            self.apply_scattered_transmission_correction(
-                input_ws_name,
-                output_ws_name,
-            )
-
+            properties.update(scattered_transmission_correction_step()[1])
+            properties["ScatteredTransmissionCorrection"] = True
         if magentic_structure_factor:
-            input_ws_name = ws_name
-            if hyspec_polarizer_transmission or detailed_balance:
-                # wait for others to finish
-                while self.algorithm_running:
-                    time.sleep(0.1)
-                input_ws_name = output_ws_name
-            self.apply_magnetic_form_factor_correction(
-                input_ws_name,
-                ion_name,
-                output_ws_name,
-            )
+            properties.update(magnetic_form_factor_correction_step(ion_name)[1])
         if debye_waller_factor:
-            input_ws_name = ws_name
-            if hyspec_polarizer_transmission or detailed_balance or magentic_structure_factor:
-                # wait for others to finish
-                while self.algorithm_running:
-                    time.sleep(0.1)
-                input_ws_name = output_ws_name
-            self.apply_debye_waller_factor_correction(
-                input_ws_name,
-                u2,
-                output_ws_name,
-            )
+            properties.update(debye_waller_factor_correction_step(u2)[1])
+        steps = [("ApplyCorrectionsMD", properties)]
+        return self.run_corrections(ws_name, steps, output_ws_name)
 
     def apply_detailed_balance(
         self,
         ws_name: str,
         temperature: str,
         output_ws_name: str,
-    ) -> None:
+    ) -> "CorrectionsJob":
         """Apply detailed balance to the workspace.
 
         Parameters
@@ -128,39 +113,16 @@ class CorrectionsModel:
 
         Returns
         -------
-        None
+        CorrectionsJob
+            The running job
         """
-        alg_obs = ApplyDetailedBalanceMDObserver(
-            parent=self,
-            ws_name=ws_name,
-        )
-        self.algorithms_observers.add(alg_obs)
-
-        self.algorithm_running = True
-
-        alg = AlgorithmManager.create("ApplyDetailedBalanceMD")
-
-        alg_obs.observeFinish(alg)
-        alg_obs.observeError(alg)
-
-        alg.initialize()
-        alg.setLogging(False)
-        try:
-            alg.setProperty("InputWorkspace", ws_name)
-            alg.setProperty("Temperature", temperature)
-            alg.setProperty("OutputWorkspace", output_ws_name)
-            alg.executeAsync()
-        except RuntimeError as err:
-            logger.error(str(err))
-            if self.error_callback:
-                self.error_callback(str(err))
-            self.algorithm_running = False
+        return self.run_corrections(ws_name, [detailed_balance_step(temperature)], output_ws_name)
 
     def apply_scattered_transmission_correction(
         self,
         ws_name: str,
         output_ws_name: str,
-    ) -> None:
+    ) -> "CorrectionsJob":
         """Apply DGSScatterTransmissionCorrection to the workspace.
 
         ref: IOP Conf. Series: Journal of Physics: Conf. Series 862 (2017) 012023
@@ -175,43 +137,17 @@ class CorrectionsModel:
 
         Returns
         -------
-        None
+        CorrectionsJob
+            The running job
         """
-        alg_obs = DgsScatteredTransmissionCorrectionMDObserver(
-            parent=self,
-            ws_name=ws_name,
-        )
-        self.algorithms_observers.add(alg_obs)
-
-        self.algorithm_running = True
-
-        exponent_factor = 1.0 / 11.0  # see ref above
-
-        logger.information(f"Applying DGS Scattered Transmission Correction with exponent factor {exponent_factor}")
-        alg = AlgorithmManager.create("DgsScatteredTransmissionCorrectionMD")
-
-        alg_obs.observeFinish(alg)
-        alg_obs.observeError(alg)
-
-        alg.initialize()
-        alg.setLogging(False)
-        try:
-            alg.setProperty("InputWorkspace", ws_name)
-            alg.setProperty("ExponentFactor", exponent_factor)
-            alg.setProperty("OutputWorkspace", output_ws_name)
-            alg.executeAsync()
-        except RuntimeError as err:
-            logger.error(str(err))
-            if self.error_callback:
-                self.error_callback(str(err))
-            self.algorithm_running = False
+        return self.run_corrections(ws_name, [scattered_transmission_correction_step()], output_ws_name)
 
     def apply_magnetic_form_factor_correction(
         self,
         ws_name: str,
         ion_name: str,
         output_ws_name: str,
-    ) -> None:
+    ) -> "CorrectionsJob":
         """Apply MagneticFormFactorCorrection to the workspace.
 
         Parameters
@@ -225,42 +161,17 @@ class CorrectionsModel:
 
         Returns
         -------
-        None
+        CorrectionsJob
+            The running job
         """
-
-        alg_obs = MagneticFormFactorCorrectionMDObserver(
-            parent=self,
-            ws_name=ws_name,
-        )
-        self.algorithms_observers.add(alg_obs)
-
-        self.algorithm_running = True
-
-        logger.information(f"Applying Magnetic Form Factor Correction with ion name {ion_name}")
-
-        alg = AlgorithmManager.create("MagneticFormFactorCorrectionMD")
-        alg_obs.observeFinish(alg)
-        alg_obs.observeError(alg)
-
-        alg.initialize()
-        alg.setLogging(False)
-        try:
-            alg.setProperty("InputWorkspace", ws_name)
-            alg.setProperty("IonName", ion_name)
-            alg.setProperty("OutputWorkspace", output_ws_name)
-            alg.execute()
-        except RuntimeError as err:
-            logger.error(str(err))
-            if self.error_callback:
-                self.error_callback(str(err))
-            self.algorithm_running = False
+        return self.run_corrections(ws_name, [magnetic_form_factor_correction_step(ion_name)], output_ws_name)
 
     def apply_debye_waller_factor_correction(
         self,
         ws_name: str,
         u2: str,
         output_ws_name: str,
-    ) -> None:
+    ) -> "CorrectionsJob":
         """Apply DebyeWallerFactorCorrection to the workspace.
 
         Parameters
@@ -274,35 +185,51 @@ class CorrectionsModel:
 
         Returns
         -------
-        None
+        CorrectionsJob
+            The running job
         """
+        return self.run_corrections(ws_name, [debye_waller_factor_correction_step(u2)], output_ws_name)
 
-        alg_obs = DebyeWallerFactorCorrectionMDObserver(
-            parent=self,
-            ws_name=ws_name,
-        )
-        self.algorithms_observers.add(alg_obs)
+    def run_corrections(self, ws_name: str, steps: list, output_ws_name: str) -> "CorrectionsJob":
+        """Run the correction algorithms one after the other in a background job.
 
-        self.algorithm_running = True
-
-        logger.information(f"Applying Debye-Waller Factor Correction with mean squared displacement value {u2}")
+        Parameters
+        ----------
+        ws_name : str
+            Workspace name
+        steps : list
+            List of (algorithm name, properties) of the corrections
+        output_ws_name : str
+            Output workspace name
 
-        alg = AlgorithmManager.create("DebyeWallerFactorCorrectionMD")
-        alg_obs.observeFinish(alg)
-        alg_obs.observeError(alg)
+        Returns
+        -------
+        CorrectionsJob
+            The running job, None if it could not be started
 
-        alg.initialize()
-        alg.setLogging(False)
+        Raises
+        ------
+        ValueError
+            If the correction parameters are invalid
+        """
+        job = CorrectionsJob(self, ws_name, steps, output_ws_name)
         try:
-            alg.setProperty("InputWorkspace", ws_name)
-            alg.setProperty("MeanSquaredDisplacement", u2)
-            alg.setProperty("OutputWorkspace", output_ws_name)
-            alg.execute()
+            # the parameters are validated before starting the background job
+            job.prepare()
         except RuntimeError as err:
             logger.error(str(err))
             if self.error_callback:
                 self.error_callback(str(err))
-            self.algorithm_running = False
+            return None
+        self.jobs.add(job)
+        self.algorithm_running = True
+        job.start()
+        return job
+
+    def cancel(self) -> None:
+        """Cancel the running corrections"""
+        for job in list(self.jobs):
+            job.cancel()
 
     def connect_error_message(self, callback):
         """Set the callback function for error messages.
@@ -318,120 +245,32 @@ class CorrectionsModel:
         """
         self.error_callback = callback
 
-    def apply_detailed_balance_finished(
-        self,
-        ws_name: str,
-        alg: "ApplyDetailedBalanceMDObserver",
-        error: bool = False,
-        msg="",
-    ) -> None:
-        """Call when ApplyDetailedBalanceMD finishes.
+    def connect_progress(self, callback):
+        """Set the callback function for the progress of the corrections.
 
         Parameters
         ----------
-        ws_name : str
-            Workspace name
-        alg : ApplyDetailedBalanceMDObserver
-            Observer
-        error : bool, optional
-            Error flag, by default False
-        msg : str, optional
-            Error message, by default ""
-
-        Returns
-        -------
-        None
-        """
-        if error:
-            logger.error(f"Error in ApplyDetailedBalanceMD for {ws_name}")
-            if self.error_callback:
-                self.error_callback(msg)
-        else:
-            logger.information(f"Finished ApplyDetailedBalanceMD for {ws_name}")
-        self.algorithms_observers.remove(alg)
-        self.algorithm_running = False
-
-    def apply_scattered_transmission_correction_finished(
-        self,
-        ws_name: str,
-        alg: "DgsScatteredTransmissionCorrectionMDObserver",
-        error: bool = False,
-        msg="",
-    ) -> None:
-        """Call when DgsScatteredTransmissionCorrectionMD finishes.
-
-        Parameters
-        ----------
-        ws_name : str
-            Workspace name
-        alg : DgsScatteredTransmissionCorrectionMDObserver
-            Observer
-        error : bool, optional
-            Error flag, by default False
-        msg : str, optional
-            Error message, by default ""
-
-        Returns
-        -------
-        None
-        """
-        if error:
-            logger.error(f"Error in DgsScatteredTransmissionCorrectionMD for {ws_name}")
-            if self.error_callback:
-                self.error_callback(msg)
-        else:
-            logger.information(f"Finished DgsScatteredTransmissionCorrectionMD for {ws_name}")
-        self.algorithms_observers.remove(alg)
-        self.algorithm_running = False
-
-    def apply_magnetic_form_factor_correction_finished(
-        self,
-        ws_name: str,
-        alg: "MagneticFormFactorCorrectionMDObserver",
-        error: bool = False,
-        msg="",
-    ) -> None:
-        """Call when MagneticFormFactorCorrectionMD finishes.
-
-        Parameters
-        ----------
-        ws_name : str
-            Workspace name
-        alg : MagneticFormFactorCorrectionMDObserver
-            Observer
-        error : bool, optional
-            Error flag, by default False
-        msg : str, optional
-            Error message, by default ""
+        callback : function
+            Callback function, called with the fraction done and a message, and with 1 when a job finishes
 
         Returns
         -------
         None
         """
-        if error:
-            logger.error(f"Error in MagneticFormFactorCorrectionMD for {ws_name}")
-            if self.error_callback:
-                self.error_callback(msg)
-        else:
-            logger.information(f"Finished MagneticFormFactorCorrectionMD for {ws_name}")
-        self.algorithms_observers.remove(alg)
-        self.algorithm_running = False
+        self.progress_callback = callback
 
-    def apply_debye_waller_factor_correction_finished(
+    def corrections_finished(
         self,
-        ws_name: str,
-        alg: "DebyeWallerFactorCorrectionMDObserver",
+        job: "CorrectionsJob",
         error: bool = False,
         msg="",
     ) -> None:
-        """Call when DebyeWallerFactorCorrectionMD finishes.
+        """Call when a corrections job finishes.
 
         Parameters
         ----------
-        ws_name : str
-            Workspace name
-        alg : DebyeWallerFactorCorrectionMDObserver
-            Observer
+        job : CorrectionsJob
+            The finished job
         error : bool, optional
             Error flag, by default False
         msg : str, optional
@@ -442,13 +281,20 @@ class CorrectionsModel:
         None
         """
         if error:
-            logger.error(f"Error in DebyeWallerFactorCorrectionMD for {ws_name}")
+            logger.error(f"Error in {msg}")
             if self.error_callback:
                 self.error_callback(msg)
+            status = f"Failed corrections of {job.ws_name}"
+        elif job.cancelled:
+            status = f"Corrections of {job.ws_name} cancelled"
+            logger.information(status)
         else:
-            logger.information(f"Finished DebyeWallerFactorCorrectionMD for {ws_name}")
-        self.algorithms_observers.remove(alg)
-        self.algorithm_running = False
+            status = f"Finished corrections of {job.ws_name}"
+            logger.information(status)
+        self.jobs.discard(job)
+        self.algorithm_running = bool(self.jobs)
+        if self.progress_callback:
+            self.progress_callback(1.0, status)
 
     def get_ws_alg_histories(self, ws_name: str) -> list:
         """Get algorithm histories of the workspace.
@@ -463,9 +309,15 @@ class CorrectionsModel:
         list
             List of algorithm histories
         """
-        if mtd.doesExist(ws_name):
-            return mtd[ws_name].getHistory().getAlgorithmHistories()
-        return []
+        if not mtd.doesExist(ws_name):
+            return []
+        alg_histories = []
+        for alg_history in mtd[ws_name].getHistory().getAlgorithmHistories():
+            alg_histories.append(alg_history)
+            # the corrections applied together are recorded as children of ApplyCorrectionsMD
+            if alg_history.name() == "ApplyCorrectionsMD":
+                alg_histories.extend(alg_history.getChildHistories())
+        return alg_histories
 
     def has_apply_detailed_balance(self, ws_name: str) -> Tuple[bool, str]:
         """Check if the workspace has ApplyDetailedBalanceMD applied.
@@ -547,76 +399,108 @@ class CorrectionsModel:
         return False, ""
 
 
-class ApplyDetailedBalanceMDObserver(AlgorithmObserver):
-    """Observer for ApplyDetailedBalanceMD algorithm"""
-
-    def __init__(self, parent, ws_name: str) -> None:
-        super().__init__()
-        self.parent = parent
-        self.ws_name = ws_name
+def detailed_balance_step(temperature: str) -> tuple:
+    """Return the detailed balance correction step"""
+    return "ApplyDetailedBalanceMD", {"Temperature": temperature}
 
-    def finishHandle(self):  # pylint: disable=invalid-name
-        """Call upon algorithm finishing"""
-        self.parent.apply_detailed_balance_finished(ws_name=self.ws_name, alg=self, error=False, msg="")
 
-    def errorHandle(self, msg):  # pylint: disable=invalid-name
-        """Call upon algorithm error"""
-        self.parent.apply_detailed_balance_finished(ws_name=self.ws_name, alg=self, error=True, msg=msg)
+def scattered_transmission_correction_step() -> tuple:
+    """Return the HYSPEC polarizer transmission correction step"""
+    exponent_factor = 1.0 / 11.0  # see ref in CorrectionsModel.apply_scattered_transmission_correction
+    logger.information(f"Applying DGS Scattered Transmission Correction with exponent factor {exponent_factor}")
+    return "DgsScatteredTransmissionCorrectionMD", {"ExponentFactor": exponent_factor}
 
 
-class DgsScatteredTransmissionCorrectionMDObserver(AlgorithmObserver):
-    """Observer for DgsScatteredTransmissionCorrectionMD algorithm"""
-
-    def __init__(self, parent, ws_name: str) -> None:
-        super().__init__()
-        self.parent = parent
-        self.ws_name = ws_name
+def magnetic_form_factor_correction_step(ion_name: str) -> tuple:
+    """Return the magnetic form factor correction step"""
+    logger.information(f"Applying Magnetic Form Factor Correction with ion name {ion_name}")
+    return "MagneticFormFactorCorrectionMD", {"IonName": ion_name}
 
-    def finishHandle(self):  # pylint: disable=invalid-name
-        """Call upon algorithm finishing"""
-        self.parent.apply_scattered_transmission_correction_finished(
-            ws_name=self.ws_name, alg=self, error=False, msg=""
-        )
 
-    def errorHandle(self, msg):  # pylint: disable=invalid-name
-        """Call upon algorithm error"""
-        self.parent.apply_scattered_transmission_correction_finished(
-            ws_name=self.ws_name, alg=self, error=True, msg=msg
-        )
+def debye_waller_factor_correction_step(u2: str) -> tuple:
+    """Return the Debye-Waller factor correction step"""
+    logger.information(f"Applying Debye-Waller Factor Correction with mean squared displacement value {u2}")
+    return "DebyeWallerFactorCorrectionMD", {"MeanSquaredDisplacement": u2}
 
 
-class MagneticFormFactorCorrectionMDObserver(AlgorithmObserver):
-    """Observer for MagneticFormFactorCorrectionMD algorithm"""
+class CorrectionsJob:
+    """Chain of correction algorithms run in a background thread, with a single progress and cancellation"""
 
-    def __init__(self, parent, ws_name: str) -> None:
-        super().__init__()
+    def __init__(self, parent, ws_name: str, steps: list, output_ws_name: str) -> None:
         self.parent = parent
         self.ws_name = ws_name
-
-    def finishHandle(self):  # pylint: disable=invalid-name
-        """Call upon algorithm finishing"""
-        self.parent.apply_magnetic_form_factor_correction_finished(ws_name=self.ws_name, alg=self, error=False, msg="")
-
-    def errorHandle(self, msg):  # pylint: disable=invalid-name
-        """Call upon algorithm error"""
-        self.parent.apply_magnetic_form_factor_correction_finished(ws_name=self.ws_name, alg=self, error=True, msg=msg)
-
-
-class DebyeWallerFactorCorrectionMDObserver(AlgorithmObserver):
-    """Observer for DebyeWallerFactorCorrectionMD algorithm"""
-
-    def __init__(self, parent, ws_name: str) -> None:
+        self.steps = steps
+        self.output_ws_name = output_ws_name
+        self.algorithms = []
+        self.current = 0
+        self.cancelled = False
+        self.progress_observer = CorrectionsProgressObserver(self)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def prepare(self) -> None:
+        """Create the algorithms and set their properties, raise ValueError for invalid parameters"""
+        for index, (alg_name, properties) in enumerate(self.steps):
+            alg = AlgorithmManager.create(alg_name)
+            alg.initialize()
+            alg.setLogging(False)
+            # the next corrections are applied in place on the output of the first one,
+            # which does not exist yet
+            if index == 0:
+                alg.setProperty("InputWorkspace", self.ws_name)
+            for name, value in properties.items():
+                alg.setProperty(name, value)
+            alg.setProperty("OutputWorkspace", self.output_ws_name)
+            self.progress_observer.observeProgress(alg)
+            self.algorithms.append(alg)
+
+    def start(self) -> None:
+        """Start the corrections in the background"""
+        self.thread.start()
+
+    def wait(self, timeout: float = None) -> bool:
+        """Wait for the corrections to finish, return False if they are still running after timeout seconds"""
+        self.thread.join(timeout)
+        return not self.thread.is_alive()
+
+    def cancel(self) -> None:
+        """Stop the running correction and skip the next ones"""
+        self.cancelled = True
+        alg = self.algorithms[self.current] if self.current < len(self.algorithms) else None
+        if alg is not None and alg.isRunning():
+            alg.cancel()
+
+    def report(self, progress: float, message: str) -> None:
+        """Report the progress of the whole job from the progress of the running algorithm"""
+        if self.parent.progress_callback:
+            self.parent.progress_callback((self.current + progress) / len(self.algorithms), message)
+
+    def _run(self) -> None:
+        error, msg = False, ""
+        for index, alg in enumerate(self.algorithms):
+            if self.cancelled:
+                break
+            self.current = index
+            try:
+                if index > 0:
+                    alg.setProperty("InputWorkspace", self.output_ws_name)
+                alg.execute()
+            except (RuntimeError, ValueError) as err:
+                if not self.cancelled:
+                    error, msg = True, f"{alg.name()} for {self.ws_name}\n{err}"
+                break
+        self.parent.corrections_finished(self, error, msg)
+
+
+class CorrectionsProgressObserver(AlgorithmObserver):
+    """Observer for the progress of the correction algorithms"""
+
+    def __init__(self, job: CorrectionsJob) -> None:
         super().__init__()
-        self.parent = parent
-        self.ws_name = ws_name
-
-    def finishHandle(self):  # pylint: disable=invalid-name
-        """Call upon algorithm finishing"""
-        self.parent.apply_debye_waller_factor_correction_finished(ws_name=self.ws_name, alg=self, error=False, msg="")
+        self.job = job
 
-    def errorHandle(self, msg):  # pylint: disable=invalid-name
-        """Call upon algorithm error"""
-        self.parent.apply_debye_waller_factor_correction_finished(ws_name=self.ws_name, alg=self, error=True, msg=msg)
+    def progressHandle(self, p, message, *args):  # pylint: disable=invalid-name,unused-argument
+        """Call upon algorithm progress"""
+        self.job.report(p, message)
 
 
 def get_ions_list():
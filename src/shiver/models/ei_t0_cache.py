@@ -0,0 +1,90 @@
+"""Persistent cache of the incident energy and time offset fitted from the monitors of the runs"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from pathlib import Path
+
+from mantid.kernel import Logger
+
+logger = Logger("SHIVER")
+
+# location of the cache database
+EI_T0_CACHE_FILE = os.path.join(Path.home(), ".shiver", "ei_t0_cache.sqlite")
+
+
+class EiT0Cache:
+    """SQLite cache of the Ei and T0 of groups of raw files, keyed on the files identity
+
+    The identity of a file is its path, modification time and size, so the values are fitted again
+    when a file is modified.
+    """
+
+    def __init__(self, filename=None):
+        self.filename = filename or EI_T0_CACHE_FILE
+        self.lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        if not self._initialized and os.path.dirname(self.filename):
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        connection = sqlite3.connect(self.filename)
+        if not self._initialized:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS ei_t0 (key TEXT PRIMARY KEY, timestamp REAL, ei REAL, t0 REAL, source TEXT)"
+            )
+            self._initialized = True
+        return connection
+
+    @staticmethod
+    def key(filenames):
+        """Return the cache key of a group of raw files, or None if a file cannot be found"""
+        hasher = hashlib.sha256()
+        for filename in filenames:
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                return None
+            hasher.update(f"{Path(filename).resolve()}:{stat.st_mtime_ns}:{stat.st_size}".encode())
+        return hasher.hexdigest()
+
+    def get(self, filenames):
+        """Return the cached (Ei, T0, source) of the group of files, or None if it is not in the cache"""
+        key = self.key(filenames)
+        if key is None:
+            return None
+        with self.lock:
+            try:
+                with closing(self._connect()) as connection, connection:
+                    row = connection.execute("SELECT ei, t0, source FROM ei_t0 WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as err:
+                logger.warning(f"Ei/T0 cache {self.filename} could not be read: {err}")
+                return None
+        return tuple(row) if row is not None else None
+
+    def set(self, filenames, ei, t0, source):
+        """Store the Ei and T0 of the group of files, and how they were determined"""
+        key = self.key(filenames)
+        if key is None:
+            return
+        with self.lock:
+            try:
+                with closing(self._connect()) as connection, connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO ei_t0 (key, timestamp, ei, t0, source) VALUES (?, ?, ?, ?, ?)",
+                        (key, time.time(), float(ei), float(t0), source),
+                    )
+            except sqlite3.Error as err:
+                logger.warning(f"Ei/T0 cache {self.filename} could not be written: {err}")
+
+    def clear(self):
+        """Remove all the cached values"""
+        with self.lock:
+            try:
+                with closing(self._connect()) as connection, connection:
+                    connection.execute("DELETE FROM ei_t0")
+            except sqlite3.Error as err:
+                logger.warning(f"Ei/T0 cache {self.filename} could not be cleared: {err}")
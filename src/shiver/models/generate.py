@@ -13,8 +13,26 @@ from mantid.kernel import (  # pylint: disable=no-name-in-module
 )
 from mantid.simpleapi import mtd  # pylint: disable=no-name-in-module
 
+from shiver.configuration import get_data, get_float, get_int
+
 logger = Logger("SHIVER")
 
+# parameters of the configuration that change the converted events, they must be the same to append runs
+APPEND_PARAMETERS = {
+    "": ["mde_type", "MaskingDataFile", "NormalizationDataFile", "Ei", "T0"],
+    "AdvancedOptions": [
+        "MaskInputs",
+        "E_min",
+        "E_max",
+        "ApplyFilterBadPulses",
+        "BadPulsesThreshold",
+        "TimeIndepBackgroundWindow",
+        "Goniometer",
+        "AdditionalDimensions",
+    ],
+    "PolarizedOptions": ["PSDA"],
+}
+
 
 # pylint: disable=too-few-public-methods
 class GenerateModel:
@@ -27,6 +45,7 @@ class GenerateModel:
         self.workspace_name = None
         self.output_dir = None
         self.config_dict = None
+        self.append_config = None
 
     def connect_error_message(self, callback):
         """Connect error message"""
@@ -50,9 +69,35 @@ class GenerateModel:
         if self.generate_mde_finish_callback:
             self.generate_mde_finish_callback(False)
 
-        # remove output workspace if it exists in memory
+        # in append mode the new runs are merged into the existing workspace,
+        # loaded from the output folder if it is not in memory
         output_workspace = config_dict.get("mde_name", "")
-        if output_workspace and mtd.doesExist(output_workspace):
+        append = config_dict.get("mde_append", False) and config_dict.get("mde_type", "Data") == "Data"
+        if append and output_workspace and not mtd.doesExist(output_workspace):
+            file_path = Path(config_dict.get("output_dir", "")) / f"{output_workspace}.nxs"
+            if file_path.exists():
+                self.load_mde_from_disk(str(file_path), output_workspace)
+                return
+            logger.information(f"{file_path} does not exist, the MDE will be generated from all the files")
+            append = False
+
+        # the new runs must be reduced as the ones already in the workspace
+        self.append_config = None
+        if append:
+            existing_config = gather_mde_config_dict(output_workspace)
+            conflicts = get_append_conflicts(existing_config, config_dict)
+            if conflicts:
+                err_msg = f"Cannot append to {output_workspace}, it was generated with different {', '.join(conflicts)}"
+                logger.error(err_msg)
+                if self.generate_mde_finish_callback:
+                    self.generate_mde_finish_callback(True)
+                if self.error_callback:
+                    self.error_callback(msg=err_msg)
+                return
+            self.append_config = existing_config
+
+        # remove output workspace if it exists in memory
+        if not append and output_workspace and mtd.doesExist(output_workspace):
             mtd.remove(output_workspace)
 
         # create algorithm via AlgorithmManager (for async execution)
@@ -73,6 +118,7 @@ class GenerateModel:
         #     'mde_name': 'test',
         #     'output_dir': '/tmp',
         #     'mde_type': 'Data',
+        #     'mde_append': False,
         #     'filename': "file1.nxs+file2.nxs, file3.nxs",
         #     'MaskingDataFile': '/home/8cz/Github/Shiver/tests/data/raw/ub_process_nexus.nxs',
         #     'NormalizationDataFile': '/home/8cz/Github/Shiver/tests/data/raw/ub_process_nexus.nxs',
@@ -135,6 +181,14 @@ class GenerateModel:
         minimum_energy_transfer = advanced_options.get("E_min", Property.EMPTY_DBL)
         maximum_energy_transfer = advanced_options.get("E_max", Property.EMPTY_DBL)
         time_indepedent_background = advanced_options.get("TimeIndepBackgroundWindow", "")
+        compress_events = advanced_options.get("CompressEvents", False)
+        compress_events_tolerance = advanced_options.get("CompressEventsTolerance", Property.EMPTY_DBL)
+        split_into = advanced_options.get("SplitInto", "")
+        split_threshold = advanced_options.get("SplitThreshold", Property.EMPTY_INT)
+        # "auto" chooses the depth from the number of events
+        max_recursion_depth = advanced_options.get("MaxRecursionDepth", 2)
+        if max_recursion_depth == "auto":
+            max_recursion_depth = 0
         #
         sample_parameters = config_dict.get("SampleParameters", {})
         # remove matrix_ub from sample_parameters
@@ -165,10 +219,23 @@ class GenerateModel:
                 #       mantid does not know how to handle empty string, so
                 #       we need to check if it is empty before setting it.
                 alg.setProperty("AdditionalDimensions", additional_dimensions)
+            alg.setProperty("CompressEvents", compress_events)
+            alg.setProperty("CompressEventsTolerance", compress_events_tolerance)
+            if split_into:
+                alg.setProperty("SplitInto", split_into)
+            alg.setProperty("SplitThreshold", split_threshold)
+            alg.setProperty("MaxRecursionDepth", max_recursion_depth)
             alg.setProperty("Type", type_input)
             alg.setProperty("UBParameters", ub_parameters)
             alg.setProperty("PercentMin", percent_min)
             alg.setProperty("PercentMax", percent_max)
+            alg.setProperty("NumberOfWorkers", get_number_of_workers())
+            cache_directory = get_data("generate_tab.parameters", "mde_cache_directory")
+            if cache_directory:
+                alg.setProperty("CacheDirectory", cache_directory)
+                alg.setProperty("CacheSize", get_float("generate_tab.parameters", "mde_cache_size", 100))
+            if append:
+                alg.setProperty("InputWorkspace", output_workspace)
             alg.setProperty("OutputWorkspace", output_workspace)
             alg.executeAsync()
         except (RuntimeError, ValueError) as err:
@@ -200,6 +267,7 @@ class GenerateModel:
             self.workspace_name = None
             self.output_dir = None
             self.config_dict = None
+            self.append_config = None
             # enable button
             if self.generate_mde_finish_callback:
                 self.generate_mde_finish_callback(True)
@@ -207,7 +275,14 @@ class GenerateModel:
                 self.error_callback(msg=err_msg)
         else:
             logger.information("GenerateDGSMDE finished")
-            # attach config_dict to the workspace
+            # the workspace contains the runs appended to and the new ones
+            if self.append_config is not None:
+                self.config_dict["filename"] = merge_filename_groups(
+                    self.append_config.get("filename", ""), self.config_dict.get("filename", "")
+                )
+                self.append_config = None
+            # attach config_dict to the workspace, with how the Ei and T0 of the runs were determined
+            self.config_dict["EiT0"] = gather_ei_t0(self.workspace_name)
             save_mde_config_dict(self.workspace_name, self.config_dict)
             # save polarization sample logs separately
             workspace = mtd[self.workspace_name]
@@ -260,6 +335,68 @@ class GenerateModel:
                     msg=f"Error in SaveMD:\n{err}",
                 )
 
+    def load_mde_from_disk(self, file_path, workspace_name):
+        """Load an existing MDE workspace from disk, and append the new runs to it when finished.
+
+        Parameters
+        ----------
+        file_path : str
+            Path of the MDE file
+        workspace_name : str
+            Name of the loaded MDE workspace
+        """
+        alg = AlgorithmManager.create("LoadMD")
+        alg_obs = LoadMDObserver(parent=self)
+        self.algorithm_observer.add(alg_obs)
+
+        # add observers
+        alg_obs.observeFinish(alg)
+        alg_obs.observeError(alg)
+
+        # prep
+        alg.initialize()
+        alg.setLogging(False)
+
+        # execute
+        try:
+            alg.setProperty("Filename", file_path)
+            alg.setProperty("OutputWorkspace", workspace_name)
+            alg.executeAsync()
+        except RuntimeError as err:
+            logger.error(f"Error in LoadMD:\n{err}")
+            if self.generate_mde_finish_callback:
+                self.generate_mde_finish_callback(True)
+            if self.error_callback:
+                self.error_callback(
+                    msg=f"Error in LoadMD:\n{err}",
+                )
+
+    def finish_load_md(self, obs, error=False, msg=""):
+        """Callback from LoadMD observer, when loading the MDE to append to.
+
+        Parameters
+        ----------
+        obs : AlgorithmObserver
+            observer for LoadMD
+        error: bool
+            Error flag
+        msg: str, optional
+            Error message
+        """
+        self.algorithm_observer.remove(obs)
+        if error:
+            err_msg = f"Error in LoadMD:\n{msg}"
+            logger.error(err_msg)
+            # enable button
+            if self.generate_mde_finish_callback:
+                self.generate_mde_finish_callback(True)
+            if self.error_callback:
+                self.error_callback(err_msg)
+        else:
+            logger.information("LoadMD finished")
+            # the workspace is now in memory, the new runs can be appended
+            self.generate_mde(self.config_dict)
+
     def finish_save_md(self, obs, error=False, msg=""):
         """Callback from saveMD observer.
 
@@ -304,6 +441,22 @@ class GenerateMDEObserver(AlgorithmObserver):
         self.parent.finish_generate_mde(obs=self, error=True, msg=msg)
 
 
+class LoadMDObserver(AlgorithmObserver):
+    """Observer to handle the execution of LoadMD"""
+
+    def __init__(self, parent):
+        super().__init__()
+        self.parent = parent
+
+    def finishHandle(self):  # pylint: disable=invalid-name
+        """Call parent upon completion of algorithm"""
+        self.parent.finish_load_md(obs=self, error=False, msg="")
+
+    def errorHandle(self, msg):  # pylint: disable=invalid-name
+        """Call parent upon error of algorithm"""
+        self.parent.finish_load_md(obs=self, error=True, msg=msg)
+
+
 class SaveMDObserver(AlgorithmObserver):
     """Observer to handle the execution of SaveMD"""
 
@@ -357,6 +510,92 @@ def gather_mde_config_dict(workspace_name: str) -> dict:
     return config
 
 
+def get_append_conflicts(existing_config: dict, config_dict: dict) -> list:
+    """Return the processing parameters that differ between an existing MDE and the runs to append to it.
+
+    Parameters
+    ----------
+    existing_config : dict
+        Config dictionary of the existing MDE workspace
+    config_dict : dict
+        Config dictionary of the runs to append
+
+    Returns
+    -------
+    list
+        Names of the parameters that differ, empty if the runs can be appended
+    """
+    if not existing_config:
+        return ["processing parameters (no MDEConfig)"]
+
+    def _value(config, section, name):
+        value = config.get(section, {}).get(name) if section else config.get(name)
+        # missing and empty parameters are the defaults
+        return None if value in (None, "", []) else value
+
+    conflicts = []
+    for section, names in APPEND_PARAMETERS.items():
+        for name in names:
+            if _value(existing_config, section, name) != _value(config_dict, section, name):
+                conflicts.append(name)
+    # the UB matrix is recomputed from the lattice parameters and orientation
+    existing_sample = {k: v for k, v in existing_config.get("SampleParameters", {}).items() if k != "matrix_ub"}
+    new_sample = {k: v for k, v in config_dict.get("SampleParameters", {}).items() if k != "matrix_ub"}
+    if existing_sample != new_sample:
+        conflicts.append("SampleParameters")
+    return conflicts
+
+
+def merge_filename_groups(existing: str, new: str) -> str:
+    """Return the groups of files of an existing MDE followed by the new groups appended to it.
+
+    The groups are compared by file name only, as when the converted groups are filtered by GenerateDGSMDE.
+
+    Parameters
+    ----------
+    existing : str
+        Groups of files of the existing MDE, e.g. "/tmp/file1+/tmp/file2, /tmp/file3"
+    new : str
+        Groups of files appended to the MDE
+
+    Returns
+    -------
+    str
+        Comma-separated string of all the groups of files
+    """
+    groups = []
+    names = set()
+    for group in f"{existing},{new}".split(","):
+        group_names = frozenset(Path(f_name.strip()).name for f_name in group.split("+") if f_name.strip())
+        if group_names and group_names not in names:
+            names.add(group_names)
+            groups.append(group.strip())
+    return ", ".join(groups)
+
+
+def get_number_of_workers() -> int:
+    """Return the number of worker processes for GenerateDGSMDE from the configuration settings."""
+    return max(get_int("generate_tab.parameters", "number_of_workers", 1), 1)
+
+
+def gather_ei_t0(workspace_name):
+    """Return the Ei, T0 and their source (user, log or monitors) of each run of the MDE, by run number"""
+    workspace = mtd[workspace_name]
+    ei_t0 = {}
+    for i in range(workspace.getNumExperimentInfo()):
+        run = workspace.getExperimentInfo(i).run()
+        if not run.hasProperty("EiSource"):
+            continue
+        run_number = str(run.getProperty("run_number").value) if run.hasProperty("run_number") else str(i)
+        ei_t0[run_number] = {
+            "Ei": float(run.getProperty("Ei").value) if run.hasProperty("Ei") else None,
+            "T0": float(run.getProperty("CalculatedT0").value) if run.hasProperty("CalculatedT0") else None,
+            "EiSource": run.getProperty("EiSource").value,
+            "T0Source": run.getProperty("T0Source").value,
+        }
+    return ei_t0
+
+
 def save_mde_config_dict(workspace_name, config_dict):
     """Save the config dictionary in the given MDE workspace."""
     workspace = mtd[workspace_name]
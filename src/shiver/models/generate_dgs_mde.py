@@ -2,6 +2,10 @@
 
 # pylint: disable=no-name-in-module
 import json
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 import numpy
@@ -9,6 +13,7 @@ from mantid.api import (
     AlgorithmFactory,
     FileAction,
     FileProperty,
+    IMDEventWorkspaceProperty,
     IMDWorkspaceProperty,
     MultipleFileProperty,
     Progress,
@@ -18,6 +23,8 @@ from mantid.api import (
 from mantid.kernel import (
     Direction,
     FloatBoundedValidator,
+    IntArrayProperty,
+    IntBoundedValidator,
     Logger,
     Property,
     StringArrayProperty,
@@ -33,12 +40,14 @@ from mantid.simpleapi import (
     DgsReduction,
     GenerateGoniometerIndependentBackground,
     LoadEventNexus,
+    LoadMD,
     LoadNexusLogs,
     LoadNexusProcessed,
     MaskBTP,
     MaskDetectors,
     MergeMD,
     RenameWorkspace,
+    SaveNexusProcessed,
     SetUB,
     _create_algorithm_function,
     mtd,
@@ -48,7 +57,19 @@ from shiver.configuration import get_data_logs
 from shiver.models.utils import flatten_list
 from shiver.version import __version__
 
-from .convert_dgs_to_single_mde import get_Ei_T0
+from .convert_dgs_to_single_mde import (
+    DEFAULT_SPLIT_INTO,
+    DEFAULT_SPLIT_THRESHOLD,
+    compress_events,
+    convert_to_mde_file,
+    get_Ei_T0,
+    get_max_recursion_depth,
+)
+from .ei_t0_cache import EiT0Cache
+from .generate import gather_mde_config_dict
+from .mde_cache import MDECache, mask_hash
+from .mde_merge import MDEMergeTree
+from .run_index import get_number_of_events, get_proton_charges
 
 
 class GenerateDGSMDE(PythonAlgorithm):
@@ -161,6 +182,38 @@ class GenerateDGSMDE(PythonAlgorithm):
             doc="Comma separated list containing sample log name, minimum, maximum values",
         )
 
+        self.declareProperty(
+            name="CompressEvents",
+            defaultValue=False,
+            doc="Merge the events closer than CompressEventsTolerance into weighted events before the conversion",
+        )
+
+        self.declareProperty(
+            name="CompressEventsTolerance",
+            defaultValue=Property.EMPTY_DBL,
+            doc="Tolerance of the event compression, in microseconds. If empty, 0.1 microsecond",
+        )
+
+        self.declareProperty(
+            IntArrayProperty(name="SplitInto", values=[], direction=Direction.Input),
+            doc="Number of bins into which each box is split, one value or one per dimension."
+            f" If empty, {DEFAULT_SPLIT_INTO}",
+        )
+
+        self.declareProperty(
+            name="SplitThreshold",
+            defaultValue=Property.EMPTY_INT,
+            doc=f"Number of events in a box above which it is split. If empty, {DEFAULT_SPLIT_THRESHOLD}",
+        )
+
+        self.declareProperty(
+            name="MaxRecursionDepth",
+            defaultValue=2,
+            validator=IntBoundedValidator(lower=0),
+            doc="Maximum depth of the box structure. If 0, it is chosen from the total number of events of the"
+            " raw data files, so that the smallest boxes of the merged workspace hold about SplitThreshold events",
+        )
+
         self.declareProperty(
             name="Type",
             defaultValue="Data",
@@ -197,6 +250,42 @@ class GenerateDGSMDE(PythonAlgorithm):
             doc="Energy step for background minimization. Must be between 0 and 1 (fraction of Ei).",
         )
 
+        self.declareProperty(
+            name="NumberOfWorkers",
+            defaultValue=1,
+            validator=IntBoundedValidator(lower=1),
+            doc="Number of worker processes used to convert the goniometer angles in parallel."
+            " Only used for the Data type. If 1, the angles are converted one after another",
+        )
+
+        self.declareProperty(
+            FileProperty(name="CacheDirectory", defaultValue="", action=FileAction.OptionalDirectory),
+            doc="Optional directory to cache the converted MDEs of each group of files. Groups converted before"
+            " with the same files and reduction parameters are loaded from it instead of being converted again",
+        )
+
+        self.declareProperty(
+            name="CacheSize",
+            defaultValue=100.0,
+            validator=FloatBoundedValidator(lower=0.0),
+            doc="Maximum size of the cache directory (in GB). The least recently used MDEs are removed first",
+        )
+
+        self.declareProperty(
+            name="CacheEiT0",
+            defaultValue=True,
+            doc="Keep the Ei and T0 fitted from the monitors in a cache in the user directory, to be reused"
+            " for the same files without loading the monitors",
+        )
+
+        self.declareProperty(
+            IMDEventWorkspaceProperty(
+                "InputWorkspace", defaultValue="", optional=PropertyMode.Optional, direction=Direction.Input
+            ),
+            doc="Optional existing MDEvent workspace to append to. Only used for the Data type. The files already"
+            " listed in its MDEConfig log are skipped, and the new ones are merged into it",
+        )
+
         self.declareProperty(
             IMDWorkspaceProperty(
                 "OutputWorkspace", defaultValue="", optional=PropertyMode.Mandatory, direction=Direction.Output
@@ -228,6 +317,9 @@ class GenerateDGSMDE(PythonAlgorithm):
                 except (ValueError, IndexError):
                     issues["AdditionalDimensions"] = f"The triplet #{i} has some issues"
 
+        if self.getPropertyValue("InputWorkspace") and self.getProperty("Type").value != "Data":
+            issues["InputWorkspace"] = "Appending to an existing workspace is only possible for the 'Data' type"
+
         if (
             self.getProperty("Type").value == "Background (minimized by angle and energy)"
             and self.getProperty("DetectorGroupingFile").value == ""
@@ -250,6 +342,17 @@ class GenerateDGSMDE(PythonAlgorithm):
             else:
                 filename_nested_list = [list(flatten_list(filenames))]
 
+        output_ws = self.getPropertyValue("OutputWorkspace")
+        existing_ws = self.getPropertyValue("InputWorkspace")
+        if existing_ws:
+            filename_nested_list = self._filter_converted_files(existing_ws, filename_nested_list)
+            if not filename_nested_list:
+                self.log().notice(f"All the files are already in {existing_ws}, nothing to append")
+                if existing_ws != output_ws:
+                    CloneWorkspace(InputWorkspace=existing_ws, OutputWorkspace=output_ws)
+                self.setProperty("OutputWorkspace", mtd[output_ws])
+                return
+
         endrange = 100
         progress = Progress(self, start=0.0, end=1.0, nreports=endrange)
 
@@ -318,84 +421,114 @@ class GenerateDGSMDE(PythonAlgorithm):
         cdsm_dict["PolarizingSupermirrorDeflectionAdjustment"] = self.getProperty(
             "PolarizingSupermirrorDeflectionAdjustment"
         ).value
+        for name in ("CompressEvents", "CompressEventsTolerance", "SplitThreshold", "MaxRecursionDepth"):
+            cdsm_dict[name] = self.getProperty(name).value
+        cdsm_dict["SplitInto"] = self.getProperty("SplitInto").value.tolist()
+        cdsm_dict["CacheEiT0"] = self.getProperty("CacheEiT0").value
 
-        output_ws = self.getPropertyValue("OutputWorkspace")
         self.log().debug(f"Nested filename structure {filename_nested_list}")
 
-        if process_type == "Background (minimized by angle and energy)":
-            # check proton charge
-            pc_dict = {}
-            progress.report("Checking proton charge")
-            for f_name in filename_nested_list[0]:
-                __proton_charge_ws = CreateWorkspace(DataX=[0], DataY=[0])
-                LoadNexusLogs(
-                    Filename=f_name, Workspace=__proton_charge_ws, AllowList=["proton_charge"], OverwriteLogs=True
-                )
-                pc_dict[f_name] = __proton_charge_ws.getRun().getProtonCharge()
-                DeleteWorkspaces([__proton_charge_ws])
-            pc_min = min(pc_dict.values())
-            pc_max = max(pc_dict.values())
-
-            if (pc_max - pc_min) > 0.01 * pc_min:
-                logger = Logger("SHIVER")
-                logger.error("The proton charge varies more than 1 percent across the files.")
-                logger.notice("\n".join([f"{f.split('/')[-1]}: {v:.2f}" for (f, v) in pc_dict.items()]))
-                raise RuntimeError("Proton charge varies more than 1 percent across the files. See logs for details.")
-
-            ws_list = []
-            for i, f_name in enumerate(filename_nested_list[0]):
-                progress.report(int(endrange * 0.45 * i / len(filename_nested_list)), f"Processing {f_name}")
-                data = LoadEventNexus(f_name, OutputWorkspace=f"__tmp_{i}", AllowList=allowed_logs)
-                Ei, T0 = get_Ei_T0(data, None, cdsm_dict["Ei"], cdsm_dict["T0"], [f_name])
-                e_min = cdsm_dict["EMin"]
-                e_max = cdsm_dict["EMax"]
-                if e_min == Property.EMPTY_DBL:
-                    e_min = -0.95 * Ei
-                if e_max == Property.EMPTY_DBL:
-                    e_max = 0.95 * Ei
-                Erange = f"{e_min}, {self.getProperty('EnergyStep').value * Ei}, {e_max}"
-
-                with amend_config(facility="SNS"):
-                    DgsReduction(
-                        SampleInputWorkspace=f"__tmp_{i}",
-                        SampleInputMonitorWorkspace=f"__tmp_{i}",
-                        IncidentEnergyGuess=Ei,
-                        TimeZeroGuess=T0,
-                        UseIncidentEnergyGuess=True,
-                        IncidentBeamNormalisation="None",
-                        EnergyTransferRange=Erange,
-                        TimeIndepBackgroundSub=False,
-                        SofPhiEIsDistribution=False,
-                        OutputWorkspace=f"__tmp_{i}",
+        # the partial workspaces are deleted if the conversion or the merge fail
+        merge_tree = None
+        try:
+            if process_type == "Background (minimized by angle and energy)":
+                # check proton charge
+                progress.report("Checking proton charge")
+                pc_dict = self._get_proton_charges(filename_nested_list[0])
+                pc_min = min(pc_dict.values())
+                pc_max = max(pc_dict.values())
+
+                if (pc_max - pc_min) > 0.01 * pc_min:
+                    logger = Logger("SHIVER")
+                    logger.error("The proton charge varies more than 1 percent across the files.")
+                    logger.notice("\n".join([f"{f.split('/')[-1]}: {v:.2f}" for (f, v) in pc_dict.items()]))
+                    raise RuntimeError(
+                        "Proton charge varies more than 1 percent across the files. See logs for details."
                     )
-                ws_list.append(f"__tmp_{i}")
-            bkg = GenerateGoniometerIndependentBackground(
-                ws_list,
-                GroupingFile=self.getProperty("DetectorGroupingFile").value,
-                PercentMin=self.getProperty("PercentMin").value,
-                PercentMax=self.getProperty("PercentMax").value,
-                startProgress=0.45,
-                endProgress=0.9,
-            )
-            DeleteWorkspaces(ws_list)
-            filename_nested_list = [str(bkg)]
-            ConvertDGSToSingleMDE(InputWorkspace=bkg, OutputWorkspace=f"__{output_ws}_part0", **cdsm_dict)
-        else:
-            for i, f_names in enumerate(filename_nested_list):
-                progress.report(int(endrange * 0.9 * i / len(filename_nested_list)), f"Processing {'+'.join(f_names)}")
+
+                ws_list = []
+                ei_t0_cache = EiT0Cache() if cdsm_dict["CacheEiT0"] else None
+                for i, f_name in enumerate(filename_nested_list[0]):
+                    progress.report(int(endrange * 0.45 * i / len(filename_nested_list)), f"Processing {f_name}")
+                    data = LoadEventNexus(f_name, OutputWorkspace=f"__tmp_{i}", AllowList=allowed_logs)
+                    Ei, T0 = get_Ei_T0(data, None, cdsm_dict["Ei"], cdsm_dict["T0"], [f_name], cache=ei_t0_cache)
+                    if cdsm_dict["CompressEvents"]:
+                        data = compress_events(data, f"__tmp_{i}", cdsm_dict["CompressEventsTolerance"])
+                    e_min = cdsm_dict["EMin"]
+                    e_max = cdsm_dict["EMax"]
+                    if e_min == Property.EMPTY_DBL:
+                        e_min = -0.95 * Ei
+                    if e_max == Property.EMPTY_DBL:
+                        e_max = 0.95 * Ei
+                    Erange = f"{e_min}, {self.getProperty('EnergyStep').value * Ei}, {e_max}"
+
+                    with amend_config(facility="SNS"):
+                        DgsReduction(
+                            SampleInputWorkspace=f"__tmp_{i}",
+                            SampleInputMonitorWorkspace=f"__tmp_{i}",
+                            IncidentEnergyGuess=Ei,
+                            TimeZeroGuess=T0,
+                            UseIncidentEnergyGuess=True,
+                            IncidentBeamNormalisation="None",
+                            EnergyTransferRange=Erange,
+                            TimeIndepBackgroundSub=False,
+                            SofPhiEIsDistribution=False,
+                            OutputWorkspace=f"__tmp_{i}",
+                        )
+                    ws_list.append(f"__tmp_{i}")
+                bkg = GenerateGoniometerIndependentBackground(
+                    ws_list,
+                    GroupingFile=self.getProperty("DetectorGroupingFile").value,
+                    PercentMin=self.getProperty("PercentMin").value,
+                    PercentMax=self.getProperty("PercentMax").value,
+                    startProgress=0.45,
+                    endProgress=0.9,
+                )
+                DeleteWorkspaces(ws_list)
+                merge_tree = MDEMergeTree([f"__{output_ws}_part0"], f"__{output_ws}")
+                # the spectra are grouped, the preprocessed detectors of the runs do not apply
                 ConvertDGSToSingleMDE(
-                    Filenames="+".join(f_names), OutputWorkspace=f"__{output_ws}_part{i}", **cdsm_dict
+                    InputWorkspace=bkg,
+                    CachePreprocessedDetectors=False,
+                    OutputWorkspace=f"__{output_ws}_part0",
+                    **cdsm_dict,
+                )
+                merge_tree.add(0)
+            else:
+                # the parts are merged as soon as they are ready, while the next ones are converted
+                merge_tree = MDEMergeTree(
+                    [f"__{output_ws}_part{i}" for i in range(len(filename_nested_list))],
+                    f"__{output_ws}",
+                    self.getProperty("NumberOfWorkers").value,
                 )
+                if cdsm_dict["MaxRecursionDepth"] == 0:
+                    cdsm_dict["MaxRecursionDepth"] = self._get_max_recursion_depth(filename_nested_list, cdsm_dict)
+                cache = self._get_cache(cdsm_dict, allowed_logs)
+                groups = self._load_cached_groups(cache, filename_nested_list, output_ws, merge_tree)
+                if min(self.getProperty("NumberOfWorkers").value, len(groups)) > 1:
+                    self._convert_parallel(groups, cdsm_dict, output_ws, cache, merge_tree, progress, endrange)
+                else:
+                    for n_done, (i, f_names) in enumerate(groups):
+                        progress.report(int(endrange * 0.9 * n_done / len(groups)), f"Processing {'+'.join(f_names)}")
+                        ConvertDGSToSingleMDE(
+                            Filenames="+".join(f_names), OutputWorkspace=f"__{output_ws}_part{i}", **cdsm_dict
+                        )
+                        if cache:
+                            cache.add(cache.key(f_names), f"__{output_ws}_part{i}")
+                        merge_tree.add(i)
 
-        if __mask:
-            DeleteWorkspaces([__mask])
-        progress.report("Merging data")
-        if len(filename_nested_list) > 1:
-            ws_list = [f"__{output_ws}_part{i}" for i in range(len(filename_nested_list))]
-            MergeMD(ws_list, OutputWorkspace=output_ws)
-            DeleteWorkspaces(ws_list)
+            if __mask:
+                DeleteWorkspaces([__mask])
+            progress.report("Merging data")
+            merged = merge_tree.result()
+        finally:
+            if merge_tree is not None:
+                merge_tree.close()
+        if existing_ws:
+            MergeMD([existing_ws, merged], OutputWorkspace=output_ws)
+            DeleteWorkspaces([merged])
         else:
-            RenameWorkspace(InputWorkspace=f"__{output_ws}_part0", OutputWorkspace=output_ws)
+            RenameWorkspace(InputWorkspace=merged, OutputWorkspace=output_ws)
 
         try:
             UB_parameters = json.loads(self.getProperty("UBParameters").value.replace("'", '"'))
@@ -407,6 +540,136 @@ class GenerateDGSMDE(PythonAlgorithm):
         Comment(output_ws, f"Shiver version {__version__}")
         self.setProperty("OutputWorkspace", mtd[output_ws])
 
+    def _get_proton_charges(self, filenames):
+        """Return the total proton charge of each file, in the order of the files
+
+        The charges are read from the run index, which reads the new files in parallel and keeps them
+        for the next time. The files that cannot be read directly are loaded with LoadNexusLogs.
+        """
+        indexed = get_proton_charges(filenames)
+        pc_dict = {}
+        for f_name in filenames:
+            if f_name in indexed:
+                pc_dict[f_name] = indexed[f_name]
+                continue
+            __proton_charge_ws = CreateWorkspace(DataX=[0], DataY=[0])
+            LoadNexusLogs(
+                Filename=f_name, Workspace=__proton_charge_ws, AllowList=["proton_charge"], OverwriteLogs=True
+            )
+            pc_dict[f_name] = __proton_charge_ws.getRun().getProtonCharge()
+            DeleteWorkspaces([__proton_charge_ws])
+        return pc_dict
+
+    def _filter_converted_files(self, existing_ws, filename_nested_list):
+        """Remove the groups of files that are already converted in the existing workspace
+
+        The groups are read from the filename entry of the MDEConfig log, and compared by file name only,
+        so the raw data folder can be moved between the two runs.
+        """
+        converted = gather_mde_config_dict(existing_ws).get("filename", "")
+        converted_groups = {
+            frozenset(Path(f_name.strip()).name for f_name in group.split("+"))
+            for group in converted.split(",")
+            if group.strip()
+        }
+        converted_files = set().union(*converted_groups)
+
+        new_nested_list = []
+        for f_names in filename_nested_list:
+            group = frozenset(Path(f_name).name for f_name in f_names)
+            if group in converted_groups:
+                continue
+            if group & converted_files:
+                raise RuntimeError(
+                    f"Cannot append {'+'.join(f_names)} to {existing_ws}: "
+                    "some of the files were already converted with a different grouping"
+                )
+            new_nested_list.append(f_names)
+        self.log().information(
+            f"Appending {len(new_nested_list)} of {len(filename_nested_list)} file groups to {existing_ws}"
+        )
+        return new_nested_list
+
+    def _get_max_recursion_depth(self, filename_nested_list, cdsm_dict):
+        """Return the box recursion depth for the total number of events of all the groups of files
+
+        MergeMD keeps the box structure of its first input, so the depth of each part must be chosen
+        for the events of the merged workspace, not for the events of its own group.
+        """
+        number_of_events = get_number_of_events(list(flatten_list(filename_nested_list)))
+        split_threshold = cdsm_dict["SplitThreshold"]
+        if split_threshold == Property.EMPTY_INT:
+            split_threshold = None
+        number_of_dimensions = 4 + len(cdsm_dict["AdditionalDimensions"]) // 3
+        max_recursion_depth = get_max_recursion_depth(
+            number_of_events, number_of_dimensions, cdsm_dict["SplitInto"], split_threshold
+        )
+        self.log().information(f"MaxRecursionDepth {max_recursion_depth} for {number_of_events} events")
+        return max_recursion_depth
+
+    def _get_cache(self, cdsm_dict, allowed_logs):
+        """Return the cache of converted MDEs, or None if no cache directory is set"""
+        cache_directory = self.getPropertyValue("CacheDirectory")
+        if not cache_directory:
+            return None
+        parameters = dict(cdsm_dict, MaskWorkspace=mask_hash(cdsm_dict["MaskWorkspace"]), AllowedLogs=allowed_logs)
+        # the cached Ei and T0 are the fitted ones, the converted MDEs do not depend on it
+        parameters.pop("CacheEiT0")
+        return MDECache(cache_directory, self.getProperty("CacheSize").value, parameters)
+
+    def _load_cached_groups(self, cache, filename_nested_list, output_ws, merge_tree):
+        """Load the partial MDEs found in the cache, and return the (index, filenames) of the groups to convert"""
+        groups = []
+        for i, f_names in enumerate(filename_nested_list):
+            cached = cache.get(cache.key(f_names)) if cache else None
+            if cached:
+                LoadMD(Filename=cached, OutputWorkspace=f"__{output_ws}_part{i}")
+                merge_tree.add(i)
+            else:
+                groups.append((i, f_names))
+        if cache:
+            self.log().information(f"Found {len(filename_nested_list) - len(groups)} file groups in the cache")
+        return groups
+
+    def _convert_parallel(self, groups, cdsm_dict, output_ws, cache, merge_tree, progress, endrange):
+        # pylint: disable=too-many-arguments,too-many-positional-arguments
+        """Convert each group of files in a separate worker process
+
+        Each worker saves its partial MDE to a temporary file, that is loaded back as
+        __{output_ws}_part{i} as soon as it is ready, and merged while the other groups are converted.
+        """
+        number_of_workers = min(self.getProperty("NumberOfWorkers").value, len(groups))
+        worker_dict = dict(cdsm_dict)
+        mask = worker_dict.pop("MaskWorkspace")
+        with tempfile.TemporaryDirectory(prefix="shiver_") as tmp_dir:
+            mask_filename = None
+            if mask:
+                mask_filename = os.path.join(tmp_dir, "mask.nxs")
+                SaveNexusProcessed(InputWorkspace=mask, Filename=mask_filename)
+
+            # spawn new processes, as mantid is not fork safe
+            executor = ProcessPoolExecutor(
+                max_workers=number_of_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            try:
+                futures = {
+                    executor.submit(
+                        convert_to_mde_file, f_names, os.path.join(tmp_dir, f"part{i}.nxs"), worker_dict, mask_filename
+                    ): (i, f_names)
+                    for i, f_names in groups
+                }
+                for n_done, future in enumerate(as_completed(futures), start=1):
+                    i, f_names = futures[future]
+                    progress.report(int(endrange * 0.9 * n_done / len(groups)), f"Processed {'+'.join(f_names)}")
+                    LoadMD(Filename=future.result(), OutputWorkspace=f"__{output_ws}_part{i}")
+                    if cache:
+                        cache.add_file(cache.key(f_names), future.result())
+                    else:
+                        os.remove(future.result())
+                    merge_tree.add(i)
+            finally:
+                executor.shutdown(wait=True, cancel_futures=True)
+
 
 AlgorithmFactory.subscribe(GenerateDGSMDE)
 # Puts function in simpleapi globals
@@ -1,9 +1,15 @@
 """Model for the Histogram tab"""
 
+import gzip
 import os.path
-import time
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
 from typing import Tuple
 
+import h5py
 import numpy as np
 
 # pylint: disable=no-name-in-module
@@ -30,12 +36,18 @@ from mantid.simpleapi import (
     mtd,
 )
 
-from shiver.configuration import get_data
+from shiver.configuration import get_data, get_float, get_int
 from shiver.models.generate import GenerateModel
 from shiver.models.polarized import PolarizedModel
 
 logger = Logger("SHIVER")
 
+# prefix of the temporary workspaces, hidden by mantid and ignored by shiver
+TEMPORARY_WS_PREFIX = "__"
+
+# the copies of the file-backed MDE files
+_FILE_BACKED_DIRECTORY = None
+
 
 class HistogramModel:  # pylint: disable=too-many-public-methods
     """Histogram model"""
@@ -47,8 +59,12 @@ class HistogramModel:  # pylint: disable=too-many-public-methods
         self.warning_callback = None
         self.makeslice_finish_callback = None
 
-    def load(self, filename, ws_type):
-        """Method to take filename and workspace type and load with correct algorithm"""
+    def load(self, filename, ws_type) -> Future:
+        """Method to take filename and workspace type and load with correct algorithm
+
+        Returns a future that completes with the workspace name, or fails with the loading error.
+        """
+        future = Future()
         info_step = ""
         ws_name, _ = os.path.splitext(os.path.basename(filename))
         additional_parameters = {}
@@ -56,6 +72,7 @@ class HistogramModel:  # pylint: disable=too-many-public-methods
             info_step = f"Loading {filename} as MDE"
             logger.information(info_step)
             load = AlgorithmManager.create("LoadMD")
+            additional_parameters = get_mde_load_parameters(filename)
         elif ws_type == "mdh":
             info_step = f"Loading {filename} as MDH"
             logger.information(info_step)
@@ -66,7 +83,12 @@ class HistogramModel:  # pylint: disable=too-many-public-methods
             load = AlgorithmManager.create("LoadNexusProcessed")
             additional_parameters = {"LoadHistory": False}
         else:
-            logger.error(f"Unsupported workspace type {ws_type} for {filename}")
+            err_msg = f"Unsupported workspace type {ws_type} for {filename}"
+            logger.error(err_msg)
+            future.set_exception(ValueError(err_msg))
+            if self.error_callback:
+                self.error_callback(err_msg)
+            return future
 
         endrange = 100
         progress = Progress(
@@ -76,8 +98,10 @@ class HistogramModel:  # pylint: disable=too-many-public-methods
             nreports=endrange,  # pylint: disable=possibly-used-before-assignment
         )
         progress.report(info_step)
-        alg_obs = FileLoadingObserver(self, filename, ws_type, ws_name)
+        alg_obs = FileLoadingObserver(self, filename, ws_type, ws_name, future)
         self.algorithms_observers.add(alg_obs)
+        # cancelling the future stops the loading
+        future.add_done_callback(lambda f: load.cancel() if f.cancelled() and load.isRunning() else None)
 
         alg_obs.observeFinish(load)
         alg_obs.observeError(load)
@@ -89,23 +113,31 @@ class HistogramModel:  # pylint: disable=too-many-public-methods
             for key, value in additional_parameters.items():
                 load.setProperty(key, value)
             load.executeAsync()
-        except ValueError as err:
+        except (ValueError, RuntimeError) as err:
             logger.error(str(err))
+            self.algorithms_observers.discard(alg_obs)
+            future.set_exception(err)
             if self.error_callback:
                 self.error_callback(str(err))
+        return future
+
+    def load_dataset(self, dataset: dict, timeout: float = None) -> "DatasetLoading":
+        """Start loading the dataset with given parameters dictionary.
 
-    def load_dataset(self, dataset: dict) -> Tuple[str, str, str]:  # pylint: disable=too-many-branches
-        """Perform dataset loading with given parameters dictionary.
+        The data, background and normalization workspaces are loaded concurrently, without blocking the caller.
 
         Parameters
         ----------
         dataset : dict
             Dictionary of parameters for loading the dataset.
+        timeout : float, optional
+            Time in seconds after which the loading is cancelled, by default no limit.
 
         Returns
         -------
-        Tuple[str, str, str]
-            Tuple of workspace names for data, background and normalization.
+        DatasetLoading
+            Handle on the loading, its result is the tuple of workspace names for data, background
+            and normalization.
         """
         ws_data, ws_background, ws_norm = None, None, None
 
@@ -129,8 +161,7 @@ class HistogramModel:  # pylint: disable=too-many-public-methods
                 if not os.path.isfile(mde_file):
                     ws_data = self.generate_mde(dataset)
                 else:
-                    self.load(mde_file, "mde")
-                    ws_data = mde_name
+                    ws_data = self.load(mde_file, "mde")
             else:
                 ws_data = mde_name
 
@@ -144,8 +175,7 @@ class HistogramModel:  # pylint: disable=too-many-public-methods
                     # self.generate_mde(dataset), not supported at the moment
                     ws_background = None
                 else:
-                    self.load(mde_file, "mde")
-                    ws_background = bg_name
+                    ws_background = self.load(mde_file, "mde")
             else:
                 ws_background = bg_name
 
@@ -154,33 +184,60 @@ class HistogramModel:  # pylint: disable=too-many-public-methods
         if norm_data_file is not None:
             norm_name = os.path.basename(norm_data_file).split(".")[0]
             if not mtd.doesExist(norm_name):
-                self.load(norm_data_file, "norm")
-            ws_norm = norm_name
+                ws_norm = self.load(norm_data_file, "norm")
+            else:
+                ws_norm = norm_name
 
-        # wait until all the workspaces are loaded
-        while not all(mtd.doesExist(ws) for ws in (ws_data, ws_background, ws_norm) if ws is not None):
-            time.sleep(0.1)
+        loading = DatasetLoading([ws_data, ws_background, ws_norm])
+        if timeout is not None:
+            loading.cancel_after(timeout)
+        return loading
 
-        return ws_data, ws_background, ws_norm
+    def generate_mde(self, config_dict: dict) -> Future:
+        """Generate MDE workspace from given parameters dictionary.
 
-    def generate_mde(self, config_dict: dict) -> str:
-        """Generate MDE workspace from given parameters dictionary."""
+        Returns a future that completes with the workspace name once the workspace is generated.
+        """
+        future = Future()
         # if old convention, do not proceed
         if "MdeName" in config_dict.keys():
             if self.error_callback:
                 self.error_callback("Old convention is not supported.")
-            return None
+            future.set_result(None)
+            return future
 
         # make a model of GenerateMDE so that we can use it to call
         # the algorithm directly
         generate_mde_model = GenerateModel()
+        errors = []
+
+        def generate_mde_error(msg):
+            errors.append(msg)
+            if self.error_callback:
+                self.error_callback(msg)
+
+        generate_mde_model.connect_error_message(generate_mde_error)
+
+        def generate_mde_finish(finished):
+            # called with False when starting, and True once the workspace is saved or on error
+            if not finished or future.done():
+                return
+            if errors or not mtd.doesExist(config_dict["mde_name"]):
+                future.set_exception(RuntimeError("\n".join(errors) or f"Failed to generate {config_dict['mde_name']}"))
+            else:
+                future.set_result(config_dict["mde_name"])
+
+        generate_mde_model.connect_generate_mde_finish_callback(generate_mde_finish)
+        # the model needs to stay in scope until the workspace is generated
+        self.algorithms_observers.add(generate_mde_model)
+        future.add_done_callback(lambda _: self.algorithms_observers.discard(generate_mde_model))
         # call the algorithm
         # NOTE: this call will
         #       - create the workspace in memory
         #       - save the workspace to file
         generate_mde_model.generate_mde(config_dict)
 
-        return config_dict["mde_name"]
+        return future
 
     def clone(self, ws_name, ws_clone_name):
         """Clone the workspace"""
@@ -252,9 +309,15 @@ class HistogramModel:  # pylint: disable=too-many-public-methods
         ignore_integrated: bool = False,
         num_ev_norm: bool = False,
         format_str: str = "%.6e",
+        compress: bool = False,
+        chunk_size: int = 100000,
     ):
         """Save an MDHistoToWorkspace to an ascii file (column format).
 
+        The rows are formatted and written in blocks of chunk_size bins. The signal, error and bin coordinates
+        of each block are gathered from the arrays of the workspace, which are not copied as a whole, so the
+        memory used does not depend on the size of the workspace.
+
         Parameters
         ----------
         ws_name : str
@@ -269,6 +332,11 @@ class HistogramModel:  # pylint: disable=too-many-public-methods
             and no MDNorm algorithms were used.
         format_str : str, optional
             Format string for the output (default is "%.6e").
+        compress : bool, optional
+            If True, the file is written with gzip compression, which is also the case if the filename
+            ends with .gz (default is False).
+        chunk_size : int, optional
+            Number of rows written at once (default is 100000).
 
         NOTE
         ----
@@ -294,44 +362,17 @@ class HistogramModel:  # pylint: disable=too-many-public-methods
         else:
             dims = [workspace.getDimension(i) for i in range(workspace.getNumDims())]
         dimarrays = [dim2array(d) for d in dims]
+        shape = [d.getNBins() for d in dims]
 
-        if len(dimarrays) > 1:
-            newdimarrays = np.meshgrid(*dimarrays, indexing="ij")
-        else:
-            newdimarrays = dimarrays
-
-        # get data
-        data = workspace.getSignalArray() * 1.0
-        err2 = workspace.getErrorSquaredArray() * 1.0
-        if num_ev_norm:
-            nev = workspace.getNumEventsArray()
-            data /= nev
-            err2 /= nev * nev
-        err = np.sqrt(err2)
+        # get data, the integrated dimensions of a single bin are removed without copying the arrays
+        data = workspace.getSignalArray().reshape(shape)
+        err2 = workspace.getErrorSquaredArray().reshape(shape)
+        nev = workspace.getNumEventsArray().reshape(shape) if num_ev_norm else None
 
         # get extra header information
         extra_ascii_header = get_data("main_tab.save_mdhisto", "extra_ascii_header")
         if extra_ascii_header:
-            extra_header = "Name: " + ws_name + "\n"
-            try:
-                extra_header += "Instrument: " + str(workspace.getExperimentInfo(0).getInstrument().getName()) + "\n"
-            except Exception as err:
-                logger.information(str(err))
-            try:
-                extra_header += "Ei: " + str(workspace.getExperimentInfo(0).run()["Ei"].value) + "\n"
-            except Exception as err:
-                logger.information(str(err))
-
-            extra_header += "Binning: \n"
-            for d in dims:
-                if d.getNBins() > 1:
-                    step_str = f", step {round(d.getX(1) - d.getX(0), 4)}"
-                else:
-                    step_str = ""
-                extra_header += f"\t{d.name}: {d.getNBins()} bins from {round(d.getMinimum(), 4)} to {round(d.getMaximum(), 4)}{step_str}\n"
-            ol = workspace.getExperimentInfo(0).sample().getOrientedLattice()
-            extra_header += str(ol).replace(" with l", ":\n\tL") + "\n"
-            extra_header += "\tOrientation u:" + str(ol.getuVector()) + "\tv:" + str(ol.getvVector()) + "\n"
+            extra_header = get_extra_header(ws_name, workspace, dims)
 
         # write file
         if extra_ascii_header:
@@ -341,10 +382,88 @@ class HistogramModel:  # pylint: disable=too-many-public-methods
         header += "Intensity Error " + " ".join([d.name for d in dims])
         header += "\n shape: " + "x".join([str(d.getNBins()) for d in dims])
 
-        to_print = np.c_[data.flatten(), err.flatten()]
-        for dim in newdimarrays:
-            to_print = np.c_[to_print, dim.flatten()]
-        np.savetxt(filename, to_print, fmt=format_str, header=header)
+        # same output as np.savetxt, but each block of rows is formatted at once
+        row_format = " ".join([format_str] * (2 + len(dims))) + "\n"
+        if compress or filename.endswith(".gz"):
+            f_open = gzip.open(filename, "wt", encoding="utf-8")
+        else:
+            f_open = open(filename, "w", encoding="utf-8")  # pylint: disable=consider-using-with
+        with f_open:
+            f_open.write("# " + header.replace("\n", "\n# ") + "\n")
+            for start in range(0, data.size, chunk_size):
+                stop = min(start + chunk_size, data.size)
+                # indices of the bins of the block, with the last dimension varying fastest
+                indices = np.unravel_index(np.arange(start, stop), shape)
+                block = np.empty((stop - start, 2 + len(dims)))
+                block[:, 0] = data[indices]
+                block[:, 1] = err2[indices]
+                if nev is not None:
+                    block[:, 0] /= nev[indices]
+                    block[:, 1] /= nev[indices] ** 2
+                np.sqrt(block[:, 1], out=block[:, 1])
+                for i, (dimarray, index) in enumerate(zip(dimarrays, indices)):
+                    block[:, 2 + i] = dimarray[index]
+                f_open.write((row_format * len(block)) % tuple(block.ravel()))
+
+    def save_to_hdf5(self, ws_name: str, filename: str, compress: bool = False):
+        """Save an MDHistoWorkspace to an HDF5 file.
+
+        The file holds the signal, error and num_events datasets, with the workspace shape, and the bin edges of
+        each dimension (dim0_edges, dim1_edges, ...). The dimension names and units, and the same extra header as
+        the ASCII export, are attributes of the file. Uncompressed datasets are contiguous, so they can be
+        memory-mapped with numpy.memmap at the offset given by dataset.id.get_offset().
+
+        Parameters
+        ----------
+        ws_name : str
+            Name of the workspace to save.
+        filename : str
+            Name of the output file.
+        compress : bool, optional
+            If True, the datasets are chunked and compressed with gzip, and can no longer be memory-mapped
+            (default is False).
+        """
+        # sanity check (workspace must exist)
+        if not mtd.doesExist(ws_name):
+            if self.error_callback:
+                self.error_callback(f"Workspace {ws_name} no longer exist in memory.")
+            return
+
+        workspace = mtd[ws_name]
+
+        # sanity check (workspace must be an MDHistoWorkspace)
+        if workspace.id() != "MDHistoWorkspace":
+            if self.error_callback:
+                self.error_callback(f"Workspace {ws_name} is not an MDHistoWorkspace.")
+            return
+
+        dims = [workspace.getDimension(i) for i in range(workspace.getNumDims())]
+        try:
+            header = get_extra_header(ws_name, workspace, dims)
+        except (RuntimeError, ValueError) as err:
+            logger.information(str(err))
+            header = "Name: " + ws_name + "\n"
+
+        arrays = {
+            "signal": workspace.getSignalArray(),
+            "error": np.sqrt(workspace.getErrorSquaredArray()),
+            "num_events": workspace.getNumEventsArray(),
+        }
+        for i, d in enumerate(dims):
+            arrays[f"dim{i}_edges"] = dim2array(d, center=False)
+
+        compression = {"compression": "gzip", "chunks": True} if compress else {}
+        try:
+            with h5py.File(filename, "w") as h5file:
+                for name, array in arrays.items():
+                    h5file.create_dataset(name, data=np.ascontiguousarray(array, dtype=np.float64), **compression)
+                h5file.attrs["dimension_names"] = [d.name for d in dims]
+                h5file.attrs["dimension_units"] = [str(d.getUnits()) for d in dims]
+                h5file.attrs["header"] = header
+        except OSError as err:
+            logger.error(str(err))
+            if self.error_callback:
+                self.error_callback(f"Could not save {ws_name} to {filename}: {err}")
 
     def save_history(self, ws_name, filename):
         """Save the mantid algorithm history"""
@@ -386,6 +505,7 @@ class HistogramModel:  # pylint: disable=too-many-public-methods
             logger.error(err_msg)
             if self.error_callback:
                 self.error_callback(err_msg)
+            obs.set_exception(RuntimeError(err_msg))
         else:
             if ws_type != filter_ws(ws_name):
                 err_msg = f"File {filename} doesn't match type required, deleting workspace {ws_name}"
@@ -393,10 +513,12 @@ class HistogramModel:  # pylint: disable=too-many-public-methods
                 if self.error_callback:
                     self.error_callback(err_msg)
                 DeleteWorkspace(ws_name)
+                obs.set_exception(RuntimeError(err_msg))
             else:
                 logger.information(f"Finished loading {filename}")
+                obs.set_result(ws_name)
 
-            self.algorithms_observers.remove(obs)
+        self.algorithms_observers.discard(obs)
 
     def connect_error_message(self, callback):
         """Set the callback function for error messages"""
@@ -440,13 +562,18 @@ class HistogramModel:  # pylint: disable=too-many-public-methods
         """Set the callback function for workspace changes"""
         self.ads_observers.register_call_back(callback)
 
+    def flush_ws_changes(self):
+        """Pass the pending workspace changes to the callback now"""
+        self.ads_observers.flush()
+
     def get_all_valid_workspaces(self):
         """Get all existing workspaces"""
-        return (
-            (name, filter_ws(name), get_frame(name), get_num_non_integrated_dims(name))
+        workspaces = (
+            (name, *self.ads_observers.get_workspace_info(name))
             for name in mtd.getObjectNames()
-            if filter_ws(name)
+            if not is_temporary_ws(name)
         )
+        return (workspace for workspace in workspaces if workspace[1])
 
     def get_plot_display_name(self, ws_name, ndims):
         """Method retrieve all dimension names, minimum and maximum for displaying in the plot"""
@@ -670,6 +797,74 @@ class HistogramModel:  # pylint: disable=too-many-public-methods
             return None
 
 
+class DatasetLoading:
+    """Handle on the asynchronous loading of a dataset
+
+    It completes once the data, background and normalization workspaces are all loaded, with the tuple of
+    their names as result, or fails with the first loading error.
+    """
+
+    def __init__(self, workspaces):
+        # already loaded workspaces are given by name, the others by the future of their loading
+        self.futures = []
+        for workspace in workspaces:
+            if not isinstance(workspace, Future):
+                future = Future()
+                future.set_result(workspace)
+                workspace = future
+            self.futures.append(workspace)
+        self.future = Future()
+        self.timer = None
+        self.lock = threading.Lock()
+        for future in self.futures:
+            future.add_done_callback(self._component_done)
+
+    def _component_done(self, _):
+        # the loadings finish in different threads
+        with self.lock:
+            if self.future.done() or not all(future.done() for future in self.futures):
+                return
+            if self.timer is not None:
+                self.timer.cancel()
+            for future in self.futures:
+                if future.cancelled():
+                    self.future.cancel()
+                    return
+                if future.exception() is not None:
+                    self.future.set_exception(future.exception())
+                    return
+            self.future.set_result(tuple(future.result() for future in self.futures))
+
+    def done(self) -> bool:
+        """Return True if the loading is finished, failed or was cancelled"""
+        return self.future.done()
+
+    def result(self, timeout: float = None) -> Tuple[str, str, str]:
+        """Wait for the workspace names for data, background and normalization
+
+        Raises concurrent.futures.TimeoutError if the loading is not finished after timeout seconds,
+        CancelledError if it was cancelled, or the loading error.
+        """
+        return self.future.result(timeout)
+
+    def add_done_callback(self, callback):
+        """Call callback(loading) once finished, from the thread that finished the loading"""
+        self.future.add_done_callback(lambda _: callback(self))
+
+    def cancel(self):
+        """Cancel the loading of the workspaces that are not loaded yet"""
+        for future in self.futures:
+            future.cancel()
+        # in case all the workspaces were already loaded
+        self.future.cancel()
+
+    def cancel_after(self, timeout: float):
+        """Cancel the loading if it is not finished after timeout seconds"""
+        self.timer = threading.Timer(timeout, self.cancel)
+        self.timer.daemon = True
+        self.timer.start()
+
+
 class MakeSliceObserver(AlgorithmObserver):
     """Object to handle the execution of MakeSlice algorithms"""
 
@@ -691,12 +886,23 @@ class MakeSliceObserver(AlgorithmObserver):
 class FileLoadingObserver(AlgorithmObserver):
     """Object to handle the execution events of the loading algorithms"""
 
-    def __init__(self, parent, filename, ws_type, ws_name):
+    def __init__(self, parent, filename, ws_type, ws_name, future=None):
         super().__init__()
         self.parent = parent
         self.filename = filename
         self.ws_type = ws_type
         self.ws_name = ws_name
+        self.future = future
+
+    def set_result(self, ws_name):
+        """Complete the future of the loading, unless it was cancelled"""
+        if self.future is not None and not self.future.done():
+            self.future.set_result(ws_name)
+
+    def set_exception(self, err):
+        """Fail the future of the loading, unless it was cancelled"""
+        if self.future is not None and not self.future.done():
+            self.future.set_exception(err)
 
     def finishHandle(self):  # pylint: disable=invalid-name
         """Call parent upon algorithm finishing"""
@@ -708,9 +914,19 @@ class FileLoadingObserver(AlgorithmObserver):
 
 
 class ADSObserver(AnalysisDataServiceObserver):
-    """Object to handle interactions with the ADS"""
+    """Object to handle interactions with the ADS
 
-    def __init__(self):
+    The type, frame and number of non-integrated dimensions of the workspaces are kept in a cache, updated
+    from the ADS notifications. Temporary workspaces (TEMPORARY_WS_PREFIX) are ignored. The generation counts
+    the changes of the ADS, so that the information read while a workspace is replaced is not cached.
+
+    The changes are queued and coalesced per workspace name, and passed to the callback in one list every
+    flush_interval seconds: an add following a delete becomes a replace, and a workspace added then deleted
+    before the flush is never reported. The events are ("clear",), ("del", name) and
+    (action, name, ws_type, frame, ndims) for action "add" or "replace".
+    """
+
+    def __init__(self, flush_interval=0.1):
         super().__init__()
         self.observeClear(True)
         self.observeAdd(True)
@@ -719,33 +935,103 @@ class ADSObserver(AnalysisDataServiceObserver):
         self.observeRename(True)
 
         self.callback = None
-
-    def clearHandle(self):  # pylint: disable=invalid-name
-        """Callback handle for ADS clear"""
-        logger.debug("clearHandle")
-        if self.callback:
+        self.workspace_info = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+        self.flush_interval = flush_interval
+        self.pending_clear = False
+        self.pending = OrderedDict()
+        self.timer = None
+
+    def get_workspace_info(self, name):
+        """Returns the type, frame and number of non-integrated dimensions of a workspace"""
+        with self.lock:
+            info = self.workspace_info.get(name)
+            generation = self.generation
+        if info is None:
+            info = get_workspace_info(name)
+            with self.lock:
+                # the workspace may have been replaced while its information was read
+                if self.generation == generation:
+                    self.workspace_info[name] = info
+        return info
+
+    def queue(self, action, name=None, info=None):
+        """Add a change to the queue, coalesced with the pending change of the same workspace"""
+        if not self.callback:
+            return
+        with self.lock:
+            if action == "clear":
+                self.pending.clear()
+                self.pending_clear = True
+            elif action == "add":
+                previous = self.pending.pop(name, (None,))[0]
+                self.pending[name] = ("replace" if previous in ("del", "replace") else "add", info)
+            else:
+                previous = self.pending.pop(name, (None,))[0]
+                # a workspace added since the last flush was never shown
+                if previous != "add":
+                    self.pending[name] = ("del", None)
+            if self.timer is None and self.flush_interval > 0:
+                self.timer = threading.Timer(self.flush_interval, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+        if self.flush_interval <= 0:
+            self.flush()
+
+    def flush(self):
+        """Pass the pending changes to the callback"""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            events = [("clear",)] if self.pending_clear else []
+            for name, (action, info) in self.pending.items():
+                events.append((action, name) if action == "del" else (action, name, *info))
+            self.pending_clear = False
+            self.pending.clear()
+        if events and self.callback:
             # NOTE: When closing the application, mantid will clear the ADS after
             #       Shiver is closed, which will cause a RuntimeError as widgets
             #       under shiver is no longer in scope.
             try:
-                self.callback("clear", None, None)
+                self.callback(events)
             except RuntimeError:
                 pass
 
+    def clearHandle(self):  # pylint: disable=invalid-name
+        """Callback handle for ADS clear"""
+        logger.debug("clearHandle")
+        with self.lock:
+            self.workspace_info.clear()
+            self.generation += 1
+        self.queue("clear")
+
     def addHandle(self, ws, _):  # pylint: disable=invalid-name
         """Callback handle for ADS add"""
+        if is_temporary_ws(ws):
+            return
         logger.debug(f"addHandle: {ws}")
-        if self.callback:
-            self.callback("add", ws, filter_ws(ws), get_frame(ws), get_num_non_integrated_dims(ws))
+        info = get_workspace_info(ws)
+        with self.lock:
+            self.workspace_info[ws] = info
+            self.generation += 1
+        self.queue("add", ws, info)
 
     def deleteHandle(self, ws, _):  # pylint: disable=invalid-name
         """Callback handle for ADS delete"""
+        if is_temporary_ws(ws):
+            return
         logger.debug(f"deleteHandle: {ws}")
-        if self.callback:
-            self.callback("del", ws, None)
+        with self.lock:
+            self.workspace_info.pop(ws, None)
+            self.generation += 1
+        self.queue("del", ws)
 
     def replaceHandle(self, ws, _):  # pylint: disable=invalid-name
         """Callback handle for ADS replace"""
+        if is_temporary_ws(ws):
+            return
         logger.debug(f"replaceHandle: {ws}")
         self.deleteHandle(ws, None)
         self.addHandle(ws, None)
@@ -753,31 +1039,85 @@ class ADSObserver(AnalysisDataServiceObserver):
     def renameHandle(self, old, new):  # pylint: disable=invalid-name
         """Callback handle for ADS rename"""
         logger.debug(f"renameHandle: {old} {new}")
+        # the workspace is the same, its information can be reused
+        with self.lock:
+            info = self.workspace_info.get(old)
         self.deleteHandle(old, None)
-        self.addHandle(new, None)
+        if is_temporary_ws(new):
+            return
+        if info is None:
+            info = get_workspace_info(new)
+        with self.lock:
+            self.workspace_info[new] = info
+            self.generation += 1
+        self.queue("add", new, info)
 
     def register_call_back(self, callback):
-        """Set the callback function for workspace changes"""
+        """Set the callback function for the lists of workspace changes"""
         self.callback = callback
 
 
-def filter_ws(name):
+def get_mde_load_parameters(filename) -> dict:
+    """Return the additional LoadMD parameters for an MDE file
+
+    MDE files larger than the memory budget in the configuration are loaded file-backed: the boxes stay on disk
+    and only a cache of them is kept in memory. A file-backed workspace writes its changes back to its file, so the
+    file is first copied to a temporary directory and LoadMD opens the copy. The copy takes as much disk space as the
+    original file until shiver exits.
+    """
+    memory_budget = get_float("main_tab.load_mde", "mde_memory_budget", 0.0)
+    cache_size = get_int("main_tab.load_mde", "file_backed_cache_size", 0)
+    if memory_budget <= 0 or not os.path.isfile(filename) or os.path.getsize(filename) <= memory_budget * 1e9:
+        return {}
+    logger.information(f"{filename} is larger than the memory budget of {memory_budget} GB, loading it file-backed")
+    global _FILE_BACKED_DIRECTORY  # pylint: disable=global-statement
+    if _FILE_BACKED_DIRECTORY is None:
+        # removed with its content when shiver exits
+        _FILE_BACKED_DIRECTORY = tempfile.TemporaryDirectory(prefix="shiver_")
+    handle, copy_filename = tempfile.mkstemp(suffix=f"_{os.path.basename(filename)}", dir=_FILE_BACKED_DIRECTORY.name)
+    os.close(handle)
+    try:
+        shutil.copy(filename, copy_filename)
+    except OSError as err:
+        os.remove(copy_filename)
+        logger.warning(f"Cannot copy {filename} for a file-backed load, loading it in memory: {err}")
+        return {}
+    parameters = {"Filename": copy_filename, "FileBackEnd": True}
+    if cache_size > 0:
+        parameters["Memory"] = cache_size
+    return parameters
+
+
+def is_temporary_ws(name):
+    """Returns True for the temporary workspaces of shiver and mantid algorithms"""
+    return name.startswith(TEMPORARY_WS_PREFIX)
+
+
+def get_workspace_info(name):
+    """Returns the type, frame and number of non-integrated dimensions of a workspace"""
+    workspace = mtd[name]
+    return filter_ws(name, workspace), get_frame(name, workspace), get_num_non_integrated_dims(name, workspace)
+
+
+def filter_ws(name, workspace=None):
     """Return the type of workspace"""
-    ws_id = mtd[name].id()
+    if workspace is None:
+        workspace = mtd[name]
+    ws_id = workspace.id()
     ws_type = None
 
     if ws_id == "MDHistoWorkspace":
-        if mtd[name].getSpecialCoordinateSystem().name == "HKL":
+        if workspace.getSpecialCoordinateSystem().name == "HKL":
             ws_type = "mdh"
     elif ws_id == "Workspace2D":
         # verify if it is one bin per histogram
-        if mtd[name].blocksize() == 1:
+        if workspace.blocksize() == 1:
             ws_type = "norm"
         else:
             logger.error(f"Workspace2D {name} has more than one bin per histogram")
-    elif ws_id.startswith("MDEventWorkspace") and mtd[name].getNumDims() >= 4:
+    elif ws_id.startswith("MDEventWorkspace") and workspace.getNumDims() >= 4:
         # More detailed check
-        mde_ws = mtd[name]
+        mde_ws = workspace
 
         # check SpecialCoordinateSystem is either QSample or QLab
         if mde_ws.getSpecialCoordinateSystem().name in ("QSample", "QLab"):
@@ -801,20 +1141,51 @@ def filter_ws(name):
     return ws_type
 
 
-def get_frame(name):
+def get_frame(name, workspace=None):
     """Returns the MDE frame for the given workspace name"""
-    if hasattr(mtd[name], "getSpecialCoordinateSystem"):
-        return mtd[name].getSpecialCoordinateSystem().name
+    if workspace is None:
+        workspace = mtd[name]
+    if hasattr(workspace, "getSpecialCoordinateSystem"):
+        return workspace.getSpecialCoordinateSystem().name
     return None
 
 
-def get_num_non_integrated_dims(name):
+def get_num_non_integrated_dims(name, workspace=None):
     """Returns the number of non-integrated dimensions"""
-    if hasattr(mtd[name], "getNonIntegratedDimensions"):
-        return len(mtd[name].getNonIntegratedDimensions())
+    if workspace is None:
+        workspace = mtd[name]
+    if hasattr(workspace, "getNonIntegratedDimensions"):
+        return len(workspace.getNonIntegratedDimensions())
     return -1
 
 
+def get_extra_header(ws_name, workspace, dims) -> str:
+    """Returns the name, instrument, Ei, binning and lattice information of an MDHisto workspace"""
+    extra_header = "Name: " + ws_name + "\n"
+    try:
+        extra_header += "Instrument: " + str(workspace.getExperimentInfo(0).getInstrument().getName()) + "\n"
+    except Exception as err:
+        logger.information(str(err))
+    try:
+        extra_header += "Ei: " + str(workspace.getExperimentInfo(0).run()["Ei"].value) + "\n"
+    except Exception as err:
+        logger.information(str(err))
+
+    extra_header += "Binning: \n"
+    for d in dims:
+        if d.getNBins() > 1:
+            step_str = f", step {round(d.getX(1) - d.getX(0), 4)}"
+        else:
+            step_str = ""
+        extra_header += (
+            f"\t{d.name}: {d.getNBins()} bins from {round(d.getMinimum(), 4)} to {round(d.getMaximum(), 4)}{step_str}\n"
+        )
+    ol = workspace.getExperimentInfo(0).sample().getOrientedLattice()
+    extra_header += str(ol).replace(" with l", ":\n\tL") + "\n"
+    extra_header += "\tOrientation u:" + str(ol.getuVector()) + "\tv:" + str(ol.getvVector()) + "\n"
+    return extra_header
+
+
 def dim2array(dim, center=True) -> np.ndarray:
     """
     Create a numpy array containing bin centers along the dimension d.
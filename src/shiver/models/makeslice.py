@@ -31,6 +31,7 @@ from mantid.simpleapi import (
     _create_algorithm_function,
 )
 
+from shiver.models.mdnorm_cache import OUTPUT_PARAMETERS, mdnorm_cache
 from shiver.version import __version__
 
 
@@ -113,12 +114,18 @@ class MakeSlice(DataProcessorAlgorithm):
         slice_name = self.getPropertyValue("OutputWorkspace")
         # MdeName
         mde_name = str(self.getProperty("InputWorkspace").value).strip()
+        # temporary workspaces, named after the output so that several slices can be made at the same time
+        data_name = f"__{slice_name}_data"
+        norm_name = f"__{slice_name}_norm"
+        bkg_name = f"__{slice_name}_bkg"
+        bkg_data_name = f"__{slice_name}_bkg_data"
+        bkg_norm_name = f"__{slice_name}_bkg_norm"
 
         mdnorm_parameters = {
             "InputWorkspace": mde_name,
             "OutputWorkspace": slice_name,
-            "OutputDataWorkspace": "_data",
-            "OutputNormalizationWorkspace": "_norm",
+            "OutputDataWorkspace": data_name,
+            "OutputNormalizationWorkspace": norm_name,
         }
 
         mdnorm_parameters["SolidAngleWorkspace"] = self.getProperty("NormalizationWorkspace").value
@@ -147,18 +154,18 @@ class MakeSlice(DataProcessorAlgorithm):
         if bg_mde_name:
             if mtd[bg_mde_name].getSpecialCoordinateSystem() == SpecialCoordinateSystem.QLab:
                 mdnorm_parameters["BackgroundWorkspace"] = bg_mde_name
-                mdnorm_parameters["OutputBackgroundDataWorkspace"] = "_bkg_data"
-                mdnorm_parameters["OutputBackgroundNormalizationWorkspace"] = "_bkg_norm"
+                mdnorm_parameters["OutputBackgroundDataWorkspace"] = bkg_data_name
+                mdnorm_parameters["OutputBackgroundNormalizationWorkspace"] = bkg_norm_name
             elif mtd[bg_mde_name].getSpecialCoordinateSystem() == SpecialCoordinateSystem.QSample:
                 mdnorm_bkg_parameters = mdnorm_parameters.copy()
                 mdnorm_bkg_parameters["InputWorkspace"] = bg_mde_name
-                mdnorm_bkg_parameters["OutputWorkspace"] = "_bkg"
-                mdnorm_bkg_parameters["OutputDataWorkspace"] = "_bkg_data"
-                mdnorm_bkg_parameters["OutputNormalizationWorkspace"] = "_bkg_norm"
+                mdnorm_bkg_parameters["OutputWorkspace"] = bkg_name
+                mdnorm_bkg_parameters["OutputDataWorkspace"] = bkg_data_name
+                mdnorm_bkg_parameters["OutputNormalizationWorkspace"] = bkg_norm_name
                 bg_type = "sample"
-                MDNorm(**mdnorm_bkg_parameters, startProgress=0, endProgress=0.5)
+                self._mdnorm(mdnorm_bkg_parameters, startProgress=0, endProgress=0.5)
 
-        MDNorm(**mdnorm_parameters, startProgress=0.5 if bg_mde_name else 0, endProgress=1)
+        self._mdnorm(mdnorm_parameters, startProgress=0.5 if bg_mde_name else 0, endProgress=1)
 
         SmoothingFWHM = self.getProperty("Smoothing").value
         if SmoothingFWHM == Property.EMPTY_DBL:
@@ -166,44 +173,79 @@ class MakeSlice(DataProcessorAlgorithm):
 
         if SmoothingFWHM:
             SmoothMD(
-                InputWorkspace="_data",
+                InputWorkspace=data_name,
                 WidthVector=SmoothingFWHM,
                 Function="Gaussian",
-                InputNormalizationWorkspace="_norm",
-                OutputWorkspace="_data",
+                InputNormalizationWorkspace=norm_name,
+                OutputWorkspace=data_name,
             )
             SmoothMD(
-                InputWorkspace="_norm",
+                InputWorkspace=norm_name,
                 WidthVector=SmoothingFWHM,
                 Function="Gaussian",
-                InputNormalizationWorkspace="_norm",
-                OutputWorkspace="_norm",
+                InputNormalizationWorkspace=norm_name,
+                OutputWorkspace=norm_name,
             )
-            DivideMD(LHSWorkspace="_data", RHSWorkspace="_norm", OutputWorkspace=slice_name)
+            DivideMD(LHSWorkspace=data_name, RHSWorkspace=norm_name, OutputWorkspace=slice_name)
             if bg_mde_name:
                 SmoothMD(
-                    InputWorkspace="_bkg_data",
+                    InputWorkspace=bkg_data_name,
                     WidthVector=SmoothingFWHM,
                     Function="Gaussian",
-                    InputNormalizationWorkspace="_bkg_norm",
-                    OutputWorkspace="_bkg_data",
+                    InputNormalizationWorkspace=bkg_norm_name,
+                    OutputWorkspace=bkg_data_name,
                 )
                 SmoothMD(
-                    InputWorkspace="_bkg_norm",
+                    InputWorkspace=bkg_norm_name,
                     WidthVector=SmoothingFWHM,
                     Function="Gaussian",
-                    InputNormalizationWorkspace="_bkg_norm",
-                    OutputWorkspace="_bkg_norm",
+                    InputNormalizationWorkspace=bkg_norm_name,
+                    OutputWorkspace=bkg_norm_name,
                 )
-                DivideMD(LHSWorkspace="_bkg_data", RHSWorkspace="_bkg_norm", OutputWorkspace="_bkg")
+                DivideMD(LHSWorkspace=bkg_data_name, RHSWorkspace=bkg_norm_name, OutputWorkspace=bkg_name)
 
-                MinusMD(LHSWorkspace=slice_name, RHSWorkspace="_bkg", OutputWorkspace=slice_name)
+                MinusMD(LHSWorkspace=slice_name, RHSWorkspace=bkg_name, OutputWorkspace=slice_name)
         elif bg_type == "sample":  # there is background from multi-angle
-            MinusMD(LHSWorkspace=slice_name, RHSWorkspace="_bkg", OutputWorkspace=slice_name)
+            MinusMD(LHSWorkspace=slice_name, RHSWorkspace=bkg_name, OutputWorkspace=slice_name)
 
         Comment(slice_name, f"Shiver version {__version__}")
         self.setProperty("OutputWorkspace", mtd[slice_name])
-        DeleteWorkspaces([ws for ws in ["_bkg", "_bkg_data", "_bkg_norm", "_data", "_norm"] if mtd.doesExist(ws)])
+        DeleteWorkspaces(
+            [ws for ws in [bkg_name, bkg_data_name, bkg_norm_name, data_name, norm_name] if mtd.doesExist(ws)]
+        )
+
+    def _mdnorm(self, parameters, startProgress, endProgress):
+        """Run MDNorm, or reuse the outputs of a previous run with the same inputs
+
+        Changing only the smoothing or the background of a slice does not need to go through the events again.
+        """
+        outputs = {name: parameters[name] for name in OUTPUT_PARAMETERS if name in parameters}
+        key = mdnorm_cache.key(parameters)
+        cached_outputs = mdnorm_cache.get(key)
+        if cached_outputs is None:
+            MDNorm(**parameters, startProgress=startProgress, endProgress=endProgress)
+            # the outputs are only copied when they fit in the cache
+            size = sum(mtd[ws_name].getMemorySize() for ws_name in outputs.values())
+            if mdnorm_cache.fits(size):
+                mdnorm_cache.add(
+                    key,
+                    mdnorm_cache.input_names(parameters),
+                    {name: self._clone(mtd[ws_name]) for name, ws_name in outputs.items()},
+                    size,
+                )
+        else:
+            self.log().information("Using cached MDNorm outputs")
+            # the outputs are modified later (in place background subtraction), so the cache keeps its own copies
+            for name, ws_name in outputs.items():
+                mtd.addOrReplace(ws_name, self._clone(cached_outputs[name]))
+
+    def _clone(self, workspace):
+        """Return a copy of the MDHisto workspace, outside of the ADS and not recorded in the history"""
+        clone = self.createChildAlgorithm("CloneMDWorkspace", enableLogging=False)
+        clone.setProperty("InputWorkspace", workspace)
+        clone.setPropertyValue("OutputWorkspace", "_clone")
+        clone.execute()
+        return clone.getProperty("OutputWorkspace").value
 
 
 AlgorithmFactory.subscribe(MakeSlice)
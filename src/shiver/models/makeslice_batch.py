@@ -0,0 +1,298 @@
+"""The Shiver MakeSliceBatch mantid algorithm"""
+
+# pylint: disable=no-name-in-module
+import json
+
+from mantid.api import (
+    AlgorithmFactory,
+    DataProcessorAlgorithm,
+    Progress,
+    mtd,
+)
+from mantid.kernel import (
+    Direction,
+    Property,
+    SpecialCoordinateSystem,
+    StringArrayProperty,
+    StringMandatoryValidator,
+)
+from mantid.simpleapi import (
+    Comment,
+    DeleteWorkspaces,
+    DivideMD,
+    IntegrateMDHistoWorkspace,
+    MDNorm,
+    MinusMD,
+    SmoothMD,
+    _create_algorithm_function,
+)
+
+from shiver.version import __version__
+
+DEFAULT_DIMENSION_NAMES = ["QDimension0", "QDimension1", "QDimension2", "DeltaE"]
+SLICE_KEYS = (
+    ["Name", "Smoothing"]
+    + [f"Dimension{i}Name" for i in range(len(DEFAULT_DIMENSION_NAMES))]
+    + [f"Dimension{i}Binning" for i in range(len(DEFAULT_DIMENSION_NAMES))]
+)
+
+
+def parse_binning(binning):
+    """Return the binning parameters as a list of floats"""
+    if binning is None:
+        return []
+    if isinstance(binning, str):
+        return [float(value) for value in binning.split(",") if value.strip()]
+    return [float(value) for value in binning]
+
+
+def integration_binning(binning, dimension, tolerance=1e-6):
+    """Return the IntegrateMDHistoWorkspace parameters to obtain the binning from a dimension of a finer histogram
+
+    The bin edges of the requested binning must be aligned with the bin edges of the dimension, and the step must
+    be a multiple of the bin width. Otherwise None is returned.
+    """
+    if len(binning) not in (2, 3):
+        return None
+    width = dimension.getBinWidth()
+    first_edge = dimension.getMinimum()
+    minimum, maximum = binning[0], binning[-1]
+
+    def aligned(value):
+        n_bins = (value - first_edge) / width
+        return abs(n_bins - round(n_bins)) < tolerance
+
+    if minimum < first_edge - tolerance * width or maximum > dimension.getMaximum() + tolerance * width:
+        return None
+    if not (aligned(minimum) and aligned(maximum)):
+        return None
+    if len(binning) == 2:
+        return [minimum, maximum]
+
+    step = binning[1]
+    if step <= 0:
+        return None
+    ratio = step / width
+    n_bins = (maximum - minimum) / step
+    if abs(ratio - round(ratio)) > tolerance or abs(n_bins - round(n_bins)) > tolerance:
+        return None
+    if round(ratio) == 1 and abs(minimum - first_edge) < tolerance * width and round(n_bins) == dimension.getNBins():
+        # same binning, nothing to do
+        return []
+    return [minimum, step, maximum]
+
+
+class MakeSliceBatch(DataProcessorAlgorithm):
+    # pylint: disable=invalid-name,missing-function-docstring
+    """MakeSliceBatch algorithm"""
+
+    def name(self):
+        return "MakeSliceBatch"
+
+    def category(self):
+        return "Shiver"
+
+    def summary(self):
+        return "Makes several slices sharing the same projection, reusing the normalization between slices"
+
+    def PyInit(self):
+        self.copyProperties(
+            "MakeSlice",
+            [
+                "InputWorkspace",
+                "BackgroundWorkspace",
+                "NormalizationWorkspace",
+                "QDimension0",
+                "QDimension1",
+                "QDimension2",
+                "SymmetryOperations",
+            ],
+        )
+
+        self.declareProperty(
+            name="Slices",
+            defaultValue="",
+            validator=StringMandatoryValidator(),
+            direction=Direction.Input,
+            doc="JSON list of slice descriptions. Each one is a dictionary with the output Name, and optionally"
+            " Dimension0Name ... Dimension3Name, Dimension0Binning ... Dimension3Binning and Smoothing, as in MakeSlice",
+        )
+
+        self.declareProperty(
+            StringArrayProperty(name="OutputWorkspaces", direction=Direction.Output),
+            doc="Names of the output MDHisto workspaces",
+        )
+
+    def validateInputs(self):
+        issues = {}
+        try:
+            slices = self._get_slices()
+        except ValueError as err:
+            issues["Slices"] = f"Invalid JSON list of slice descriptions: {err}"
+            return issues
+        names = []
+        for index, description in enumerate(slices):
+            if not isinstance(description, dict) or not str(description.get("Name", "")).strip():
+                issues["Slices"] = f"Slice description #{index} must be a dictionary with a Name"
+                break
+            unknown_keys = set(description) - set(SLICE_KEYS)
+            if unknown_keys:
+                issues["Slices"] = f"Slice description #{index} has invalid keys: {', '.join(sorted(unknown_keys))}"
+                break
+            names.append(description["Name"].strip())
+        if len(names) != len(set(names)):
+            issues["Slices"] = "The slice names must be unique"
+        return issues
+
+    def PyExec(self):
+        slices = self._get_slices()
+        progress = Progress(self, start=0.0, end=1.0, nreports=len(slices))
+
+        # histograms with the most bins first, so the others can be obtained from them
+        order = sorted(range(len(slices)), key=lambda index: -self._number_of_bins(slices[index]))
+        parents = []
+        output_names = [description["Name"].strip() for description in slices]
+        try:
+            for index in order:
+                description = slices[index]
+                progress.report(f"Making {output_names[index]}")
+                dimension_names = [
+                    description.get(f"Dimension{i}Name", default) for i, default in enumerate(DEFAULT_DIMENSION_NAMES)
+                ]
+                binnings = [
+                    parse_binning(description.get(f"Dimension{i}Binning")) for i in range(len(DEFAULT_DIMENSION_NAMES))
+                ]
+                intermediates = self._integrate_parent(parents, dimension_names, binnings, output_names[index])
+                if intermediates is None:
+                    intermediates = self._normalize(description, dimension_names, output_names[index])
+                    parents.append((dimension_names, intermediates))
+                    self._make_slice(output_names[index], description.get("Smoothing"), intermediates)
+                else:
+                    self._make_slice(output_names[index], description.get("Smoothing"), intermediates)
+                    DeleteWorkspaces(list(intermediates.values()))
+        finally:
+            DeleteWorkspaces([ws for _, parent in parents for ws in parent.values() if mtd.doesExist(ws)])
+
+        self.setProperty("OutputWorkspaces", output_names)
+
+    def _get_slices(self):
+        slices = json.loads(self.getPropertyValue("Slices").replace("'", '"'))
+        if not isinstance(slices, list):
+            raise ValueError("not a list")
+        return slices
+
+    @staticmethod
+    def _number_of_bins(description):
+        n_bins = 1
+        for i in range(len(DEFAULT_DIMENSION_NAMES)):
+            binning = parse_binning(description.get(f"Dimension{i}Binning"))
+            if len(binning) == 3 and binning[1] > 0:
+                n_bins *= max(round((binning[2] - binning[0]) / binning[1]), 1)
+        return n_bins
+
+    def _integrate_parent(self, parents, dimension_names, binnings, slice_name):
+        """Obtain the data and normalization histograms by integrating an existing finer histogram
+
+        Both the data and the normalization are sums over the bins, so integrating the bins of a finer histogram
+        gives the same result as MDNorm with the coarser binning, without going through the events again.
+        """
+        for parent_names, parent in parents:
+            if parent_names != dimension_names:
+                continue
+            parent_data = mtd[parent["data"]]
+            if parent_data.getNumDims() != len(binnings):
+                continue
+            integration = [integration_binning(b, parent_data.getDimension(i)) for i, b in enumerate(binnings)]
+            if None in integration:
+                continue
+            self.log().information(f"{slice_name} is obtained from the {parent['data']} histogram")
+            intermediates = {}
+            for key, ws in parent.items():
+                intermediates[key] = f"__{slice_name}_{key}"
+                IntegrateMDHistoWorkspace(
+                    InputWorkspace=ws,
+                    **{f"P{i + 1}Bin": p_bin for i, p_bin in enumerate(integration)},
+                    OutputWorkspace=intermediates[key],
+                )
+            return intermediates
+        return None
+
+    def _normalize(self, description, dimension_names, slice_name):
+        """Run MDNorm for the slice, and return the names of the data and normalization histograms
+
+        The temporary histograms are named after the slice, so that several batches can run at the same time.
+        """
+        intermediates = {"data": f"__{slice_name}_data", "norm": f"__{slice_name}_norm"}
+        mdnorm_parameters = {
+            "InputWorkspace": self.getPropertyValue("InputWorkspace"),
+            "OutputWorkspace": f"__{slice_name}",
+            "OutputDataWorkspace": intermediates["data"],
+            "OutputNormalizationWorkspace": intermediates["norm"],
+            "SolidAngleWorkspace": self.getProperty("NormalizationWorkspace").value,
+        }
+        for par_name in ["QDimension0", "QDimension1", "QDimension2", "SymmetryOperations"]:
+            mdnorm_parameters[par_name] = self.getProperty(par_name).value
+        for i, dimension_name in enumerate(dimension_names):
+            mdnorm_parameters[f"Dimension{i}Name"] = dimension_name
+            mdnorm_parameters[f"Dimension{i}Binning"] = description.get(f"Dimension{i}Binning", "")
+
+        outputs = [f"__{slice_name}"]
+        bg_mde_name = self.getProperty("BackgroundWorkspace").valueAsStr
+        if bg_mde_name:
+            intermediates["bkg_data"] = f"__{slice_name}_bkg_data"
+            intermediates["bkg_norm"] = f"__{slice_name}_bkg_norm"
+            if mtd[bg_mde_name].getSpecialCoordinateSystem() == SpecialCoordinateSystem.QLab:
+                mdnorm_parameters["BackgroundWorkspace"] = bg_mde_name
+                mdnorm_parameters["OutputBackgroundDataWorkspace"] = intermediates["bkg_data"]
+                mdnorm_parameters["OutputBackgroundNormalizationWorkspace"] = intermediates["bkg_norm"]
+            else:
+                mdnorm_bkg_parameters = mdnorm_parameters.copy()
+                mdnorm_bkg_parameters["InputWorkspace"] = bg_mde_name
+                mdnorm_bkg_parameters["OutputWorkspace"] = f"__{slice_name}_bkg"
+                mdnorm_bkg_parameters["OutputDataWorkspace"] = intermediates["bkg_data"]
+                mdnorm_bkg_parameters["OutputNormalizationWorkspace"] = intermediates["bkg_norm"]
+                outputs.append(f"__{slice_name}_bkg")
+                MDNorm(**mdnorm_bkg_parameters)
+
+        MDNorm(**mdnorm_parameters)
+        DeleteWorkspaces(outputs)
+        return intermediates
+
+    def _make_slice(self, slice_name, smoothing, intermediates):
+        """Divide the data by the normalization, with optional smoothing and background subtraction"""
+        if smoothing == Property.EMPTY_DBL:
+            smoothing = None
+        temporaries = []
+        histograms = dict(intermediates)
+        if smoothing:
+            for data, norm in [("data", "norm"), ("bkg_data", "bkg_norm")]:
+                if data not in histograms:
+                    continue
+                for key in [data, norm]:
+                    SmoothMD(
+                        InputWorkspace=histograms[key],
+                        WidthVector=smoothing,
+                        Function="Gaussian",
+                        InputNormalizationWorkspace=intermediates[norm],
+                        OutputWorkspace=f"__{slice_name}_smooth_{key}",
+                    )
+                    histograms[key] = f"__{slice_name}_smooth_{key}"
+                    temporaries.append(histograms[key])
+
+        DivideMD(LHSWorkspace=histograms["data"], RHSWorkspace=histograms["norm"], OutputWorkspace=slice_name)
+        if "bkg_data" in histograms:
+            bkg_name = f"__{slice_name}_bkg"
+            DivideMD(LHSWorkspace=histograms["bkg_data"], RHSWorkspace=histograms["bkg_norm"], OutputWorkspace=bkg_name)
+            temporaries.append(bkg_name)
+            MinusMD(LHSWorkspace=slice_name, RHSWorkspace=bkg_name, OutputWorkspace=slice_name)
+        Comment(slice_name, f"Shiver version {__version__}")
+        if temporaries:
+            DeleteWorkspaces(temporaries)
+
+
+AlgorithmFactory.subscribe(MakeSliceBatch)
+
+# Puts function in simpleapi globals
+makeslice_batch = MakeSliceBatch()
+makeslice_batch.initialize()
+_create_algorithm_function("MakeSliceBatch", 1, makeslice_batch)
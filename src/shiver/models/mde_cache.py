@@ -0,0 +1,98 @@
+"""On-disk cache of the partial MDEvent workspaces converted by GenerateDGSMDE"""
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy
+from mantid.kernel import Logger
+from mantid.simpleapi import DeleteWorkspace, ExtractMask, SaveMD  # pylint: disable=no-name-in-module
+
+from shiver.version import __version__
+
+logger = Logger("SHIVER")
+
+
+class MDECache:
+    """Content-addressed cache of converted MDEvent workspaces
+
+    Each entry is an MD file named after the hash of the raw files identity (path, modification time and size)
+    and of the reduction parameters. The least recently used entries are removed when the total size of the
+    cache goes over max_size (in GB).
+    """
+
+    extension = ".nxs"
+
+    def __init__(self, directory, max_size, parameters):
+        self.directory = Path(directory)
+        self.max_size = max_size * 1e9
+        # the shiver version is part of the key, so changes in the conversion invalidate the cache
+        parameters = dict(parameters, ShiverVersion=__version__)
+        self.parameters = json.dumps(parameters, sort_keys=True, default=str)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def key(self, filenames):
+        """Return the cache key for a group of raw files"""
+        hasher = hashlib.sha256(self.parameters.encode())
+        for filename in filenames:
+            stat = os.stat(filename)
+            hasher.update(f"{Path(filename).resolve()}:{stat.st_mtime_ns}:{stat.st_size}".encode())
+        return hasher.hexdigest()
+
+    def path(self, key):
+        """Return the path of the cache entry for the key"""
+        return self.directory / f"{key}{self.extension}"
+
+    def get(self, key):
+        """Return the path of the cache entry, or None if it is not in the cache"""
+        path = self.path(key)
+        if not path.exists():
+            return None
+        # the modification time keeps track of the last use
+        os.utime(path)
+        logger.information(f"Using cached MDE {path}")
+        return str(path)
+
+    def add(self, key, workspace):
+        """Save the workspace in the cache"""
+        with tempfile.TemporaryDirectory(dir=self.directory) as tmp_dir:
+            filename = os.path.join(tmp_dir, f"{key}{self.extension}")
+            SaveMD(InputWorkspace=workspace, Filename=filename)
+            self.add_file(key, filename)
+
+    def add_file(self, key, filename):
+        """Move an already saved MD file in the cache"""
+        # the file can be on a different file system, only the last step is atomic
+        tmp_path = self.path(key).with_suffix(".tmp")
+        shutil.move(filename, tmp_path)
+        os.replace(tmp_path, self.path(key))
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in max_size"""
+        entries = []
+        for path in self.directory.glob(f"*{self.extension}"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            logger.information(f"Removing {path} from the MDE cache")
+            path.unlink(missing_ok=True)
+            total_size -= size
+
+
+def mask_hash(mask_workspace):
+    """Return a hash of the masked detectors of a workspace, to be used as a cache parameter"""
+    if not mask_workspace:
+        return None
+    extracted_mask, detector_list = ExtractMask(InputWorkspace=mask_workspace, OutputWorkspace="__mde_cache_mask")
+    DeleteWorkspace(extracted_mask)
+    return hashlib.sha256(numpy.sort(numpy.asarray(detector_list, dtype=numpy.int64)).tobytes()).hexdigest()
@@ -0,0 +1,94 @@
+"""Hierarchical merge of the partial MDEvent workspaces converted by GenerateDGSMDE"""
+
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from mantid.simpleapi import DeleteWorkspaces, MergeMD, mtd  # pylint: disable=no-name-in-module
+
+
+class MDEMergeTree:
+    """Merge a list of partial MDEvent workspaces in a binary tree, as soon as they are ready
+
+    The parts are the leaves of the tree, in the order of the list. Two neighbouring parts (or merged
+    parts) are merged as soon as both are ready, and the inputs are deleted right after, so only a
+    few partial workspaces are in memory at the same time when they are ready in order. The order of
+    the experiment infos is the order of the list, whatever the order in which the parts are ready.
+    With more than one worker, the merges of the different branches run in parallel threads.
+    close must be called at the end, to delete the partial workspaces that are left after an error.
+    """
+
+    def __init__(self, names, prefix, max_workers=1):
+        self.names = list(names)
+        self.prefix = prefix
+        self.depth = math.ceil(math.log2(len(self.names))) if len(self.names) > 1 else 0
+        self.ready = {}
+        self.root = None
+        # the merged workspace, once returned by result
+        self.merged = None
+        self.lock = threading.Lock()
+        self.futures = []
+        self.executor = ThreadPoolExecutor(max_workers) if max_workers > 1 else None
+
+    def add(self, index):
+        """Mark the part at the index of the list as ready in the ADS, and merge it if its neighbour is ready"""
+        self._ready(0, index, self.names[index])
+
+    def _ready(self, level, index, name):
+        if level == self.depth:
+            self.root = name
+            return
+        sibling = index ^ 1
+        with self.lock:
+            if sibling >= math.ceil(len(self.names) / 2**level):
+                # no neighbour at this level, the node moves up unchanged
+                names = [name]
+            elif (level, sibling) in self.ready:
+                other = self.ready.pop((level, sibling))
+                names = [name, other] if index < sibling else [other, name]
+            else:
+                self.ready[(level, index)] = name
+                return
+        if len(names) == 1:
+            self._ready(level + 1, index // 2, name)
+        elif self.executor:
+            with self.lock:
+                self.futures.append(self.executor.submit(self._merge, names, level + 1, index // 2))
+        else:
+            self._merge(names, level + 1, index // 2)
+
+    def _merge(self, names, level, index):
+        merged = f"{self.prefix}_merge{level}_{index}"
+        MergeMD(names, OutputWorkspace=merged)
+        DeleteWorkspaces(names)
+        self._ready(level, index, merged)
+
+    def result(self):
+        """Wait for the merges to finish, and return the name of the merged workspace"""
+        if self.executor:
+            try:
+                while True:
+                    with self.lock:
+                        if not self.futures:
+                            break
+                        future = self.futures.pop(0)
+                    future.result()
+            finally:
+                self.executor.shutdown(wait=True, cancel_futures=True)
+        if self.root is None:
+            raise RuntimeError(f"Not all the parts of {self.prefix} were merged: {sorted(self.ready.values())}")
+        self.merged = self.root
+        return self.root
+
+    def close(self):
+        """Stop the merges, and delete the parts and merged parts that are left, except the returned result"""
+        if self.executor:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+        with self.lock:
+            names = set(self.names).union(self.ready.values())
+            if self.root is not None:
+                names.add(self.root)
+        names.discard(self.merged)
+        names = sorted(name for name in names if mtd.doesExist(name))
+        if names:
+            DeleteWorkspaces(names)
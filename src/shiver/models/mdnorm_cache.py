@@ -0,0 +1,161 @@
+"""In-memory cache of the MDNorm outputs used by MakeSlice"""
+
+import json
+import threading
+from collections import OrderedDict
+
+import numpy
+
+# pylint: disable=no-name-in-module
+from mantid.api import AnalysisDataServiceObserver, mtd
+from mantid.kernel import Logger
+
+from shiver.configuration import get_float
+
+logger = Logger("SHIVER")
+
+# default maximum size in MB of the cached MDNorm outputs
+DEFAULT_CACHE_SIZE = 1000
+
+# MDNorm parameters that are workspaces, the cache entries are removed when they change in the ADS
+WORKSPACE_PARAMETERS = ["InputWorkspace", "BackgroundWorkspace", "SolidAngleWorkspace"]
+
+# MDNorm outputs that are kept in the cache
+OUTPUT_PARAMETERS = [
+    "OutputWorkspace",
+    "OutputDataWorkspace",
+    "OutputNormalizationWorkspace",
+    "OutputBackgroundDataWorkspace",
+    "OutputBackgroundNormalizationWorkspace",
+]
+
+
+def workspace_fingerprint(workspace):
+    """Return the properties of a workspace that change the MDNorm results when modified in place"""
+    fingerprint = [workspace.name(), workspace.id()]
+    if hasattr(workspace, "getNEvents"):
+        fingerprint.append(workspace.getNEvents())
+    if hasattr(workspace, "getNumberHistograms"):
+        fingerprint.append(workspace.getNumberHistograms())
+    if hasattr(workspace, "getNumExperimentInfo"):
+        for i in range(workspace.getNumExperimentInfo()):
+            info = workspace.getExperimentInfo(i)
+            if info.sample().hasOrientedLattice():
+                fingerprint.append(info.sample().getOrientedLattice().getUB().tolist())
+            fingerprint.append(info.run().getGoniometer().getR().tolist())
+    return fingerprint
+
+
+class MDNormCache(AnalysisDataServiceObserver):
+    """Least recently used cache of MDNorm outputs, keyed on the MDNorm inputs
+
+    The cached workspaces are kept outside of the ADS, up to a total size read from the mdnorm_cache_size
+    setting. An entry is removed as soon as one of its input workspaces is deleted, replaced or renamed in
+    the ADS.
+    """
+
+    def __init__(self, max_bytes=None):
+        super().__init__()
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.observeClear(True)
+        self.observeDelete(True)
+        self.observeReplace(True)
+        self.observeRename(True)
+
+    def budget(self):
+        """Return the maximum size in bytes of the cached workspaces"""
+        if self.max_bytes is not None:
+            return self.max_bytes
+        return int(get_float("main_tab.make_slice", "mdnorm_cache_size", DEFAULT_CACHE_SIZE) * 1e6)
+
+    def fits(self, size):
+        """Return whether outputs of the size in bytes can be stored in the cache"""
+        return 0 < size <= self.budget()
+
+    @staticmethod
+    def key(parameters):
+        """Return the cache key for the MDNorm input parameters"""
+        key = {}
+        for name, value in parameters.items():
+            if name in OUTPUT_PARAMETERS:
+                continue
+            if name in WORKSPACE_PARAMETERS:
+                if isinstance(value, str):
+                    value = mtd[value] if value.strip() else None
+                key[name] = workspace_fingerprint(value) if value else None
+            elif value is None or isinstance(value, str):
+                key[name] = value
+            else:
+                key[name] = numpy.asarray(value).tolist()
+        return json.dumps(key, sort_keys=True, default=str)
+
+    @staticmethod
+    def input_names(parameters):
+        """Return the names of the input workspaces of the MDNorm parameters"""
+        names = set()
+        for name in WORKSPACE_PARAMETERS:
+            value = parameters.get(name)
+            if value:
+                names.add(value if isinstance(value, str) else value.name())
+        return names
+
+    def get(self, key):
+        """Return the dictionary of cached output workspaces, or None if the key is not in the cache"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def add(self, key, input_names, outputs, size):
+        """Add the output workspaces of an MDNorm run with the given input workspace names and size in bytes
+
+        The least recently used entries are removed to keep the total size within the budget.
+        """
+        with self.lock:
+            if key in self.entries:
+                self._pop(key)
+            self.entries[key] = (set(input_names), outputs, size)
+            self.size += size
+            budget = self.budget()
+            while self.size > budget and self.entries:
+                self._pop(next(iter(self.entries)))
+
+    def remove(self, ws_name):
+        """Remove the entries that use the workspace"""
+        with self.lock:
+            for key in [key for key, (names, _, _) in self.entries.items() if ws_name in names]:
+                logger.debug(f"Removing MDNorm cache entry depending on {ws_name}")
+                self._pop(key)
+
+    def _pop(self, key):
+        self.size -= self.entries.pop(key)[2]
+
+    def clear(self):
+        """Remove all the entries"""
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def clearHandle(self):  # pylint: disable=invalid-name
+        """Callback handle for ADS clear"""
+        self.clear()
+
+    def deleteHandle(self, ws, _):  # pylint: disable=invalid-name
+        """Callback handle for ADS delete"""
+        self.remove(ws)
+
+    def replaceHandle(self, ws, _):  # pylint: disable=invalid-name
+        """Callback handle for ADS replace"""
+        self.remove(ws)
+
+    def renameHandle(self, old, _):  # pylint: disable=invalid-name
+        """Callback handle for ADS rename"""
+        self.remove(old)
+
+
+mdnorm_cache = MDNormCache()
@@ -0,0 +1,175 @@
+"""Persistent cache of the ONCat queries, and an ONCat client stub for tests and offline use"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Mapping
+from contextlib import closing
+from pathlib import Path
+
+from mantid.kernel import Logger
+
+logger = Logger("SHIVER")
+
+# location of the cache database
+ONCAT_CACHE_FILE = os.path.join(Path.home(), ".shiver", "oncat_cache.sqlite")
+
+
+def to_json_compatible(value):
+    """Return the ONCat query results as lists and dictionaries"""
+    if hasattr(value, "to_dict"):
+        value = value.to_dict()
+    if isinstance(value, Mapping):
+        return {str(key): to_json_compatible(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json_compatible(item) for item in value]
+    return value
+
+
+class ONCatCache:
+    """SQLite cache of the ONCat list queries, keyed on the resource and the query parameters
+
+    The query parameters include the facility, instrument, experiment (IPTS) and projection, so each
+    projection of the datafiles of an IPTS is a separate entry.
+    """
+
+    def __init__(self, filename=None, ttl=3600):
+        self.filename = filename or ONCAT_CACHE_FILE
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        if not self._initialized and os.path.dirname(self.filename):
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        connection = sqlite3.connect(self.filename)
+        if not self._initialized:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS queries (key TEXT PRIMARY KEY, timestamp REAL, value TEXT NOT NULL)"
+            )
+            self._initialized = True
+        return connection
+
+    @staticmethod
+    def key(resource, parameters):
+        """Return the cache key of a query"""
+        return json.dumps({"resource": resource, "parameters": parameters}, sort_keys=True, default=str)
+
+    def get(self, key, ignore_ttl=False):
+        """Return the cached result of a query, or None if it is missing or older than the time to live"""
+        with self.lock:
+            try:
+                with closing(self._connect()) as connection, connection:
+                    row = connection.execute("SELECT timestamp, value FROM queries WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as err:
+                logger.warning(f"ONCat cache {self.filename} could not be read: {err}")
+                return None
+        if row is None:
+            return None
+        timestamp, value = row
+        if not ignore_ttl and time.time() - timestamp > self.ttl:
+            return None
+        return json.loads(value)
+
+    def set(self, key, value):
+        """Store the result of a query"""
+        with self.lock:
+            try:
+                with closing(self._connect()) as connection, connection:
+                    connection.execute(
+                        "INSERT OR REPLACE INTO queries (key, timestamp, value) VALUES (?, ?, ?)",
+                        (key, time.time(), json.dumps(value)),
+                    )
+            except sqlite3.Error as err:
+                logger.warning(f"ONCat cache {self.filename} could not be written: {err}")
+
+    def clear(self):
+        """Remove all the cached queries"""
+        with self.lock:
+            try:
+                with closing(self._connect()) as connection, connection:
+                    connection.execute("DELETE FROM queries")
+            except sqlite3.Error as err:
+                logger.warning(f"ONCat cache {self.filename} could not be cleared: {err}")
+
+
+class CachedResource:
+    """ONCat resource (Datafile, Experiment) whose list queries go through the cache"""
+
+    def __init__(self, name, resource, cache):
+        self.name = name
+        self.resource = resource
+        self.cache = cache
+
+    def list(self, refresh=False, **parameters):
+        """Return the result of the list query from the cache, or from ONCat if it is missing or expired
+
+        The cached result is also used, whatever its age, when ONCat cannot be reached.
+        """
+        key = self.cache.key(self.name, parameters)
+        if not refresh:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        try:
+            if self.resource is None:
+                raise RuntimeError("Not connected to ONCat")
+            value = to_json_compatible(self.resource.list(**parameters))
+        except Exception as err:  # pylint: disable=broad-exception-caught
+            cached = self.cache.get(key, ignore_ttl=True)
+            if cached is None:
+                raise
+            logger.warning(f"ONCat query failed ({err}), using the cached result")
+            return cached
+        self.cache.set(key, value)
+        return value
+
+
+class CachedONCat:
+    """ONCat client with the same Datafile and Experiment list interface, answering from the cache"""
+
+    def __init__(self, agent, cache=None):
+        self.agent = agent
+        self.cache = cache if cache is not None else ONCatCache()
+        self.Datafile = CachedResource(  # pylint: disable=invalid-name
+            "Datafile", getattr(agent, "Datafile", None), self.cache
+        )
+        self.Experiment = CachedResource(  # pylint: disable=invalid-name
+            "Experiment", getattr(agent, "Experiment", None), self.cache
+        )
+
+    def refresh(self):
+        """Forget the cached queries, the next queries go to ONCat"""
+        self.cache.clear()
+
+
+class StubResource:
+    """ONCat resource answering the list queries from a list of records"""
+
+    def __init__(self, records, fields):
+        self.records = records or []
+        self.fields = fields
+
+    def list(self, **parameters):
+        """Return the records matching the query parameters"""
+        return [
+            record
+            for record in self.records
+            if all(record.get(field) == parameters[field] for field in self.fields if field in parameters)
+        ]
+
+
+class StubONCat:
+    """ONCat client stub, to replace the server in tests and offline use
+
+    The datafile records are filtered on their facility, instrument and experiment, and the experiment
+    records on their facility and instrument. The projection and tags are ignored.
+    """
+
+    def __init__(self, experiments=None, datafiles=None):
+        self.Experiment = StubResource(experiments, ["facility", "instrument"])  # pylint: disable=invalid-name
+        self.Datafile = StubResource(  # pylint: disable=invalid-name
+            datafiles, ["facility", "instrument", "experiment"]
+        )
@@ -0,0 +1,368 @@
+"""Local index of the run metadata of the raw data directories, for use without ONCat"""
+
+import glob
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import closing
+from pathlib import Path
+
+import h5py
+import numpy as np
+from mantid.kernel import Logger
+
+from shiver.models.oncat_cache import StubResource
+
+logger = Logger("SHIVER")
+
+# location of the index database
+RUN_INDEX_FILE = os.path.join(Path.home(), ".shiver", "run_index.sqlite")
+# raw data files, and the legacy format
+RAW_DATA_PATTERNS = ("*.nxs.h5", "*_event.nxs")
+# DAS logs read from the raw data files: angles, dataset name and incident energy
+INDEXED_LOGS = ("omega", "s1", "s2", "psi", "SequenceName", "EnergyRequest")
+# number of files per SQL query, below the limit on the number of variables
+SQL_BATCH_SIZE = 500
+# picoCoulombs in a microAmp hour
+PICOCOULOMBS_PER_MICROAMP_HOUR = 3.6e9
+
+
+def find_raw_files(directory):
+    """Return the sorted paths of the raw data files in the directory"""
+    filenames = set()
+    for pattern in RAW_DATA_PATTERNS:
+        filenames.update(glob.iglob(os.path.join(glob.escape(directory), pattern)))
+    return sorted(filenames)
+
+
+def _read_log(log):
+    """Return the average of a numerical DAS log, or the last value of a string DAS log"""
+    if "average_value" in log:
+        return {"average_value": float(np.asarray(log["average_value"][()]).reshape(-1)[0])}
+    value = np.asarray(log["value"][()]).reshape(-1)
+    if value.size == 0:
+        return {}
+    if value.dtype.kind in "SOU":
+        last = value[-1]
+        return {"value": last.decode() if isinstance(last, bytes) else str(last)}
+    return {"average_value": float(np.mean(value))}
+
+
+def _read_proton_charge(entry):
+    """Return the total proton charge of the run in microAmp hour, as Run.getProtonCharge in mantid
+
+    It is the total stored in the entry, or else the sum of the proton charge log of the pulses.
+    """
+    if "proton_charge" in entry:
+        charge = entry["proton_charge"]
+    elif "DASlogs" in entry and "proton_charge" in entry["DASlogs"]:
+        charge = entry["DASlogs"]["proton_charge"]["value"]
+    else:
+        return None
+    units = charge.attrs.get("units", b"picoCoulomb")
+    units = units.decode() if isinstance(units, bytes) else str(units)
+    total = float(np.sum(charge[()]))
+    if units.lower().startswith("picocoulomb"):
+        total /= PICOCOULOMBS_PER_MICROAMP_HOUR
+    return total
+
+
+def read_run_metadata(filename, logs=INDEXED_LOGS):
+    """Read the run number, notes, instrument, proton charge and the requested DAS logs of a raw data file
+
+    Only these few datasets are read, not the events. The DAS logs are matched without case and
+    stored with lower case names, as in ONCat.
+
+    Returns:
+    --------
+    dict
+        {"run_number": int, "notes": str, "instrument": str, "proton_charge": float,
+         "daslogs": {name: {"average_value"|"value": ...}}}
+        with the proton charge in microAmp hour
+    """
+    with h5py.File(filename, "r") as nexus:
+        entry = nexus["entry"]
+        metadata = {"run_number": int(np.asarray(entry["run_number"][()]).reshape(-1)[0])}
+        for name in ("notes", "title"):
+            if name in entry:
+                value = np.asarray(entry[name][()]).reshape(-1)[0]
+                metadata[name] = value.decode() if isinstance(value, bytes) else str(value)
+        if "instrument" in entry and "name" in entry["instrument"]:
+            value = np.asarray(entry["instrument"]["name"][()]).reshape(-1)[0]
+            metadata["instrument"] = value.decode() if isinstance(value, bytes) else str(value)
+        proton_charge = _read_proton_charge(entry)
+        if proton_charge is not None:
+            metadata["proton_charge"] = proton_charge
+        daslogs = {}
+        if "DASlogs" in entry:
+            available = {name.lower(): name for name in entry["DASlogs"]}
+            for name in logs:
+                if name.lower() in available:
+                    try:
+                        daslogs[name.lower()] = _read_log(entry["DASlogs"][available[name.lower()]])
+                    except (KeyError, ValueError, IndexError):
+                        continue
+        metadata["daslogs"] = daslogs
+    return metadata
+
+
+def _read_run_metadata(filename, logs):
+    """Return the metadata of a raw data file, or the error message if it could not be read"""
+    try:
+        return read_run_metadata(filename, logs), None
+    except (OSError, KeyError, ValueError, IndexError) as err:
+        return None, str(err)
+
+
+class RunIndex:
+    """SQLite index of the run metadata of raw data files, updated incrementally
+
+    Each file is stored with its modification time and size, and read again only when they change, or when
+    a DAS log that was not indexed yet is requested. The files are read in parallel processes.
+    """
+
+    def __init__(self, filename=None, max_workers=None):
+        self.filename = filename or RUN_INDEX_FILE
+        self.max_workers = max_workers if max_workers is not None else min(8, os.cpu_count() or 1)
+        self.lock = threading.Lock()
+        self._initialized = False
+
+    def _connect(self):
+        if not self._initialized and os.path.dirname(self.filename):
+            os.makedirs(os.path.dirname(self.filename), exist_ok=True)
+        connection = sqlite3.connect(self.filename)
+        if not self._initialized:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS runs (location TEXT PRIMARY KEY, directory TEXT, mtime_ns INTEGER, "
+                "size INTEGER, logs TEXT, metadata TEXT)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS runs_directory ON runs (directory)")
+            self._initialized = True
+        return connection
+
+    def _read_files(self, filenames, logs):
+        """Return the metadata of the files, read in parallel for more than a few files"""
+        if self.max_workers <= 1 or len(filenames) < 2 * self.max_workers:
+            return [_read_run_metadata(filename, logs) for filename in filenames]
+        # the files are read in new processes, h5py serializes the reads of a process
+        with ProcessPoolExecutor(self.max_workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            return list(executor.map(_read_run_metadata, filenames, [logs] * len(filenames), chunksize=8))
+
+    def update(self, directory, logs=INDEXED_LOGS):
+        """Index the new and modified raw data files of the directory, and forget the deleted ones
+
+        Returns:
+        --------
+        int
+            The number of files that were read
+        """
+        directory = os.path.abspath(directory)
+        return self._update(find_raw_files(directory), logs, directory)
+
+    def update_files(self, filenames, logs=INDEXED_LOGS):
+        """Index the new and modified files of the list, without listing their directories
+
+        Returns:
+        --------
+        int
+            The number of files that were read
+        """
+        return self._update([os.path.abspath(filename) for filename in filenames], logs)
+
+    def _indexed(self, connection, filenames, directory):
+        """Return the modification time, size and indexed logs of the files in the index"""
+        if directory is not None:
+            rows = connection.execute(
+                "SELECT location, mtime_ns, size, logs FROM runs WHERE directory = ?", (directory,)
+            ).fetchall()
+        else:
+            rows = []
+            for start in range(0, len(filenames), SQL_BATCH_SIZE):
+                batch = filenames[start : start + SQL_BATCH_SIZE]
+                rows += connection.execute(
+                    "SELECT location, mtime_ns, size, logs FROM runs "
+                    f"WHERE location IN ({', '.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+        return {location: (mtime_ns, size, set(json.loads(logs))) for location, mtime_ns, size, logs in rows}
+
+    def _update(self, filenames, logs, directory=None):
+        """Read the files that are not indexed or were modified, and forget the deleted files of the directory"""
+        logs = sorted({name.lower() for name in logs})
+        files = {}
+        for filename in filenames:
+            try:
+                stat = os.stat(filename)
+            except OSError:
+                continue
+            files[filename] = (stat.st_mtime_ns, stat.st_size)
+
+        with self.lock:
+            try:
+                with closing(self._connect()) as connection, connection:
+                    indexed = self._indexed(connection, list(files), directory)
+            except sqlite3.Error as err:
+                logger.warning(f"Run index {self.filename} could not be read: {err}")
+                return 0
+
+            stale = [
+                filename
+                for filename, (mtime_ns, size) in files.items()
+                if filename not in indexed
+                or indexed[filename][:2] != (mtime_ns, size)
+                or not indexed[filename][2].issuperset(logs)
+            ]
+            deleted = [location for location in indexed if location not in files]
+            if not stale and not deleted:
+                return 0
+
+            # the logs indexed before are kept
+            logs = sorted(set(logs).union(*(indexed[filename][2] for filename in stale if filename in indexed)))
+            rows = []
+            for filename, (metadata, error) in zip(stale, self._read_files(stale, logs)):
+                if error is not None:
+                    logger.warning(f"Could not index {filename}: {error}")
+                rows.append(
+                    (
+                        filename,
+                        os.path.dirname(filename),
+                        *files[filename],
+                        json.dumps(logs),
+                        json.dumps(metadata) if metadata is not None else None,
+                    )
+                )
+            try:
+                with closing(self._connect()) as connection, connection:
+                    connection.executemany("DELETE FROM runs WHERE location = ?", [(location,) for location in deleted])
+                    connection.executemany("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?)", rows)
+            except sqlite3.Error as err:
+                logger.warning(f"Run index {self.filename} could not be written: {err}")
+        return len(stale)
+
+    def get(self, filenames):
+        """Return the metadata of the indexed files, as a dictionary {filename: metadata}"""
+        locations = {os.path.abspath(filename): filename for filename in filenames}
+        rows = []
+        with self.lock:
+            try:
+                with closing(self._connect()) as connection, connection:
+                    batches = list(locations)
+                    for start in range(0, len(batches), SQL_BATCH_SIZE):
+                        batch = batches[start : start + SQL_BATCH_SIZE]
+                        rows += connection.execute(
+                            "SELECT location, metadata FROM runs "
+                            f"WHERE metadata IS NOT NULL AND location IN ({', '.join('?' * len(batch))})",
+                            batch,
+                        ).fetchall()
+            except sqlite3.Error as err:
+                logger.warning(f"Run index {self.filename} could not be read: {err}")
+                return {}
+        return {locations[location]: json.loads(metadata) for location, metadata in rows}
+
+    def runs(self, directory):
+        """Return the metadata of the indexed runs of the directory, with their location, sorted by location"""
+        directory = os.path.abspath(directory)
+        with self.lock:
+            try:
+                with closing(self._connect()) as connection, connection:
+                    rows = connection.execute(
+                        "SELECT location, metadata FROM runs WHERE directory = ? AND metadata IS NOT NULL "
+                        "ORDER BY location",
+                        (directory,),
+                    ).fetchall()
+            except sqlite3.Error as err:
+                logger.warning(f"Run index {self.filename} could not be read: {err}")
+                return []
+        return [dict(json.loads(metadata), location=location) for location, metadata in rows]
+
+    def datafiles(self, directory):
+        """Return the indexed runs of the directory as ONCat datafile records"""
+        return [
+            {
+                "location": run["location"],
+                "indexed": {"run_number": run["run_number"]},
+                "metadata": {
+                    "entry": {
+                        "notes": run.get("notes"),
+                        "proton_charge": run.get("proton_charge"),
+                        "daslogs": run["daslogs"],
+                    }
+                },
+            }
+            for run in self.runs(directory)
+        ]
+
+    def clear(self):
+        """Remove all the indexed runs"""
+        with self.lock:
+            try:
+                with closing(self._connect()) as connection, connection:
+                    connection.execute("DELETE FROM runs")
+            except sqlite3.Error as err:
+                logger.warning(f"Run index {self.filename} could not be cleared: {err}")
+
+
+def get_proton_charges(filenames, index=None):
+    """Return the total proton charge in microAmp hour of the raw data files, read from the run index
+
+    The files that are not indexed yet, or were modified, are read first, in parallel.
+
+    Returns:
+    --------
+    dict
+        {filename: proton charge}, without the files that could not be read
+    """
+    index = index if index is not None else RunIndex()
+    index.update_files(filenames)
+    return {
+        filename: metadata["proton_charge"]
+        for filename, metadata in index.get(filenames).items()
+        if metadata.get("proton_charge") is not None
+    }
+
+
+def read_number_of_events(filename):
+    """Return the number of neutron events of a raw data file, from the size of its event banks
+
+    Only the shape of the event_id datasets is read, not the events. Without event banks, it is the
+    total counts stored in the entry.
+    """
+    number_of_events = 0
+    with h5py.File(filename, "r") as nexus:
+        entry = nexus["entry"]
+        for group in entry.values():
+            nx_class = group.attrs.get("NX_class", b"") if isinstance(group, h5py.Group) else b""
+            nx_class = nx_class.decode() if isinstance(nx_class, bytes) else str(nx_class)
+            if nx_class == "NXevent_data" and "event_id" in group:
+                number_of_events += group["event_id"].shape[0]
+        if number_of_events == 0 and "total_counts" in entry:
+            number_of_events = int(np.asarray(entry["total_counts"][()]).reshape(-1)[0])
+    return number_of_events
+
+
+def get_number_of_events(filenames):
+    """Return the total number of neutron events of the raw data files, without the files that could not be read"""
+    number_of_events = 0
+    for filename in filenames:
+        try:
+            number_of_events += read_number_of_events(filename)
+        except (OSError, KeyError) as err:
+            logger.warning(f"Could not read the number of events of {filename}: {err}")
+    return number_of_events
+
+
+class LocalONCat:
+    """ONCat client answering the datafile queries from the run index of a directory
+
+    The queries return all the runs of the directory, whatever the facility, instrument or experiment.
+    """
+
+    def __init__(self, directory, index=None, logs=INDEXED_LOGS):
+        self.directory = directory
+        self.index = index if index is not None else RunIndex()
+        self.index.update(directory, logs)
+        self.Datafile = StubResource(self.index.datafiles(directory), [])  # pylint: disable=invalid-name
+        self.Experiment = StubResource([], [])  # pylint: disable=invalid-name
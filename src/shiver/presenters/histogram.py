@@ -2,6 +2,8 @@
 
 # pylint: disable=invalid-name
 import os
+import weakref
+from concurrent.futures import CancelledError
 
 from qtpy.QtWidgets import QMessageBox, QWidget
 
@@ -41,6 +43,7 @@ class HistogramPresenter:  # pylint: disable=too-many-public-methods
         self.view.input_workspaces.mde_workspaces.connect_save_mde_workspace_callback(self.save_mde_workspace)
         self.view.connect_save_workspace(self.save_workspace)
         self.view.connect_save_workspace_to_ascii(self.save_workspace_to_ascii)
+        self.view.connect_save_workspace_to_hdf5(self.save_workspace_to_hdf5)
         self.view.connect_save_script_workspace(self.save_workspace_history)
         self.view.input_workspaces.mde_workspaces.connect_save_polarization_state_workspace(
             self.save_polarization_state
@@ -48,6 +51,7 @@ class HistogramPresenter:  # pylint: disable=too-many-public-methods
         self.view.input_workspaces.mde_workspaces.connect_get_polarization_state_workspace(self.get_polarization_state)
 
         self.view.connect_corrections_tab(self.create_corrections_tab)
+        self.view.connect_cancel_corrections(self.cancel_corrections)
         self.view.connect_refine_ub(self.refine_ub)
         self.view.connect_refine_ub_tab(self.create_refine_ub_tab)
         self.view.connect_do_provenance_callback(self.do_provenance)
@@ -56,6 +60,7 @@ class HistogramPresenter:  # pylint: disable=too-many-public-methods
         self.model.connect_makeslice_finish(self.makeslice_finish)
 
         self.model.ws_change_call_back(self.ws_changed)
+        self.view.connect_ws_removed(self.remove_provenance_tab)
 
         # initialize tables with workspaces already loaded
         for name, ws_type, frame, ndims in self.model.get_all_valid_workspaces():
@@ -67,30 +72,29 @@ class HistogramPresenter:  # pylint: disable=too-many-public-methods
         # ignore normalization warning for the rest of the session, if user chooses to ignore it
         self.ignore_normalization_warning = False
 
+        # models of the corrections tabs, kept alive by their tab or by their running corrections
+        self.corrections_models = weakref.WeakSet()
+
     def load_file(self, file_type, filename):
         """Call model to load the filename from the UI file dialog"""
         self.model.load(filename, file_type)
 
     def load_dataset(self, dataset: dict):
         """Call model to perform dataset loading with the given parameters."""
-        data, background, norm = self.model.load_dataset(dataset)
-
-        self.view.unset_all()
-
-        # set the data in the view
-        # default state: unpolarized
-        pol_state = "UNP"
-        if data:
-            self.view.set_data(data, pol_state)
-        # set the background in the view
-        if background:
-            self.view.set_background(background)
-        # select the normalization in the view
-        if norm:
-            # NOTE: this is a bit of a hack to get around the fact that sometime the
-            #      normalization is not set in the view until the next event loop
-            while self.view.get_selected_normalization() != norm:
-                self.view.select_normalization(norm)
+        loading = self.model.load_dataset(dataset)
+        loading.add_done_callback(self.load_dataset_finish)
+        return loading
+
+    def load_dataset_finish(self, loading):
+        """Update the view once the dataset loading is finished"""
+        try:
+            data, background, norm = loading.result()
+        except (CancelledError, RuntimeError, ValueError):
+            # the invalid inputs and the loading errors are already reported by the model
+            return
+        # the workspaces must be in the lists before being selected
+        self.model.flush_ws_changes()
+        self.view.load_dataset_finish(data, background, norm)
 
     @property
     def view(self):
@@ -139,19 +143,14 @@ class HistogramPresenter:  # pylint: disable=too-many-public-methods
         self.view.disable_while_running(False)
         # plot the newly generated histogram
         if not error:
+            self.model.flush_ws_changes()
             # each workspace
             for ws_name, ndims in workspace_dimesions.items():
                 self.view.make_slice_finish(ws_name, ndims)
 
-    def ws_changed(self, action, name, ws_type, frame=None, ndims=0):
-        """Pass the workspace change to the view"""
-        if action == "add":
-            self.view.add_ws(name, ws_type, frame, ndims)
-        elif action == "del":
-            self.view.del_ws(name)
-            self.remove_provenance_tab(name)
-        elif action == "clear":
-            self.view.clear_ws()
+    def ws_changed(self, events):
+        """Pass the list of workspace changes to the view"""
+        self.view.update_ws(events)
 
     def clone_workspace(self, name, clone_name):
         """Called by the view to clone a workspace"""
@@ -209,6 +208,10 @@ class HistogramPresenter:  # pylint: disable=too-many-public-methods
         """Called by the view to save a workspace to ascii."""
         self.model.save_to_ascii(name, filename)
 
+    def save_workspace_to_hdf5(self, name, filename):
+        """Called by the view to save a workspace to HDF5."""
+        self.model.save_to_hdf5(name, filename)
+
     def save_workspace_history(self, name, filename):
         """Called by the view to rename a workspace"""
         self.model.save_history(name, filename)
@@ -242,6 +245,7 @@ class HistogramPresenter:  # pylint: disable=too-many-public-methods
                 refine_ub_tab.peaks_table.ads_observer = None
                 refine_ub_tab.view.deleteLater()
                 # make sure the correct workspace is still selected after it was modified
+                self.model.flush_ws_changes()
                 self.view.input_workspaces.mde_workspaces.set_data(input_mde, "UNP")
 
             refine_ub_tab.view.close_btn.clicked.connect(_close)
@@ -270,6 +274,8 @@ class HistogramPresenter:  # pylint: disable=too-many-public-methods
             corrections_tab_view.setObjectName(tab_name)
             # create a new model
             corrections_tab_model = CorrectionsModel()
+            corrections_tab_model.connect_progress(self.corrections_progress)
+            self.corrections_models.add(corrections_tab_model)
 
             # populate valid ions
             ions = get_ions_list()
@@ -321,16 +327,21 @@ class HistogramPresenter:  # pylint: disable=too-many-public-methods
                     corrections_tab_view.debye_waller_correction.isChecked()
                     and corrections_tab_view.debye_waller_correction.isEnabled()
                 )
-                corrections_tab_model.apply(
-                    name,
-                    do_detail_balance,
-                    do_polarizer_transmission,
-                    corrections_tab_view.temperature.text(),
-                    do_debye_waller,
-                    corrections_tab_view.u2.text(),
-                    corrections_tab_view.magnetic_structure_factor.isChecked(),
-                    corrections_tab_view.ion_name.currentText(),
-                )
+                try:
+                    corrections_tab_model.apply(
+                        name,
+                        do_detail_balance,
+                        do_polarizer_transmission,
+                        corrections_tab_view.temperature.text(),
+                        do_debye_waller,
+                        corrections_tab_view.u2.text(),
+                        corrections_tab_view.magnetic_structure_factor.isChecked(),
+                        corrections_tab_view.ion_name.currentText(),
+                    )
+                except ValueError as err:
+                    # keep the tab open to fix the parameters
+                    self.error_message(str(err))
+                    return
                 # clean up
                 tab_widget.setCurrentWidget(self._view)
                 corrections_tab_view.deleteLater()
@@ -348,6 +359,16 @@ class HistogramPresenter:  # pylint: disable=too-many-public-methods
             tab_widget.addTab(corrections_tab_view, tab_name)
             tab_widget.setCurrentWidget(corrections_tab_view)
 
+    def corrections_progress(self, fraction, message):
+        """Pass the progress of the corrections to the view"""
+        running = any(model.algorithm_running for model in list(self.corrections_models))
+        self.view.show_corrections_progress(fraction, message, running)
+
+    def cancel_corrections(self):
+        """Cancel the corrections running in the background"""
+        for model in list(self.corrections_models):
+            model.cancel()
+
     def refine_ub(self, ws_name):
         """Set the histogram parameters needed for UB refinement"""
         if (e_initial := self.model.get_ei(ws_name)) is None:
@@ -516,6 +537,9 @@ class HistogramPresenter:  # pylint: disable=too-many-public-methods
         if history_dict == {}:
             return
 
+        # the input workspaces must be in the lists before being selected
+        self.model.flush_ws_changes()
+
         # reset mde workspaces
         self.view.input_workspaces.mde_workspaces.unset_all()
         # reset norm workspaces
@@ -14,11 +14,13 @@ set_matplotlib_backend()
 # make sure the algorithms have been loaded so they are available to the AlgorithmManager
 import mantid.simpleapi  # noqa: F401, E402 pylint: disable=unused-import, wrong-import-position
 
+import shiver.models.applycorrections  # noqa: F401, E402 pylint: disable=unused-import, wrong-import-position
 import shiver.models.convert_dgs_to_single_mde  # noqa: F401, E402 pylint: disable=unused-import, wrong-import-position
 import shiver.models.generate_dgs_mde  # noqa: F401, E402 pylint: disable=unused-import, wrong-import-position
 
 # Need to import the new algorithms so they are registered with mantid
 import shiver.models.makeslice  # noqa: F401, E402 pylint: disable=unused-import, wrong-import-position
+import shiver.models.makeslice_batch  # noqa: F401, E402 pylint: disable=unused-import, wrong-import-position
 import shiver.models.makeslices  # noqa: F401, E402 pylint: disable=unused-import, wrong-import-position
 from shiver.configuration import Configuration  # noqa: E402 pylint: disable=wrong-import-position
 from shiver.version import __version__  # noqa: E402 pylint: disable=wrong-import-position
@@ -3,7 +3,7 @@
 import re
 
 from qtpy import QtGui
-from qtpy.QtCore import Qt
+from qtpy.QtCore import QRegularExpression, Qt
 from qtpy.QtWidgets import (
     QCheckBox,
     QDialog,
@@ -101,6 +101,10 @@ class AdvancedDialog(QDialog):  # pylint: disable=too-many-public-methods
         # standard decimal point-format for example: 1.2
         self.double_validator.setNotation(QtGui.QDoubleValidator.StandardNotation)
         self.ad_validator = ADValidator(self)
+        self.int_validator = QtGui.QIntValidator(self)
+        self.int_validator.setBottom(1)
+        # one or several comma separated integers
+        self.split_into_validator = QtGui.QRegularExpressionValidator(QRegularExpression(r"^\d+(,\d+)*$"), self)
         # keep track of the fields with invalid inputs
         self.invalid_fields = []
         self.invalid_cells = []
@@ -296,17 +300,98 @@ class AdvancedDialog(QDialog):  # pylint: disable=too-many-public-methods
         self.adt_dim_input.setValidator(self.ad_validator)
         layout.addWidget(self.adt_dim_input, 6, 1)
 
+        # Event compression
+        self.compress_check = QCheckBox("Compress events")
+        self.compress_check.setToolTip(
+            "Merge the events closer than the tolerance into weighted events before the conversion.\n"
+            "It reduces the size of the MDE and the time to make slices."
+        )
+        layout.addWidget(self.compress_check, 7, 0)
+
+        compress_widget = QWidget()
+        compress_layout = QHBoxLayout()
+        compress_layout.setContentsMargins(0, 0, 0, 0)
+        compress_tooltip = (
+            "Tolerance of the event compression, in microseconds for raw data.\n"
+            "If empty, 0.1 microsecond for raw data, 0.1% of the energy transfer range for processed data."
+        )
+        self.compress_tolerance_label = QLabel("Tolerance")
+        self.compress_tolerance_label.setToolTip(compress_tooltip)
+        compress_layout.addWidget(self.compress_tolerance_label)
+
+        self.compress_tolerance_input = QLineEdit()
+        self.compress_tolerance_input.setToolTip(compress_tooltip)
+        self.compress_tolerance_input.setPlaceholderText("auto")
+        self.compress_tolerance_input.setValidator(self.double_validator)
+        self.compress_tolerance_input.setFixedWidth(80)
+        compress_layout.addWidget(self.compress_tolerance_input)
+        compress_layout.addStretch(1)
+
+        compress_widget.setLayout(compress_layout)
+        layout.addWidget(compress_widget, 7, 1)
+
+        # Box splitting of the MDE
+        split_into_tooltip = (
+            "Number of bins into which each MDE box is split, one value or one per dimension (default 5)."
+        )
+        split_into_label = QLabel("SplitInto")
+        split_into_label.setToolTip(split_into_tooltip)
+        layout.addWidget(split_into_label, 8, 0)
+
+        self.split_into_input = QLineEdit()
+        self.split_into_input.setToolTip(split_into_tooltip)
+        self.split_into_input.setValidator(self.split_into_validator)
+        layout.addWidget(self.split_into_input, 8, 1)
+
+        split_threshold_tooltip = "Number of events in an MDE box above which it is split (default 1000)."
+        split_threshold_label = QLabel("SplitThreshold")
+        split_threshold_label.setToolTip(split_threshold_tooltip)
+        layout.addWidget(split_threshold_label, 9, 0)
+
+        self.split_threshold_input = QLineEdit()
+        self.split_threshold_input.setToolTip(split_threshold_tooltip)
+        self.split_threshold_input.setValidator(self.int_validator)
+        layout.addWidget(self.split_threshold_input, 9, 1)
+
+        # Box depth
+        depth_tooltip = (
+            "Maximum depth of the MDE box structure (default 2).\n"
+            "Auto - chosen from the total number of events of the raw data files, so that the smallest boxes\n"
+            "of the merged MDE hold about SplitThreshold events."
+        )
+        depth_label = QLabel("MaxRecursionDepth")
+        depth_label.setToolTip(depth_tooltip)
+        layout.addWidget(depth_label, 10, 0)
+
+        depth_widget = QWidget()
+        depth_layout = QHBoxLayout()
+        depth_layout.setContentsMargins(0, 0, 0, 0)
+
+        self.depth_input = QLineEdit()
+        self.depth_input.setToolTip(depth_tooltip)
+        self.depth_input.setValidator(self.int_validator)
+        self.depth_input.setFixedWidth(80)
+        depth_layout.addWidget(self.depth_input)
+
+        self.depth_auto_check = QCheckBox("Auto")
+        self.depth_auto_check.setToolTip(depth_tooltip)
+        depth_layout.addWidget(self.depth_auto_check)
+        depth_layout.addStretch(1)
+
+        depth_widget.setLayout(depth_layout)
+        layout.addWidget(depth_widget, 10, 1)
+
         # buttons
         self.btn_apply = QPushButton("Apply")
         self.btn_apply.setStyleSheet("margin-right:30px;padding:3px;")
-        layout.addWidget(self.btn_apply, 7, 0)
+        layout.addWidget(self.btn_apply, 11, 0)
 
         self.btn_cancel = QPushButton("Cancel")
         self.btn_cancel.setStyleSheet("margin-right:130px;padding:3px;")
-        layout.addWidget(self.btn_cancel, 7, 1)
+        layout.addWidget(self.btn_cancel, 11, 1)
 
         self.btn_help = QPushButton("Help")
-        layout.addWidget(self.btn_help, 7, 2)
+        layout.addWidget(self.btn_help, 11, 2)
 
         # on filter check
         self.filter_check.toggled.connect(self.lcutoff_update)
@@ -331,6 +416,11 @@ class AdvancedDialog(QDialog):  # pylint: disable=too-many-public-methods
         # on additional dimensions change
         self.adt_dim_input.textEdited.connect(self.adt_dim_update)
 
+        # on compression and box splitting change
+        self.compress_check.toggled.connect(self.compress_update)
+        self.split_into_input.textEdited.connect(self.adt_dim_update)
+        self.depth_auto_check.toggled.connect(self.depth_update)
+
         # button actions
         self.add_btn.clicked.connect(self.btn_add_row)
         self.delete_btn.clicked.connect(self.btn_delete_row)
@@ -343,6 +433,7 @@ class AdvancedDialog(QDialog):  # pylint: disable=too-many-public-methods
         self.tib_default.setChecked(True)
         self.lcutoff_label.setVisible(False)
         self.lcutoff_input.setVisible(False)
+        self.compress_update()
 
         # cell validation
         self.cell_boundaries = {
@@ -536,6 +627,15 @@ class AdvancedDialog(QDialog):  # pylint: disable=too-many-public-methods
             self.lcutoff_input.setText(self.lcutoff_input_default)
         self.set_field_valid_state(self.lcutoff_input)
 
+    def compress_update(self):
+        """Show/Hide the compression tolerance based on the compress check box"""
+        self.compress_tolerance_label.setVisible(self.compress_check.isChecked())
+        self.compress_tolerance_input.setVisible(self.compress_check.isChecked())
+
+    def depth_update(self):
+        """Enable/Disable the maximum recursion depth based on the auto check box"""
+        self.depth_input.setEnabled(not self.depth_auto_check.isChecked())
+
     def lcutoff_color_update(self):
         """Update LowerCutoff valid state based on the input"""
         self.set_field_valid_state(self.lcutoff_input)
@@ -631,6 +731,22 @@ class AdvancedDialog(QDialog):  # pylint: disable=too-many-public-methods
         options_dict["AdditionalDimensions"] = None
         if self.adt_dim_input.text():
             options_dict["AdditionalDimensions"] = self.adt_dim_input.text()
+
+        options_dict["CompressEvents"] = self.compress_check.isChecked()
+        options_dict["CompressEventsTolerance"] = None
+        if self.compress_tolerance_input.text():
+            options_dict["CompressEventsTolerance"] = self.compress_tolerance_input.text()
+        options_dict["SplitInto"] = None
+        if self.split_into_input.text():
+            options_dict["SplitInto"] = self.split_into_input.text()
+        options_dict["SplitThreshold"] = None
+        if self.split_threshold_input.text():
+            options_dict["SplitThreshold"] = self.split_threshold_input.text()
+        options_dict["MaxRecursionDepth"] = None
+        if self.depth_auto_check.isChecked():
+            options_dict["MaxRecursionDepth"] = "auto"
+        elif self.depth_input.text():
+            options_dict["MaxRecursionDepth"] = self.depth_input.text()
         return options_dict
 
     def set_table_values(self, maskinputs):
@@ -681,6 +797,15 @@ class AdvancedDialog(QDialog):  # pylint: disable=too-many-public-methods
         self.gonio_input.setText(params.get("Goniometer", ""))
         self.adt_dim_input.setText(params.get("AdditionalDimensions", ""))
 
+        self.compress_check.setChecked(bool(params.get("CompressEvents", False)))
+        self.compress_tolerance_input.setText(params.get("CompressEventsTolerance") or "")
+        self.split_into_input.setText(params.get("SplitInto") or "")
+        self.split_threshold_input.setText(params.get("SplitThreshold") or "")
+        max_recursion_depth = params.get("MaxRecursionDepth") or ""
+        self.depth_auto_check.setChecked(max_recursion_depth == "auto")
+        if max_recursion_depth != "auto":
+            self.depth_input.setText(max_recursion_depth)
+
     def btn_apply_submit(self):
         """Check everything is valid and close dialog"""
 
@@ -1,9 +1,10 @@
 """PyQt widget for the raw data selection"""
 
-import glob
 import os
 import re
+import threading
 
+from qtpy.QtCore import QAbstractListModel, QItemSelection, QItemSelectionModel, QModelIndex, Qt, Signal
 from qtpy.QtWidgets import (
     QAbstractItemView,
     QFileDialog,
@@ -11,18 +12,28 @@ from qtpy.QtWidgets import (
     QHBoxLayout,
     QLabel,
     QLineEdit,
-    QListWidget,
+    QListView,
     QPushButton,
     QVBoxLayout,
     QWidget,
 )
 
-from .invalid_styles import INVALID_QLINEEDIT, INVALID_QLISTWIDGET
+from .invalid_styles import INVALID_QLINEEDIT, INVALID_QLISTVIEW
+
+# raw data files, and the legacy format
+RAW_DATA_SUFFIXES = (".nxs.h5", "_event.nxs")
 
 
 class RawData(QGroupBox):
     """Raw data selection widget"""
 
+    # emitted when the user changes the directory
+    directory_changed = Signal(str)
+    # emitted when the selection changes, except for set_selected(notify=False)
+    selection_changed = Signal()
+    # batches of filenames from the directory scanner: scan generation, list of names or None when done
+    files_found = Signal(int, object)
+
     def __init__(self, parent=None):
         super().__init__(parent)
         self.setTitle("Raw data")
@@ -44,10 +55,12 @@ class RawData(QGroupBox):
         path_layout.addWidget(self.browse)
         path_line.setLayout(path_layout)
 
-        self.files = QListWidget()
+        self.file_model = RawDataModel(self)
+        self.files = QListView()
         self.files.setToolTip("List of raw data files in the current folder.")
         self.files.setSelectionMode(QAbstractItemView.ExtendedSelection)
-        self.files.setSortingEnabled(True)
+        self.files.setUniformItemSizes(True)
+        self.files.setModel(self.file_model)
 
         self.manual_selection = QLineEdit()
         self.manual_selection.setToolTip(
@@ -75,14 +88,23 @@ class RawData(QGroupBox):
 
         self.selected_list_from_oncat = None
 
+        # directory scanning in the background, the results of previous scans are ignored
+        self.scanner = None
+        self.scan_generation = 0
+        # selection set before the end of the scan: (names, notify)
+        self.pending_selection = None
+        self._notify_selection = True
+        self.files_found.connect(self._files_found)
+
         # mandatory field check its state
         # at least one item should be selected
-        self.files.itemSelectionChanged.connect(self.check_file_input)
+        self.files.selectionModel().selectionChanged.connect(self._selection_changed)
         self.manual_selection.textChanged.connect(self._on_manual_selection_changed)
 
     def _path_edited(self):
         if self.path.text() != self.directory:
             self._update_file_list(self.path.text())
+            self.directory_changed.emit(self.directory)
 
     def _browse(self):
         directory = QFileDialog.getExistingDirectory(
@@ -90,21 +112,75 @@ class RawData(QGroupBox):
         )
         if directory:
             self._update_file_list(directory)
+            self.directory_changed.emit(self.directory)
+
+    @property
+    def scanning(self) -> bool:
+        """Check if the directory is still being scanned"""
+        return self.scanner is not None
 
     def _update_file_list(self, directory):
+        """Start scanning the directory in the background, cancelling the previous scan"""
         self.directory = directory
         self.path.setText(directory)
-        self.files.clear()
-        filenames = list(glob.iglob(os.path.join(directory, "*.nxs.h5")))
-        # also support legacy format (if present)
-        filenames += list(glob.iglob(os.path.join(directory, "*_event.nxs")))
-        self.files.addItems([os.path.basename(f) for f in filenames])
+        if self.scanner is not None:
+            self.scanner.cancel()
+        self.pending_selection = None
+        self.file_model.clear()
+        self.check_file_input()
+        self.scan_generation += 1
+        self.scanner = DirectoryScanner(directory, self.scan_generation, self.files_found.emit)
+        self.scanner.start()
+
+    def _files_found(self, generation, names):
+        if generation != self.scan_generation:
+            return
+        if names is not None:
+            self.file_model.add_files(names)
+            return
+        # the scan is done
+        self.scanner = None
+        self.file_model.sort()
+        if self.pending_selection is not None:
+            names, notify = self.pending_selection
+            self.pending_selection = None
+            self._select_names(names, notify)
+
+    def _selection_changed(self):
+        self.check_file_input()
+        if self._notify_selection:
+            self.selection_changed.emit()
+
+    def selected_names(self) -> list:
+        """Return the names of the selected files, in the order of the list"""
+        rows = sorted(index.row() for index in self.files.selectionModel().selectedRows())
+        return [self.file_model.names[row] for row in rows]
+
+    def _select_rows(self, rows, command, clear=False):
+        """Select or deselect the rows at once"""
+        selection = QItemSelection()
+        for row in rows:
+            index = self.file_model.index(row)
+            selection.select(index, index)
+        if clear:
+            command |= QItemSelectionModel.Clear
+        self.files.selectionModel().select(selection, command)
+
+    def _select_names(self, names, notify=True):
+        """Replace the selection by the files with these names"""
+        names = set(names)
+        rows = [row for row, name in enumerate(self.file_model.names) if name in names]
+        self._notify_selection = notify
+        try:
+            self._select_rows(rows, QItemSelectionModel.Select, clear=True)
+        finally:
+            self._notify_selection = True
 
     def set_field_invalid_state(self, item):
         """if parent exists then call the corresponding function"""
         if self.parent():
             self.parent().set_field_invalid_state(item)
-        item.setStyleSheet(INVALID_QLISTWIDGET)
+        item.setStyleSheet(INVALID_QLISTVIEW)
 
     def set_field_valid_state(self, item):
         """remove the item from the field_error list and its invalid style, if it was previously invalid
@@ -115,7 +191,11 @@ class RawData(QGroupBox):
 
     def check_file_input(self):
         """check whether any files are selected"""
-        state = self.selected_list_from_oncat is not None or len(self.files.selectedItems()) > 0
+        state = (
+            self.selected_list_from_oncat is not None
+            or self.pending_selection is not None
+            or self.files.selectionModel().hasSelection()
+        )
         # invalid /valid cases
         if state:
             self.set_field_valid_state(self.files)
@@ -143,25 +223,14 @@ class RawData(QGroupBox):
         valid, run_numbers = parse_run_numbers(text)
         if not valid:
             return
-        run_set = set(run_numbers)
-        self.files.clearSelection()
-        for i in range(self.files.count()):
-            item = self.files.item(i)
-            run_number = _extract_run_number(item.text())
-            if run_number is not None and run_number in run_set:
-                item.setSelected(True)
+        self._select_rows(self.file_model.rows_of_runs(run_numbers), QItemSelectionModel.Select, clear=True)
 
     def _manual_selection_deselect(self):
         text = self.manual_selection.text().strip()
         valid, run_numbers = parse_run_numbers(text)
         if not valid:
             return
-        run_set = set(run_numbers)
-        for i in range(self.files.count()):
-            item = self.files.item(i)
-            run_number = _extract_run_number(item.text())
-            if run_number is not None and run_number in run_set:
-                item.setSelected(False)
+        self._select_rows(self.file_model.rows_of_runs(run_numbers), QItemSelectionModel.Deselect)
 
     def get_selected(self, use_grouped=False):
         """Return a list of the full path of the files selected"""
@@ -169,39 +238,49 @@ class RawData(QGroupBox):
         if use_grouped:
             return self.selected_list_from_oncat
 
+        # the selection that will be applied at the end of the scan
+        if self.pending_selection is not None:
+            return [os.path.join(self.directory, name) for name in self.pending_selection[0]]
+
         # generate a list based on manual selection
-        return [os.path.join(self.directory, f.text()) for f in self.files.selectedItems()]
+        return [os.path.join(self.directory, name) for name in self.selected_names()]
 
-    def set_selected(self, filenames: list):
+    def set_selected(self, filenames: list, notify=True):
         """Set the selected files.
 
         Parameters
         ----------
         filenames : list
             list of filenames with full path.
+        notify : bool
+            emit selection_changed for this selection
 
         Notes
         -----
         1. Expects a list of full file paths
         2. This makes the assumption that all the files for in the same directory.
+        3. If the directory is still being scanned, the selection is applied at the end of the scan.
         """
         # deal with empty list
         if not filenames:
-            self.files.clearSelection()
+            self.pending_selection = None
+            self._select_names([], notify)
             return
 
-        # extract and set the common path
-        self._update_file_list(os.path.dirname(filenames[0]))
+        # extract and set the common path, the directory is scanned again only if it changed
+        directory = os.path.dirname(filenames[0])
+        if directory != self.directory:
+            self._update_file_list(directory)
 
         # set the selection
         # NOTE: the nested list should be flatten out before sending in as we are
         #       not supporting grouped files in this widget at the moment.
-        selected = {os.path.basename(f) for f in filenames}
-
-        for i in range(self.files.count()):
-            item = self.files.item(i)
-            if item.text() in selected:
-                item.setSelected(True)
+        names = [os.path.basename(f) for f in filenames]
+        if self.scanning:
+            self.pending_selection = (names, notify)
+            self.check_file_input()
+        else:
+            self._select_names(names, notify)
 
     def as_dict(self, use_grouped=False):
         """Return a dictionary of the current state"""
@@ -232,6 +311,119 @@ class RawData(QGroupBox):
         self.set_selected(filename_list_flattened)
 
 
+class RawDataModel(QAbstractListModel):
+    """List model of the raw data file names
+
+    The names are appended as they are found, and sorted by run number once the scan is done.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.names = []
+        self.run_numbers = []
+
+    def rowCount(self, parent=QModelIndex()):  # pylint: disable=invalid-name
+        """Number of files"""
+        if parent.isValid():
+            return 0
+        return len(self.names)
+
+    def data(self, index, role=Qt.DisplayRole):
+        """Name of the file"""
+        if not index.isValid() or index.row() >= len(self.names):
+            return None
+        if role in (Qt.DisplayRole, Qt.ToolTipRole):
+            return self.names[index.row()]
+        return None
+
+    def clear(self):
+        """Remove all the files"""
+        self.beginResetModel()
+        self.names = []
+        self.run_numbers = []
+        self.endResetModel()
+
+    def add_files(self, names):
+        """Append the files at the end of the list"""
+        if not names:
+            return
+        self.beginInsertRows(QModelIndex(), len(self.names), len(self.names) + len(names) - 1)
+        self.names.extend(names)
+        self.run_numbers.extend(_extract_run_number(name) for name in names)
+        self.endInsertRows()
+
+    def sort(self, column=0, order=Qt.AscendingOrder):
+        """Sort the files by run number, then name, keeping the selection"""
+        if column != 0:
+            return
+        order_rows = sorted(
+            range(len(self.names)),
+            key=lambda row: (self.run_numbers[row] is None, self.run_numbers[row] or 0, self.names[row]),
+            reverse=order == Qt.DescendingOrder,
+        )
+        if order_rows == list(range(len(self.names))):
+            return
+        self.layoutAboutToBeChanged.emit()
+        new_rows = [0] * len(order_rows)
+        for new_row, old_row in enumerate(order_rows):
+            new_rows[old_row] = new_row
+        self.names = [self.names[row] for row in order_rows]
+        self.run_numbers = [self.run_numbers[row] for row in order_rows]
+        persistent = self.persistentIndexList()
+        self.changePersistentIndexList(persistent, [self.index(new_rows[index.row()]) for index in persistent])
+        self.layoutChanged.emit()
+
+    def rows_of_runs(self, run_numbers):
+        """Return the rows of the files with these run numbers"""
+        run_numbers = set(run_numbers)
+        return [row for row, run_number in enumerate(self.run_numbers) if run_number in run_numbers]
+
+
+class DirectoryScanner:
+    """Directory listing in a background thread, reporting the raw data files in batches
+
+    The callback is called from the scanning thread with (generation, names) for each batch of names, and with
+    (generation, None) at the end. A cancelled scan stops reporting.
+    """
+
+    def __init__(self, directory, generation, callback, batch_size=500):
+        self.directory = directory
+        self.generation = generation
+        self.callback = callback
+        self.batch_size = batch_size
+        self.cancelled = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        """Start scanning"""
+        self.thread.start()
+
+    def cancel(self):
+        """Stop scanning and reporting"""
+        self.cancelled = True
+
+    def _run(self):
+        batch = []
+        try:
+            with os.scandir(self.directory) as entries:
+                for entry in entries:
+                    if self.cancelled:
+                        return
+                    if not entry.name.startswith(".") and entry.name.endswith(RAW_DATA_SUFFIXES):
+                        batch.append(entry.name)
+                        if len(batch) >= self.batch_size:
+                            self.callback(self.generation, batch)
+                            batch = []
+        except OSError:
+            # missing or unreadable directory, empty list
+            pass
+        if self.cancelled:
+            return
+        if batch:
+            self.callback(self.generation, batch)
+        self.callback(self.generation, None)
+
+
 def _extract_run_number(filename):
     """Return the integer run number from a filename like INST_12345.nxs.h5, or None.
 
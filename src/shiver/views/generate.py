@@ -7,6 +7,7 @@ import re
 from qtpy.QtCore import Signal
 from qtpy.QtWidgets import (
     QButtonGroup,
+    QCheckBox,
     QErrorMessage,
     QFileDialog,
     QGridLayout,
@@ -94,9 +95,10 @@ class Generate(QWidget):
         self.oncat_widget.angle_target.valueChanged.connect(self.update_raw_data_widget_selection)
         # - change the dataset to "custom" if the selection in the raw data widget
         #   is changed.
-        self.raw_data_widget.files.itemSelectionChanged.connect(self.set_dataset_to_custom)
-
-        self.inhibit_update = False
+        self.raw_data_widget.selection_changed.connect(self.set_dataset_to_custom)
+        # - without ONCat, the datasets are read from the local run index of the
+        #   raw data directory.
+        self.raw_data_widget.directory_changed.connect(self.oncat_widget.set_local_directory)
 
         # check the state of the required fields for each button
         # to allow for button activations/deactivations of save_btn and generate_btn
@@ -159,7 +161,7 @@ class Generate(QWidget):
         angle_pv="",
     ):  # pylint: disable=unused-argument
         """Update the selection in the raw data widget"""
-        if self.oncat_widget.connected_to_oncat:
+        if self.oncat_widget.has_datasets:
             if update_angle_pv:
                 suggested_selected_files = self.oncat_widget.get_suggested_selected_files(
                     update_angle_pv=True, angle_pv=angle_pv
@@ -171,18 +173,16 @@ class Generate(QWidget):
             self.raw_data_widget.selected_list_from_oncat = suggested_selected_files
             # flatten the list and remove duplicates
             suggested_selected_files = list(itertools.chain(*suggested_selected_files))
-            self.inhibit_update = True
-            self.raw_data_widget.set_selected(suggested_selected_files)
-            self.inhibit_update = False
+            # this selection does not change the dataset to "custom"
+            self.raw_data_widget.set_selected(suggested_selected_files, notify=False)
 
     def set_dataset_to_custom(self):
         """Set the dataset in the oncat widget to "custom"."""
-        if not self.inhibit_update:
-            self.oncat_widget.dataset.blockSignals(True)
-            try:
-                self.oncat_widget.set_dataset_to_custom()
-            finally:
-                self.oncat_widget.dataset.blockSignals(False)
+        self.oncat_widget.dataset.blockSignals(True)
+        try:
+            self.oncat_widget.set_dataset_to_custom()
+        finally:
+            self.oncat_widget.dataset.blockSignals(False)
 
     def _update_title(self, mde_name: str):
         """Update the title of the widget to include the MDE name"""
@@ -365,7 +365,17 @@ class MDEType(QGroupBox):
         self.layout.addWidget(self.mde_type_background_integrated, 4, 1)
         self.layout.addWidget(self.mde_type_background_minimized, 5, 1)
 
-        self.layout.addItem(QSpacerItem(0, 0, QSizePolicy.Minimum, QSizePolicy.Expanding), 6, 0)
+        # append mode
+        self.mde_append = QCheckBox("Append new runs to existing MDE")
+        self.mde_append.setToolTip(
+            "Only convert the runs that are not already in the MDE with the same name (in memory or"
+            " in the output folder), and merge them into it. Available for the Data type only."
+        )
+        self.mde_append.setObjectName("mde_append")
+        self.layout.addWidget(self.mde_append, 6, 1)
+        self.mde_type_data.toggled.connect(self.mde_append.setEnabled)
+
+        self.layout.addItem(QSpacerItem(0, 0, QSizePolicy.Minimum, QSizePolicy.Expanding), 7, 0)
 
         self.setLayout(self.layout)
 
@@ -459,6 +469,7 @@ class MDEType(QGroupBox):
                 "mde_name": self._mde_name,
                 "output_dir": self._output_dir,
                 "mde_type": self.mde_type_button_group.checkedButton().text(),
+                "mde_append": self.mde_append.isEnabled() and self.mde_append.isChecked(),
             }
         else:
             rst = {}
@@ -511,6 +522,7 @@ class MDEType(QGroupBox):
         else:
             # this should never happen
             raise RuntimeError("Invalid MDE type found in history.")
+        self.mde_append.setChecked(param_dict.get("mde_append", False))
 
         # check the name and path to make sure they are valid
         self.check_mde_name()
@@ -543,6 +555,7 @@ class MDEType(QGroupBox):
         self.mde_name.setText("")
         self.output_dir.setText("")
         self.mde_type_data.setChecked(True)
+        self.mde_append.setChecked(False)
 
 
 # pylint: disable=too-few-public-methods
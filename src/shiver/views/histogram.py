@@ -1,7 +1,15 @@
 """PyQt widget for the histogram tab"""
 
 from qtpy.QtCore import Signal
-from qtpy.QtWidgets import QErrorMessage, QHBoxLayout, QMessageBox, QWidget
+from qtpy.QtWidgets import (
+    QErrorMessage,
+    QHBoxLayout,
+    QMessageBox,
+    QProgressBar,
+    QPushButton,
+    QVBoxLayout,
+    QWidget,
+)
 
 from shiver.configuration import get_data
 
@@ -16,6 +24,9 @@ class Histogram(QWidget):  # pylint: disable=too-many-public-methods
 
     error_message_signal = Signal(str)
     makeslice_finish_signal = Signal(str, int)
+    load_dataset_finish_signal = Signal(object, object, object)
+    ws_changed_signal = Signal(object)
+    corrections_progress_signal = Signal(float, str, bool)
     msg_queue = []
 
     def __init__(self, parent=None):
@@ -26,6 +37,7 @@ class Histogram(QWidget):  # pylint: disable=too-many-public-methods
         self.field_errors = []
         self.plot_display_name_callback = None
         self.refine_ub_tab_callback = None
+        self.ws_removed_callback = None
 
         self.buttons = LoadingButtons(self)
         self.input_workspaces = InputWorkspaces(self)
@@ -37,10 +49,30 @@ class Histogram(QWidget):  # pylint: disable=too-many-public-methods
         layout.addWidget(self.input_workspaces)
         layout.addWidget(self.histogram_parameters)
         layout.addWidget(self.histogram_workspaces)
-        self.setLayout(layout)
+
+        # progress of the corrections running in the background, with their cancellation
+        self.corrections_progress = QProgressBar()
+        self.corrections_progress.setRange(0, 100)
+        self.cancel_corrections_btn = QPushButton("Cancel corrections")
+        self.cancel_corrections_btn.setToolTip("Stop the corrections running in the background.")
+        progress_layout = QHBoxLayout()
+        progress_layout.setContentsMargins(0, 0, 0, 0)
+        progress_layout.addWidget(self.corrections_progress)
+        progress_layout.addWidget(self.cancel_corrections_btn)
+        self.corrections_status = QWidget()
+        self.corrections_status.setLayout(progress_layout)
+        self.corrections_status.hide()
+
+        main_layout = QVBoxLayout()
+        main_layout.addLayout(layout)
+        main_layout.addWidget(self.corrections_status)
+        self.setLayout(main_layout)
 
         self.error_message_signal.connect(self._show_error_message)
         self.makeslice_finish_signal.connect(self._make_slice_finish)
+        self.load_dataset_finish_signal.connect(self._load_dataset_finish)
+        self.ws_changed_signal.connect(self._update_ws)
+        self.corrections_progress_signal.connect(self._show_corrections_progress)
 
         self.buttons.connect_error_msg(self.show_error_message)
 
@@ -89,6 +121,28 @@ class Histogram(QWidget):  # pylint: disable=too-many-public-methods
             do_default_plot(ws_name, ndims, display_name, intensity_limits)
             self.histogram_workspaces.histogram_workspaces.set_selected(ws_name)
 
+    def load_dataset_finish(self, data, background, norm):
+        """Select the workspaces of a dataset once they are loaded.
+
+        This will emit a signal so that other threads can call this but have the GUI thread execute it.
+        """
+        self.load_dataset_finish_signal.emit(data, background, norm)
+
+    def _load_dataset_finish(self, data, background, norm):
+        self.unset_all()
+
+        # set the data in the view
+        # default state: unpolarized
+        pol_state = "UNP"
+        if data:
+            self.set_data(data, pol_state)
+        # set the background in the view
+        if background:
+            self.set_background(background)
+        # select the normalization in the view
+        if norm:
+            self.select_normalization(norm)
+
     def show_error_message(self, msg, accumulate=False):
         """Will show a error dialog with the given message.
 
@@ -142,6 +196,50 @@ class Histogram(QWidget):  # pylint: disable=too-many-public-methods
         self.input_workspaces.clear_ws()
         self.histogram_workspaces.clear_ws()
 
+    def update_ws(self, events):
+        """Apply a list of workspace changes to the lists.
+
+        This will emit a signal so that other threads can call this but have the GUI thread execute it.
+        """
+        self.ws_changed_signal.emit(events)
+
+    def _update_ws(self, events):
+        lists = [
+            self.input_workspaces.mde_workspaces,
+            self.input_workspaces.norm_workspaces,
+            self.histogram_workspaces.histogram_workspaces,
+        ]
+        # the lists are sorted and redrawn once, after all the changes
+        sorting = [ws_list.isSortingEnabled() for ws_list in lists]
+        for ws_list in lists:
+            ws_list.setUpdatesEnabled(False)
+            ws_list.setSortingEnabled(False)
+        removed = []
+        try:
+            for action, *event in events:
+                if action == "clear":
+                    self.clear_ws()
+                elif action == "del":
+                    self.del_ws(event[0])
+                    removed.append(event[0])
+                elif action == "replace":
+                    self.del_ws(event[0])
+                    removed.append(event[0])
+                    self.add_ws(*event)
+                elif action == "add":
+                    self.add_ws(*event)
+        finally:
+            for ws_list, enabled in zip(lists, sorting):
+                ws_list.setSortingEnabled(enabled)
+                ws_list.setUpdatesEnabled(True)
+        if self.ws_removed_callback:
+            for name in removed:
+                self.ws_removed_callback(name)
+
+    def connect_ws_removed(self, callback):
+        """connect a function to the removal of a workspace from the lists"""
+        self.ws_removed_callback = callback
+
     def connect_clone_workspace(self, callback):
         """connect a function to clone a workspace"""
         self.input_workspaces.mde_workspaces.clone_workspace_callback = callback
@@ -169,6 +267,10 @@ class Histogram(QWidget):  # pylint: disable=too-many-public-methods
         """connect a function to the save a workspace to ascii"""
         self.histogram_workspaces.histogram_workspaces.save_to_ascii_callback = callback
 
+    def connect_save_workspace_to_hdf5(self, callback):
+        """connect a function to the save a workspace to HDF5"""
+        self.histogram_workspaces.histogram_workspaces.save_to_hdf5_callback = callback
+
     def connect_save_script_workspace(self, callback):
         """connect a function to the save script for workspace"""
         self.histogram_workspaces.histogram_workspaces.save_script_callback = callback
@@ -177,6 +279,22 @@ class Histogram(QWidget):  # pylint: disable=too-many-public-methods
         """connect a function to the creation of a corrections tab"""
         self.input_workspaces.mde_workspaces.create_corrections_tab_callback = callback
 
+    def connect_cancel_corrections(self, callback):
+        """connect a function to the Cancel corrections button"""
+        self.cancel_corrections_btn.clicked.connect(callback)
+
+    def show_corrections_progress(self, fraction, message, running):
+        """Show the progress of the corrections running in the background, hidden when none is running.
+
+        This will emit a signal so that other threads can call this but have the GUI thread execute it.
+        """
+        self.corrections_progress_signal.emit(fraction, message, running)
+
+    def _show_corrections_progress(self, fraction, message, running):
+        self.corrections_progress.setValue(round(100 * fraction))
+        self.corrections_progress.setFormat(f"{message} %p%" if message else "%p%")
+        self.corrections_status.setVisible(running)
+
     def connect_refine_ub(self, callback):
         """connect a function to the Refine sample parameters button"""
         self.input_workspaces.mde_workspaces.refine_ub_callback = callback
@@ -36,6 +36,18 @@ padding-top: 1px;
 padding-bottom: 1px;
 }
 """
+INVALID_QLISTVIEW = """
+QListView {
+border-color: red;
+border-style: outset;
+border-width: 2px;
+border-radius: 4px;
+padding-left: -1px;
+padding-right: -1px;
+padding-top: 1px;
+padding-bottom: 1px;
+}
+"""
 INVALID_QCHECKBOX = """
 QCheckBox::indicator{
 border-color: red;
@@ -1,27 +1,32 @@
 """PyQt widget for the OnCat widget in General tab."""
 
 import os
-from itertools import groupby
-from operator import itemgetter
+import threading
 
 import numpy as np
 import pyoncat
 from pyoncatqt.login import ONCatLogin
-from qtpy.QtCore import QTimer
+from qtpy.QtCore import QTimer, Signal
 from qtpy.QtWidgets import (
     QComboBox,
     QDoubleSpinBox,
     QGridLayout,
     QGroupBox,
     QLabel,
+    QPushButton,
 )
 
-from shiver.configuration import get_data
+from shiver.configuration import get_data, get_int
+from shiver.models.oncat_cache import CachedONCat, ONCatCache
+from shiver.models.run_index import INDEXED_LOGS, LocalONCat, RunIndex
 
 
 class Oncat(QGroupBox):
     """ONCat widget"""
 
+    # the local run index from the indexing thread: indexing generation, LocalONCat agent or None
+    local_index_finished = Signal(int, object)
+
     def __init__(self, parent=None):
         super().__init__(parent)
 
@@ -66,17 +71,32 @@ class Oncat(QGroupBox):
         self.oncat_login = ONCatLogin(key="shiver", client_id=client_id, parent=self)
         self.oncat_login.connection_updated.connect(self.connect_to_oncat)
         self.oncat_options_layout.addWidget(self.oncat_login, 4, 0, 1, 2)
+        # the ONCat queries are cached, the button forces new queries
+        self.refresh_button = QPushButton("Refresh from ONCat")
+        self.refresh_button.setToolTip("Query ONCat again instead of using the cached IPTS and datasets.")
+        self.refresh_button.clicked.connect(self.refresh)
+        self.oncat_options_layout.addWidget(self.refresh_button, 5, 0, 1, 2)
 
         # default angle_pv value
         self.angle_pv = "omega"
+        # indexes of the runs of the IPTS, for get_dataset_info
+        self.dataset_indexes = {}
+        # without ONCat, the datasets of the raw data directory are read from the local run index
+        self.run_index = RunIndex()
+        self.local_directory = None
+        self.local_agent = None
+        # only the last indexing of the raw data directory is used
+        self.index_generation = 0
+        self.local_index_finished.connect(self._local_index_finished)
         # set layout
         self.setLayout(self.oncat_options_layout)
 
         # error message callback
         self.error_message_callback = None
 
-        # OnCat agent
-        self.oncat_agent = self.oncat_login.get_agent_instance()
+        # OnCat agent, with the queries cached for oncat_cache_ttl seconds
+        cache = ONCatCache(ttl=get_int("generate_tab.oncat", "oncat_cache_ttl", default=3600))
+        self.oncat_agent = CachedONCat(self.oncat_login.get_agent_instance(), cache)
 
         # Sync with remote
         self.sync_with_remote(refresh=True)
@@ -105,6 +125,63 @@ class Oncat(QGroupBox):
         """Check if connected to OnCat"""
         return self.oncat_login.is_connected
 
+    @property
+    def has_datasets(self) -> bool:
+        """Check if the datasets are available, from OnCat or from the local run index"""
+        return self.connected_to_oncat or self.local_agent is not None
+
+    @property
+    def agent(self):
+        """Return the OnCat agent, or the local run index agent when not connected"""
+        if self.connected_to_oncat:
+            return self.oncat_agent
+        return self.local_agent
+
+    def set_local_directory(self, directory: str):
+        """Index the runs of the raw data directory, to use its datasets when not connected to OnCat"""
+        if self.connected_to_oncat or not directory or directory == self.local_directory:
+            return
+        self.local_directory = directory
+        self.index_local_directory()
+        self.update_datasets()
+
+    def index_local_directory(self):
+        """Update the local run index of the raw data directory, with the current angle process variable
+
+        The raw data files are read in a background thread, and the datasets are updated when it finishes.
+        """
+        self.dataset_indexes.clear()
+        self.index_generation += 1
+        self.local_agent = None
+        if not os.path.isdir(self.local_directory):
+            return
+        logs = INDEXED_LOGS + (self.angle_pv,)
+        thread = threading.Thread(
+            target=self._index_local_directory,
+            args=(self.index_generation, self.local_directory, logs),
+            daemon=True,
+        )
+        thread.start()
+
+    def _index_local_directory(self, generation, directory, logs):
+        """Index the raw data directory, in the indexing thread"""
+        try:
+            agent = LocalONCat(directory, self.run_index, logs)
+        except OSError:
+            # unreadable directory, no datasets
+            agent = None
+        self.local_index_finished.emit(generation, agent)
+
+    def _local_index_finished(self, generation, agent):
+        """Use the local run index of the raw data directory, keeping the selected dataset"""
+        if generation != self.index_generation or self.connected_to_oncat:
+            return
+        self.local_agent = agent
+        dataset = self.get_dataset()
+        self.update_datasets()
+        if self.dataset.findText(dataset) >= 0:
+            self.dataset.setCurrentText(dataset)
+
     def get_suggested_path(self) -> str:
         """Return a suggested path based on current selection."""
         return os.path.join(
@@ -125,12 +202,14 @@ class Oncat(QGroupBox):
                 self.angle_pv = angle_pv.lower()
             else:
                 self.angle_pv = "omega"
+            if not self.connected_to_oncat and self.local_directory:
+                self.index_local_directory()
 
-        if self.get_dataset() in (" ", "custom"):
+        if self.get_dataset() in (" ", "custom") or self.agent is None:
             return []  # no suggestion to make
 
         return get_dataset_info(
-            login=self.oncat_agent,
+            login=self.agent,
             ipts_number=self.get_ipts_number(),
             instrument=self.get_instrument(),
             use_notes=use_notes,
@@ -139,6 +218,7 @@ class Oncat(QGroupBox):
             angle_bin=self.angle_target.value(),
             angle_pv=self.angle_pv,
             dataset_name=self.get_dataset(),
+            index_cache=self.dataset_indexes,
         )
 
     def set_dataset_to_custom(self):
@@ -151,6 +231,15 @@ class Oncat(QGroupBox):
         self.sync_with_remote(refresh=True)
         self.show_connection_status_briefly()
 
+    def refresh(self):
+        """Forget the cached ONCat queries and update the IPTS and datasets"""
+        self.oncat_agent.refresh()
+        self.dataset_indexes.clear()
+        self.sync_with_remote(refresh=True)
+        if not self.connected_to_oncat and self.local_directory:
+            self.index_local_directory()
+            self.update_datasets()
+
     def sync_with_remote(self, refresh=False):
         """Update all items within OnCat widget."""
         if self.connected_to_oncat and refresh:
@@ -224,6 +313,8 @@ class Oncat(QGroupBox):
 
     def update_datasets(self):
         """Update dataset list"""
+        # the runs of the IPTS are indexed again when a dataset is selected
+        self.dataset_indexes.clear()
         # get dataset list from OnCat
         dataset_list = []
         use_notes = get_data("generate_tab.oncat", "use_notes")
@@ -235,6 +326,14 @@ class Oncat(QGroupBox):
                 ipts_number=self.get_ipts_number(),
                 use_notes=use_notes,
             )
+        elif self.local_agent is not None:
+            dataset_list = ["custom"] + get_dataset_names(
+                self.local_agent,
+                facility=self.get_facility(),
+                instrument=self.get_instrument(),
+                ipts_number=self.get_ipts_number(),
+                use_notes=use_notes,
+            )
         # update dataset list
         self.dataset.clear()
         self.dataset.addItems(sorted(dataset_list))
@@ -362,7 +461,92 @@ def get_dataset_names(
     return dsn
 
 
-def get_dataset_info(  # pylint: disable=too-many-branches
+class DatasetIndex:
+    """Run numbers, locations, angles and dataset names of the runs of an IPTS, as arrays
+
+    It is built once from the ONCat datafiles. The runs of any dataset can then be selected and grouped by angle,
+    for any angle bin, without querying ONCat again.
+
+    Parameters:
+    -----------
+    datafiles : list
+        The ONCat datafiles, with the run number, location, angle, s2 and sequence name or notes projections
+    angle_pv : str, optional
+        The name of the angle process variable. Default is 'omega'
+    use_notes : bool, optional
+        A flag to indicate that the names of the datasets are stored in the
+        Notes/Comments (as opposed to sequence name)
+    use_s2 : bool, optional
+        A flag to indicate that the runs are also grouped by s2 (HYSPEC)
+
+    Raises:
+    -------
+    KeyError
+        If the datafiles do not follow the expected schema
+    """
+
+    def __init__(self, datafiles, angle_pv="omega", use_notes=False, use_s2=False):
+        run_number = np.array([datafile["indexed"]["run_number"] for datafile in datafiles], dtype="int")
+        entries = [datafile["metadata"]["entry"] for datafile in datafiles]
+        daslogs = [entry.get("daslogs", {}) for entry in entries]
+        self.angle = np.array(
+            [log.get(angle_pv, {}).get("average_value", np.nan) for log in daslogs], dtype=float
+        ).reshape(-1)
+        self.s2 = None
+        if use_s2:
+            self.s2 = np.array([log.get("s2", {}).get("average_value", np.nan) for log in daslogs], dtype=float)
+            self.s2 = self.s2.reshape(-1)
+        if use_notes:
+            sequence = [entry.get("notes", None) for entry in entries]
+        else:
+            sequence = [log.get("sequencename", {}).get("value", np.nan) for log in daslogs]
+        # deal with more than one sequence name
+        self.sequence = np.array([sid[-1] if isinstance(sid, list) else sid for sid in sequence], dtype=str)
+        self.location = np.array([datafile["location"] for datafile in datafiles], dtype=object)
+        self.run_number = run_number
+
+        # position of each run number, the last datafile is used for duplicated run numbers
+        self.unique_runs, last = np.unique(run_number[::-1], return_index=True)
+        self.unique_index = len(run_number) - 1 - last
+
+    def indices(self, runs):
+        """Return the positions of the runs in the arrays"""
+        runs = np.asarray(runs, dtype="int").reshape(-1)
+        return self.unique_index[np.searchsorted(self.unique_runs, runs)]
+
+    def dataset_runs(self, dataset_name):
+        """Return the run numbers of the dataset"""
+        if not dataset_name:
+            return np.array([], dtype="int")
+        return self.run_number[self.sequence == dataset_name]
+
+    def locations(self, runs):
+        """Return the locations of the runs"""
+        return self.location[self.indices(runs)].tolist()
+
+    def group_by_angle(self, runs, angle_bin, s2_tolerance=0.01):
+        """Return the locations of the runs grouped by angle (and s2), sorted by angle
+
+        The runs without angle (or s2) are skipped. Within a group, the runs keep their order.
+        """
+        index = self.indices(runs)
+        keys = [self.angle[index] / angle_bin]
+        if self.s2 is not None:
+            keys.append(self.s2[index] / s2_tolerance)
+        # filter the non nan angle runs
+        valid = np.all(~np.isnan(keys), axis=0)
+        if not np.any(valid):
+            return []
+        index = index[valid]
+        keys = np.round(np.array(keys)[:, valid])
+        # stable sort by angle, then s2
+        order = np.lexsort(keys[::-1])
+        keys = keys[:, order]
+        boundaries = np.flatnonzero(np.any(keys[:, 1:] != keys[:, :-1], axis=0)) + 1
+        return [group.tolist() for group in np.split(self.location[index[order]], boundaries)]
+
+
+def get_dataset_info(  # pylint: disable=too-many-locals
     *,
     login,
     ipts_number,
@@ -375,6 +559,7 @@ def get_dataset_info(  # pylint: disable=too-many-branches
     angle_bin=0.5,
     include_runs=None,
     exclude_runs=None,
+    index_cache=None,
 ):
     """
     A function to return a list of runs in a dataset, optionally grouped by angle.
@@ -406,6 +591,9 @@ def get_dataset_info(  # pylint: disable=too-many-branches
         A list or array of additional runs to be added to the same dataset. The default is None
     exclude_runs : array_like, optional
         A list or array of runs to be excluded from the dataset. The default is None
+    index_cache : dict, optional
+        A dictionary where the DatasetIndex of the IPTS is kept, so that the following calls for the same
+        IPTS, with any dataset or angle bin, do not query OnCat again. The default is None
 
     Returns:
     --------
@@ -421,47 +609,28 @@ def get_dataset_info(  # pylint: disable=too-many-branches
         If no runs were found to match the criteria (for example,
         dataset_name=None and include_runs=None)
     """
-    # get run number, angle, and sequence names from oncat
-    projection = ["indexed.run_number", f"metadata.entry.daslogs.{angle_pv}"]  # ,f"metadata.entry.daslogs.{S2}"
-    if instrument == "HYS":
-        projection.append("metadata.entry.daslogs.s2")
-    if use_notes:
-        projection.append("metadata.entry.notes")
-    else:
-        projection.append("metadata.entry.daslogs.sequencename")
-    datafiles = get_data_from_oncat(login, projection, ipts_number, instrument, facility)
-    # {"run_num": "locations"}
-    lookup_table = {df["indexed"]["run_number"]: df["location"] for df in datafiles}
-
-    run_number = np.empty(len(datafiles), dtype="int")
-    angle = {}
-    s2_angle = {}
-    sequence = np.empty(len(datafiles), dtype="U50")
-    try:
-        for idx, datafile in enumerate(datafiles):
-            run_number[idx] = datafile["indexed"]["run_number"]
-            angle[str(run_number[idx])] = (
-                datafile["metadata"]["entry"].get("daslogs", {}).get(angle_pv, {}).get("average_value", np.nan)
-            )
-            if instrument == "HYS":
-                s2_angle[str(run_number[idx])] = (
-                    datafile["metadata"]["entry"].get("daslogs", {}).get("s2", {}).get("average_value", np.nan)
-                )
-
-            if use_notes:
-                sid = datafile["metadata"]["entry"].get("notes", None)
-            else:
-                sid = datafile["metadata"]["entry"].get("daslogs", {}).get("sequencename", {}).get("value", np.nan)
-            if isinstance(sid, list):
-                sid = sid[-1]
-            sequence[idx] = sid
+    # the index of the runs of the IPTS is reused for all the datasets and angle bins
+    index_key = (facility, instrument, ipts_number, use_notes, angle_pv)
+    dataset_index = index_cache.get(index_key) if index_cache is not None else None
+    if dataset_index is None:
+        # get run number, angle, and sequence names from oncat
+        projection = ["indexed.run_number", f"metadata.entry.daslogs.{angle_pv}"]  # ,f"metadata.entry.daslogs.{S2}"
+        if instrument == "HYS":
+            projection.append("metadata.entry.daslogs.s2")
+        if use_notes:
+            projection.append("metadata.entry.notes")
+        else:
+            projection.append("metadata.entry.daslogs.sequencename")
+        datafiles = get_data_from_oncat(login, projection, ipts_number, instrument, facility)
+        try:
+            dataset_index = DatasetIndex(datafiles, angle_pv=angle_pv, use_notes=use_notes, use_s2=instrument == "HYS")
+        except KeyError:
+            return []
+        if index_cache is not None:
+            index_cache[index_key] = dataset_index
 
-    except KeyError:
-        return []
-    if dataset_name:
-        good_runs = run_number[sequence == dataset_name]
-    else:
-        good_runs = np.array([], dtype="int")
+    run_number = dataset_index.run_number
+    good_runs = dataset_index.dataset_runs(dataset_name)
 
     # include runs
     if include_runs:
@@ -497,42 +666,6 @@ def get_dataset_info(  # pylint: disable=too-many-branches
         # raise ValueError("Could not find any runs matching your criteria")
 
     # group by angle if desired
-    good_runs = good_runs.tolist()
-    filenames = [lookup_table[r] for r in good_runs]
     if group_by_angle:
-        # filter the non nan angle runs
-        angle_list = []
-        filenames = []
-        angle_good_runs = []
-        for run in good_runs:
-            if not np.isnan(angle[str(run)]):
-                angle_list.append(round(angle[str(run)] / angle_bin))
-                filenames.append(lookup_table[run])
-                angle_good_runs.append(run)
-        # sort runs by angle
-        if instrument == "HYS":
-            s2_tolerance = 0.01
-            # filter the non nan s2_angle runs
-            s2_angle_list = []
-            s2_angle_good_runs = []
-            angle_list = []
-            filenames = []
-            for run in angle_good_runs:
-                if not np.isnan(s2_angle[str(run)]):
-                    s2_angle_list.append(round(s2_angle[str(run)] / s2_tolerance))
-                    s2_angle_good_runs.append(run)
-                    angle_list.append(round(angle[str(run)] / angle_bin))
-                    filenames.append(lookup_table[run])
-
-            tmp = list(zip(filenames, angle_list, s2_angle_list))
-            arg = [1, 2]
-        else:
-            tmp = list(zip(filenames, angle_list))
-            arg = [1]
-
-        tmp.sort(key=itemgetter(*arg))
-        grouped_data = {}
-        for key, group in groupby(tmp, key=itemgetter(*arg)):
-            grouped_data[key] = [g[0] for g in group]
-        filenames = list(grouped_data.values())
-    return filenames
+        return dataset_index.group_by_angle(good_runs, angle_bin)
+    return dataset_index.locations(good_runs)
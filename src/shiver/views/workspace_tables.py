@@ -751,6 +751,7 @@ class MDHList(ADSList):
 
         self.save_callback = None
         self.save_to_ascii_callback = None
+        self.save_to_hdf5_callback = None
         self.save_script_callback = None
         self.plot_callback = None
 
@@ -821,6 +822,10 @@ class MDHList(ADSList):
         save_ascii.triggered.connect(partial(self.save_ws_to_ascii, selected_ws))
         menu.addAction(save_ascii)
 
+        save_hdf5 = QAction("Save HDF5 Data")
+        save_hdf5.triggered.connect(partial(self.save_ws_to_hdf5, selected_ws))
+        menu.addAction(save_hdf5)
+
         menu.addSeparator()
 
         delete = QAction("Delete")
@@ -901,6 +906,29 @@ class MDHList(ADSList):
         if filename and self.save_to_ascii_callback:
             self.save_to_ascii_callback(name, filename)  # pylint: disable=not-callable
 
+    def save_ws_to_hdf5(self, name: str):
+        """Method to handle the saving data to an HDF5 file.
+
+        Parameters
+        ----------
+        name
+            name of the workspace to be saved
+        """
+        filename, _ = QFileDialog.getSaveFileName(
+            self,
+            "Select location to save workspace",
+            "",
+            "HDF5 file (*.h5 *.hdf5);;All files (*)",
+            options=QFileDialog.DontUseNativeDialog,
+        )
+
+        # check if filename has a .h5 or .hdf5 extension
+        if filename and not (filename.endswith(".h5") or filename.endswith(".hdf5")):
+            filename += ".h5"
+
+        if filename and self.save_to_hdf5_callback:
+            self.save_to_hdf5_callback(name, filename)  # pylint: disable=not-callable
+
     def delete_ws(self, name):
         """Method to delete the currently selected workspace."""
         if self.delete_workspace_callback:
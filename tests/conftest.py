@@ -62,3 +62,11 @@ def user_conf_file_with_version(tmp_path_factory, request):
 @pytest.fixture(autouse=True)
 def _get_login(monkeypatch: pytest.fixture) -> None:
     monkeypatch.setattr(os, "getlogin", lambda: "test")
+
+
+@pytest.fixture(autouse=True)
+def _cache_files(monkeypatch: pytest.fixture, tmp_path) -> None:
+    """Keep the persistent caches of the tests out of the user home directory"""
+    monkeypatch.setattr("shiver.models.oncat_cache.ONCAT_CACHE_FILE", str(tmp_path / "oncat_cache.sqlite"))
+    monkeypatch.setattr("shiver.models.run_index.RUN_INDEX_FILE", str(tmp_path / "run_index.sqlite"))
+    monkeypatch.setattr("shiver.models.ei_t0_cache.EI_T0_CACHE_FILE", str(tmp_path / "ei_t0_cache.sqlite"))
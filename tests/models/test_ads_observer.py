@@ -0,0 +1,158 @@
+"""Tests for the ADS observer of the HistogramModel"""
+
+from mantid.simpleapi import (  # pylint: disable=no-name-in-module
+    CreateMDHistoWorkspace,
+    CreateMDWorkspace,
+    CreateSingleValuedWorkspace,
+    DeleteWorkspace,
+    RenameWorkspace,
+    mtd,
+)
+
+from shiver.models import histogram
+from shiver.models.histogram import HistogramModel
+
+
+def create_mdh(name):
+    """Create an HKL MDHisto workspace"""
+    CreateMDHistoWorkspace(
+        SignalInput="1,2",
+        ErrorInput="1,1",
+        Dimensionality=2,
+        Extents="-1,1,-1,1",
+        NumberOfBins="2,1",
+        Names="[H,0,0],[0,K,0]",
+        Units="rlu,rlu",
+        Frames="HKL,HKL",
+        OutputWorkspace=name,
+    )
+
+
+def test_ads_observer_cache():
+    """Test that the workspace information is cached and updated from the ADS notifications"""
+    model = HistogramModel()
+    model.ads_observers.flush_interval = 0
+    events = []
+    model.ws_change_call_back(events.extend)
+
+    create_mdh("slice")
+    assert events == [("add", "slice", "mdh", "HKL", 1)]
+    assert model.ads_observers.workspace_info["slice"] == ("mdh", "HKL", 1)
+
+    # the information of a renamed workspace is reused
+    events.clear()
+    RenameWorkspace("slice", "slice_renamed")
+    assert events == [("del", "slice"), ("add", "slice_renamed", "mdh", "HKL", 1)]
+    assert "slice" not in model.ads_observers.workspace_info
+    assert list(model.get_all_valid_workspaces()) == [("slice_renamed", "mdh", "HKL", 1)]
+
+    # replacing the workspace updates the information
+    CreateSingleValuedWorkspace(OutputWorkspace="slice_renamed")
+    assert model.ads_observers.workspace_info["slice_renamed"] == ("norm", None, -1)
+
+    DeleteWorkspace("slice_renamed")
+    assert "slice_renamed" not in model.ads_observers.workspace_info
+
+    # temporary workspaces are ignored
+    events.clear()
+    create_mdh("__slice_data")
+    assert mtd.doesExist("__slice_data")
+    assert not events
+    assert "__slice_data" not in model.ads_observers.workspace_info
+    create_mdh("slice")
+    assert mtd.doesExist("__slice_data")
+    assert list(model.get_all_valid_workspaces()) == [("slice", "mdh", "HKL", 1)]
+
+
+def test_ads_observer_cache_replaced_workspace(monkeypatch):
+    """Test that the cached information follows an MDE replaced by an MDHisto of the same name"""
+    model = HistogramModel()
+    model.ads_observers.flush_interval = 0
+
+    CreateMDWorkspace(
+        Dimensions=4,
+        Extents="-10,10,-10,10,-10,10,-10,10",
+        Names="x,y,z,DeltaE",
+        Units="r.l.u.,r.l.u.,r.l.u.,DeltaE",
+        Frames="QSample,QSample,QSample,General Frame",
+        OutputWorkspace="data",
+    )
+    mde_info = histogram.get_workspace_info("data")
+    assert model.ads_observers.get_workspace_info("data") == mde_info
+
+    create_mdh("data")
+    assert model.ads_observers.get_workspace_info("data") == ("mdh", "HKL", 1)
+
+    # the workspace is replaced while its information is read, the old information is not cached
+    model.ads_observers.workspace_info.pop("data")
+    original_get_workspace_info = histogram.get_workspace_info
+    replaced = []
+
+    def replace_while_reading(name):
+        info = original_get_workspace_info(name)
+        if not replaced:
+            replaced.append(name)
+            CreateSingleValuedWorkspace(OutputWorkspace=name)
+        return info
+
+    monkeypatch.setattr("shiver.models.histogram.get_workspace_info", replace_while_reading)
+    assert model.ads_observers.get_workspace_info("data") == ("mdh", "HKL", 1)
+    assert model.ads_observers.workspace_info["data"] == ("norm", None, -1)
+    assert model.ads_observers.get_workspace_info("data") == ("norm", None, -1)
+
+
+def test_ads_observer_coalesced_events():
+    """Test that the workspace changes are coalesced until they are flushed"""
+    model = HistogramModel()
+    model.ads_observers.flush_interval = 60
+    events = []
+    model.ws_change_call_back(events.append)
+
+    create_mdh("existing")
+    model.flush_ws_changes()
+    assert events == [[("add", "existing", "mdh", "HKL", 1)]]
+
+    events.clear()
+    # replaced several times
+    create_mdh("existing")
+    create_mdh("existing")
+    # renamed several times
+    create_mdh("renamed")
+    RenameWorkspace("renamed", "renamed_1")
+    RenameWorkspace("renamed_1", "renamed_2")
+    # added then deleted
+    create_mdh("deleted")
+    DeleteWorkspace("deleted")
+    assert not events
+
+    model.flush_ws_changes()
+    assert events == [
+        [
+            ("replace", "existing", "mdh", "HKL", 1),
+            ("add", "renamed_2", "mdh", "HKL", 1),
+        ]
+    ]
+
+    # nothing to report
+    events.clear()
+    model.flush_ws_changes()
+    assert not events
+
+    # the changes before a clear are not reported
+    create_mdh("cleared")
+    mtd.clear()
+    create_mdh("after_clear")
+    model.flush_ws_changes()
+    assert events == [[("clear",), ("add", "after_clear", "mdh", "HKL", 1)]]
+
+
+def test_ads_observer_timer(qtbot):
+    """Test that the pending workspace changes are flushed on a timer"""
+    model = HistogramModel()
+    events = []
+    model.ws_change_call_back(events.extend)
+
+    create_mdh("slice_1")
+    create_mdh("slice_2")
+    qtbot.waitUntil(lambda: len(events) == 2, timeout=2000)
+    assert events == [("add", "slice_1", "mdh", "HKL", 1), ("add", "slice_2", "mdh", "HKL", 1)]
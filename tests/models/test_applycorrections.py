@@ -0,0 +1,72 @@
+"""Tests for the ApplyCorrectionsMD algorithm"""
+
+import os
+
+import pytest
+
+import shiver.shiver  # noqa: F401 isort: skip #must be imported before mantid
+from mantid.simpleapi import (  # pylint: disable=no-name-in-module, wrong-import-order
+    ApplyCorrectionsMD,
+    ApplyDetailedBalanceMD,
+    CompareMDWorkspaces,
+    DebyeWallerFactorCorrectionMD,
+    DgsScatteredTransmissionCorrectionMD,
+    LoadMD,
+    MagneticFormFactorCorrectionMD,
+    mtd,
+)
+
+
+def test_apply_corrections_md():
+    """Test that the combined corrections are the same as the corrections applied one after the other"""
+
+    LoadMD(
+        Filename=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "../data/mde/merged_mde_MnO_25meV_5K_unpol_178921-178926.nxs"
+        ),
+        OutputWorkspace="data",
+    )
+
+    ApplyDetailedBalanceMD(InputWorkspace="data", Temperature="5", OutputWorkspace="expected")
+    DgsScatteredTransmissionCorrectionMD(InputWorkspace="expected", ExponentFactor=1 / 11, OutputWorkspace="expected")
+    MagneticFormFactorCorrectionMD(InputWorkspace="expected", IonName="Mn2", OutputWorkspace="expected")
+    DebyeWallerFactorCorrectionMD(InputWorkspace="expected", MeanSquaredDisplacement=0.5, OutputWorkspace="expected")
+
+    ApplyCorrectionsMD(
+        InputWorkspace="data",
+        Temperature="5",
+        ScatteredTransmissionCorrection=True,
+        IonName="Mn2",
+        MeanSquaredDisplacement=0.5,
+        OutputWorkspace="corrected",
+    )
+
+    assert CompareMDWorkspaces(Workspace1="expected", Workspace2="corrected", Tolerance=1e-10)[0]
+    # the input is not modified
+    assert not CompareMDWorkspaces(Workspace1="data", Workspace2="corrected", Tolerance=1e-10)[0]
+
+    # the corrections are recorded in the history
+    children = [alg.name() for alg in mtd["corrected"].getHistory().lastAlgorithm().getChildHistories()]
+    assert children == [
+        "ApplyDetailedBalanceMD",
+        "DgsScatteredTransmissionCorrectionMD",
+        "MagneticFormFactorCorrectionMD",
+        "DebyeWallerFactorCorrectionMD",
+    ]
+
+
+def test_apply_corrections_md_invalid_inputs():
+    """Test the validation of the correction parameters"""
+
+    LoadMD(
+        Filename=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "../data/mde/merged_mde_MnO_25meV_5K_unpol_178921-178926.nxs"
+        ),
+        OutputWorkspace="data",
+    )
+
+    with pytest.raises(ValueError):
+        ApplyCorrectionsMD(InputWorkspace="data", IonName="wrongIon", OutputWorkspace="corrected")
+
+    with pytest.raises(ValueError):
+        ApplyCorrectionsMD(InputWorkspace="data", MeanSquaredDisplacement=-1, OutputWorkspace="corrected")
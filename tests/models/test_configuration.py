@@ -4,9 +4,19 @@ import os
 from pathlib import Path
 
 import pytest
+from configupdater import ConfigUpdater
 from qtpy.QtWidgets import QApplication
 
-from shiver.configuration import Configuration, get_data, get_data_logs
+from shiver.configuration import (
+    Configuration,
+    get_bool,
+    get_data,
+    get_data_logs,
+    get_float,
+    get_int,
+    get_list,
+    invalidate_config_cache,
+)
 from shiver.models.configuration import ConfigurationModel
 from shiver.shiver import Shiver
 from shiver.version import __version__ as current_version
@@ -444,3 +454,46 @@ def test_configuration_model_update():
     assert settings[set_name].allowed_values == setting["allowed_values"]
     assert settings[set_name].comments == setting["comments"]
     assert settings[set_name].readonly == setting["readonly"]
+
+
+def test_get_data_cache(monkeypatch, tmp_path):
+    """Test that the configuration file is parsed once, and again when it changes"""
+    user_path = os.path.join(tmp_path, "test_config.ini")
+    with open(user_path, "w", encoding="utf-8") as config_file:
+        config_file.write("[test.section]\nflag = True\ncount = 3\nsize = 1.5\nitems = a, b,c\n")
+    monkeypatch.setattr("shiver.configuration.CONFIG_PATH_FILE", user_path)
+
+    reads = []
+    original_read = ConfigUpdater.read
+
+    def counting_read(self, filename, encoding=None):
+        reads.append(filename)
+        return original_read(self, filename, encoding)
+
+    monkeypatch.setattr(ConfigUpdater, "read", counting_read)
+
+    assert get_bool("test.section", "flag") is True
+    assert get_int("test.section", "count") == 3
+    assert get_float("test.section", "size") == 1.5
+    assert get_list("test.section", "items") == ["a", "b", "c"]
+    assert get_data("test.section", "missing") is None
+    assert len(reads) == 1
+
+    # typed getters defaults
+    assert get_bool("test.section", "missing", default=True) is True
+    assert get_int("test.section", "items", default=7) == 7
+    assert get_list("test.section", "missing") == []
+
+    # the file is parsed again when modified
+    with open(user_path, "w", encoding="utf-8") as config_file:
+        config_file.write("[test.section]\nflag = False\ncount = 42\n")
+    stat = os.stat(user_path)
+    os.utime(user_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    assert get_bool("test.section", "flag") is False
+    assert get_int("test.section", "count") == 42
+    assert len(reads) == 2
+
+    # and after an explicit invalidation
+    invalidate_config_cache()
+    assert get_int("test.section", "count") == 42
+    assert len(reads) == 3
@@ -2,10 +2,12 @@
 
 # pylint: disable=invalid-name
 # pylint: disable=no-name-in-module
-from unittest.mock import MagicMock, patch
+from unittest.mock import MagicMock
 
 import pytest
-from mantid.simpleapi import CreateMDWorkspace, FakeMDEventData
+
+import shiver.shiver  # noqa: F401 isort: skip #must be imported before mantid
+from mantid.simpleapi import CreateMDWorkspace, FakeMDEventData  # pylint: disable=wrong-import-order
 
 from shiver.models import corrections
 
@@ -15,7 +17,7 @@ def test_applied_debye_waller_factor():
     ws = CreateMDWorkspace(Dimensions="1", Extents="1,4", Names="|Q|", Units="A")
     FakeMDEventData(ws, UniformParams=-6000)
     model = corrections.CorrectionsModel()
-    model.apply_debye_waller_factor_correction("ws", "3", "test")
+    assert model.apply_debye_waller_factor_correction("ws", "3", "test").wait(timeout=60)
     assert model.has_debye_waller_factor_correction("test")[0]
     assert model.has_debye_waller_factor_correction("test")[1] == "3"
 
@@ -25,7 +27,7 @@ def test_applied_magnetic_form_factor():
     ws = CreateMDWorkspace(Dimensions="1", Extents="1,4", Names="|Q|", Units="A")
     FakeMDEventData(ws, UniformParams=-6000)
     model = corrections.CorrectionsModel()
-    model.apply_magnetic_form_factor_correction("ws", "Nd3", "test")
+    assert model.apply_magnetic_form_factor_correction("ws", "Nd3", "test").wait(timeout=60)
     assert model.has_magnetic_form_factor_correction("test")[0]
     assert model.has_magnetic_form_factor_correction("test")[1] == "Nd3"
     with pytest.raises(ValueError):
@@ -50,14 +52,12 @@ def test_applied_debye_waller_factor_error():
         model.apply_debye_waller_factor_correction("ws", "-3", "test")
 
 
-def test_apply_debye_waller_factor_correction_finished_error():
-    """mock algorithm observer for error message"""
+def test_corrections_finished_error():
+    """mock corrections job for error message"""
     model = corrections.CorrectionsModel()
-    ws = CreateMDWorkspace(Dimensions="1", Extents="1,4", Names="|Q|", Units="A")
-    FakeMDEventData(ws, UniformParams=-6000)
-    ws_name = "ws"
-    fake_observer = MagicMock()
-    model.algorithms_observers.add(fake_observer)
+    fake_job = MagicMock()
+    model.jobs.add(fake_job)
+    model.algorithm_running = True
 
     error_messages = []
 
@@ -66,66 +66,84 @@ def test_apply_debye_waller_factor_correction_finished_error():
 
     model.connect_error_message(error_callback)
 
-    model.apply_debye_waller_factor_correction_finished(
-        ws_name=ws_name, alg=fake_observer, error=True, msg="Debye-Waller failed"
-    )
+    model.corrections_finished(job=fake_job, error=True, msg="Debye-Waller failed")
 
     assert not model.algorithm_running
-    assert fake_observer not in model.algorithms_observers
+    assert fake_job not in model.jobs
     assert len(error_messages) == 1
     assert "Debye-Waller failed" in error_messages[0]
 
 
-def test_apply_magnetic_form_factor_correction_finished_error():
-    """mock algorithm observer for error message"""
-    model = corrections.CorrectionsModel()
+def test_apply_chained_corrections():
+    """test that the corrections are chained in one job, with a single progress"""
     ws = CreateMDWorkspace(Dimensions="1", Extents="1,4", Names="|Q|", Units="A")
     FakeMDEventData(ws, UniformParams=-6000)
-    ws_name = "ws"
-    fake_observer = MagicMock()
-    model.algorithms_observers.add(fake_observer)
-
-    error_messages = []
-
-    def error_callback(msg):
-        error_messages.append(msg)
+    model = corrections.CorrectionsModel()
 
-    model.connect_error_message(error_callback)
+    progress = []
+    model.connect_progress(lambda fraction, _: progress.append(fraction))
 
-    model.apply_magnetic_form_factor_correction_finished(
-        ws_name=ws_name, alg=fake_observer, error=True, msg="magnetic form factor failed"
+    job = model.apply(
+        ws_name="ws",
+        detailed_balance=False,
+        hyspec_polarizer_transmission=False,
+        debye_waller_factor=True,
+        u2="2",
+        magentic_structure_factor=True,
+        ion_name="Nd3",
     )
-
+    assert job.wait(timeout=60)
     assert not model.algorithm_running
-    assert fake_observer not in model.algorithms_observers
-    assert len(error_messages) == 1
-    assert "magnetic form factor failed" in error_messages[0]
+    assert model.has_magnetic_form_factor_correction("ws_DWF_MSF")[0]
+    assert model.has_debye_waller_factor_correction("ws_DWF_MSF")[0]
+    assert all(0 <= fraction <= 1 for fraction in progress)
 
 
-@patch("time.sleep", return_value=None)
-@patch.object(corrections.CorrectionsModel, "apply_debye_waller_factor_correction")
-def test_apply_waits_for_previous_algorithm(mock_apply_dwf, mock_sleep):
-    """test sleep(0.1)"""
+def test_apply_invalid_parameters():
+    """test that invalid parameters are reported before starting the job"""
+    ws = CreateMDWorkspace(Dimensions="1", Extents="1,4", Names="|Q|", Units="A")
+    FakeMDEventData(ws, UniformParams=-6000)
     model = corrections.CorrectionsModel()
+    with pytest.raises(ValueError):
+        model.apply(
+            ws_name="ws",
+            detailed_balance=False,
+            hyspec_polarizer_transmission=False,
+            debye_waller_factor=True,
+            u2="-2",
+        )
+    assert not model.algorithm_running
+    assert not model.jobs
 
-    model.algorithm_running = True
-
-    def stop_running_once(*args, **kwargs):  # pylint: disable=unused-argument
-        model.algorithm_running = False
 
-    mock_sleep.side_effect = stop_running_once
+def test_apply_detailed_balance_without_temperature():
+    """test that the detailed balance is not skipped silently when the temperature is missing"""
     ws = CreateMDWorkspace(Dimensions="1", Extents="1,4", Names="|Q|", Units="A")
     FakeMDEventData(ws, UniformParams=-6000)
+    model = corrections.CorrectionsModel()
+    with pytest.raises(ValueError, match="temperature"):
+        model.apply(ws_name="ws", detailed_balance=True, hyspec_polarizer_transmission=False, temperature=" ")
+    assert not model.jobs
 
-    model.apply(
-        ws_name="ws",
-        detailed_balance=True,
-        hyspec_polarizer_transmission=False,
-        debye_waller_factor=True,
-        temperature="100",
-        u2="2",
-    )
 
-    # Assert that sleep was called (indicating a wait loop happened)
-    mock_sleep.assert_called_with(0.1)
-    mock_apply_dwf.assert_called_once()
+def test_cancel_corrections():
+    """test that a cancelled job does not run the next corrections"""
+    ws = CreateMDWorkspace(Dimensions="1", Extents="1,4", Names="|Q|", Units="A")
+    FakeMDEventData(ws, UniformParams=-6000)
+    model = corrections.CorrectionsModel()
+    job = corrections.CorrectionsJob(
+        model,
+        "ws",
+        [
+            corrections.magnetic_form_factor_correction_step("Nd3"),
+            corrections.debye_waller_factor_correction_step("2"),
+        ],
+        "ws_cancelled",
+    )
+    job.prepare()
+    job.cancel()
+    model.jobs.add(job)
+    job.start()
+    assert job.wait(timeout=60)
+    assert not model.has_debye_waller_factor_correction("ws_cancelled")[0]
+    assert not model.jobs
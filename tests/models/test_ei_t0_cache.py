@@ -0,0 +1,35 @@
+"""Tests for the Ei/T0 cache"""
+
+import os
+
+from shiver.models.ei_t0_cache import EiT0Cache
+
+
+def test_ei_t0_cache(tmp_path):
+    """Test the cached values are found for the same files only"""
+    filenames = []
+    for run in range(2):
+        filenames.append(str(tmp_path / f"SEQ_{run}.nxs.h5"))
+        with open(filenames[-1], "wb") as f:
+            f.write(b"0" * 10)
+
+    cache = EiT0Cache(str(tmp_path / "ei_t0_cache.sqlite"))
+    assert cache.get(filenames) is None
+    cache.set(filenames, 35.1, 25.2, "monitors")
+    assert cache.get(filenames) == (35.1, 25.2, "monitors")
+    # another group of files, and a new client on the same database
+    assert cache.get(filenames[:1]) is None
+    assert EiT0Cache(str(tmp_path / "ei_t0_cache.sqlite")).get(filenames) == (35.1, 25.2, "monitors")
+
+    # modified or missing file
+    with open(filenames[0], "ab") as f:
+        f.write(b"0")
+    assert cache.get(filenames) is None
+    os.remove(filenames[1])
+    assert cache.get(filenames) is None
+    cache.set(filenames, 35.1, 25.2, "monitors")
+    assert cache.get(filenames) is None
+
+    cache.set(filenames[:1], 35.1, 25.2, "monitors")
+    cache.clear()
+    assert cache.get(filenames[:1]) is None
@@ -5,13 +5,16 @@ import os
 import time
 
 import pytest
-from mantid.simpleapi import Load
+from mantid.simpleapi import CreateMDWorkspace, Load
 
 import shiver.models.convert_dgs_to_single_mde  # noqa: F401, E402 pylint: disable=unused-import, wrong-import-order
 import shiver.models.generate_dgs_mde  # noqa: F401, E402 pylint: disable=unused-import, wrong-import-order
 from shiver.models.generate import (
     GenerateModel,
     gather_mde_config_dict,
+    get_append_conflicts,
+    merge_filename_groups,
+    save_mde_config_dict,
 )
 
 
@@ -112,5 +115,64 @@ def test_gather_mde_config_dict():
     assert config_dict["PolarizedOptions"] == ref_config_dict["PolarizedOptions"]
 
 
+def test_get_append_conflicts():
+    """Test that the runs can only be appended to an MDE reduced with the same parameters"""
+    existing = {
+        "filename": "/data/file1.nxs",
+        "mde_type": "Data",
+        "Ei": "",
+        "AdvancedOptions": {"MaskInputs": [], "E_min": "1"},
+        "SampleParameters": {"a": "1.00000", "u": "0.00000,0.00000,1.00000"},
+    }
+    new = {
+        "filename": "/data/file2.nxs",
+        "mde_type": "Data",
+        "AdvancedOptions": {"E_min": "1", "Goniometer": ""},
+        "SampleParameters": {"a": "1.00000", "u": "0.00000,0.00000,1.00000", "matrix_ub": "1,0,0,0,1,0,0,0,1"},
+    }
+    assert not get_append_conflicts(existing, new)
+
+    new["Ei"] = "25"
+    new["AdvancedOptions"]["E_min"] = "2"
+    new["SampleParameters"]["a"] = "2.00000"
+    assert get_append_conflicts(existing, new) == ["Ei", "E_min", "SampleParameters"]
+
+    # the parameters of an MDE created outside shiver are unknown
+    assert get_append_conflicts({}, new)
+
+
+def test_merge_filename_groups():
+    """Test that the groups of files already in the MDE are kept when new groups are appended"""
+    assert merge_filename_groups("/a/file1+/a/file2, /a/file3", "/b/file3, /b/file4") == (
+        "/a/file1+/a/file2, /a/file3, /b/file4"
+    )
+    assert merge_filename_groups("", "/b/file3") == "/b/file3"
+
+
+def test_generate_mde_append_conflicts(tmpdir):
+    """Test that the model does not append runs reduced with different parameters"""
+    CreateMDWorkspace(Dimensions=2, Extents="-1,1,-1,1", Names="x,y", Units="r.l.u.,r.l.u.", OutputWorkspace="existing")
+    save_mde_config_dict("existing", {"filename": "/data/file1.nxs", "mde_type": "Data", "Ei": "25"})
+
+    model = GenerateModel()
+    err_msg = []
+    model.connect_error_message(lambda msg: err_msg.append(msg))
+    model.connect_generate_mde_finish_callback(lambda _: None)
+    model.generate_mde(
+        {
+            "mde_name": "existing",
+            "output_dir": tmpdir,
+            "mde_type": "Data",
+            "mde_append": True,
+            "filename": "/data/file2.nxs",
+            "Ei": "20",
+        }
+    )
+    assert len(err_msg) == 1
+    assert "Cannot append to existing" in err_msg[0]
+    assert "Ei" in err_msg[0]
+    assert not model.algorithm_observer
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
@@ -7,7 +7,7 @@ import pytest
 
 # Need to import the new algorithms so they are registered with mantid
 import shiver.shiver  # noqa: F401 isort: skip #must be imported before mantid
-from mantid.kernel import amend_config
+from mantid.kernel import Property, amend_config
 from mantid.simpleapi import (  # pylint: disable=no-name-in-module, ungrouped-imports
     AddTimeSeriesLog,
     CompareMDWorkspaces,
@@ -26,14 +26,26 @@ from mantid.simpleapi import (  # pylint: disable=no-name-in-module, ungrouped-i
     LoadNexusMonitors,
     MaskBTP,
     MergeMD,
+    RotateInstrumentComponent,
     SaveNexus,
     SetGoniometer,
     SetUB,
+    mtd,
 )
 from pytest import approx, raises
 
-import shiver.models.convert_dgs_to_single_mde  # noqa: F401, E402 pylint: disable=unused-import, wrong-import-order  # noqa: F401, E402 pylint: disable=unused-import, wrong-import-order
-import shiver.models.generate_dgs_mde  # noqa: F401, E402 pylint: disable=unused-import, wrong-import-order  # noqa: F401, E402 pylint: disable=unused-import, wrong-import-order
+import shiver.models.convert_dgs_to_single_mde  # noqa: F401, E402 pylint: disable=unused-import, wrong-import-order
+import shiver.models.generate_dgs_mde  # noqa: F401, E402 pylint: disable=unused-import, wrong-import-order
+from shiver.models.convert_dgs_to_single_mde import (  # noqa: E402 pylint: disable=wrong-import-order
+    get_Ei_T0,
+    get_hyspec_tof_window,
+    get_load_tof_window,
+    get_max_recursion_depth,
+    get_preprocessed_detectors_name,
+)
+from shiver.models.ei_t0_cache import EiT0Cache  # noqa: E402 pylint: disable=wrong-import-order
+from shiver.models.generate import save_mde_config_dict  # noqa: E402 pylint: disable=wrong-import-order
+from shiver.models.run_index import get_number_of_events  # noqa: E402 pylint: disable=wrong-import-order
 
 
 @pytest.mark.parametrize(
@@ -153,6 +165,98 @@ def test_convert_dgs_to_single_pause():
     assert md_p.getNEvents() == 6140  # the original mde has 23682 events
 
 
+def test_convert_dgs_to_single_mde_compress():
+    """Test for the event compression and box splitting options of ConvertDGSToSingleMDE"""
+    raw_data_folder = os.path.join(os.path.dirname(__file__), "../data/raw")
+    parameters = {
+        "Filenames": os.path.join(raw_data_folder, "HYS_178921.nxs.h5"),
+        "Ei": 25.0,
+        "T0": 112.0,
+        "TimeIndependentBackground": "Default",
+    }
+
+    md1 = ConvertDGSToSingleMDE(**parameters)
+    md2 = ConvertDGSToSingleMDE(CompressEvents=True, CompressEventsTolerance=10.0, MaxRecursionDepth=0, **parameters)
+    # the close events are merged into weighted events
+    assert md2.getNEvents() < md1.getNEvents()
+    assert md2.getBoxController().getMaxDepth() == get_max_recursion_depth(md2.getNEvents(), 4)
+
+    # box splitting
+    md3 = ConvertDGSToSingleMDE(SplitInto=[2], SplitThreshold=50, MaxRecursionDepth=3, **parameters)
+    assert md3.getNEvents() == md1.getNEvents()
+    assert md3.getBoxController().getSplitInto(0) == 2
+    assert md3.getBoxController().getSplitThreshold() == 50
+    assert md3.getBoxController().getMaxDepth() == 3
+
+
+def test_convert_dgs_to_single_mde_preprocessed_detectors(monkeypatch):
+    """Test that the preprocessed detectors are reused for the runs with the same geometry"""
+    raw_data_folder = os.path.join(os.path.dirname(__file__), "../data/raw")
+    parameters = {"Ei": 25.0, "T0": 112.0, "TimeIndependentBackground": "Default"}
+
+    # the tables are hidden in the ADS, record their names
+    names = []
+
+    def record_name(workspace):
+        names.append(get_preprocessed_detectors_name(workspace))
+        return names[-1]
+
+    monkeypatch.setattr("shiver.models.convert_dgs_to_single_mde.get_preprocessed_detectors_name", record_name)
+
+    md1 = ConvertDGSToSingleMDE(Filenames=os.path.join(raw_data_folder, "HYS_178921.nxs.h5"), **parameters)
+    assert len(names) == 1
+    assert mtd.doesExist(names[0])
+    md2 = ConvertDGSToSingleMDE(Filenames=os.path.join(raw_data_folder, "HYS_178922.nxs.h5"), **parameters)
+    assert names == [names[0], names[0]]
+
+    # same result as computing the detectors for each run, the detectors move by less than 0.1 mm
+    md3 = ConvertDGSToSingleMDE(
+        Filenames=os.path.join(raw_data_folder, "HYS_178922.nxs.h5"), CachePreprocessedDetectors=False, **parameters
+    )
+    assert len(names) == 2
+    assert CompareMDWorkspaces(md2, md3, Tolerance=1e-4, IgnoreBoxID=True)[0]
+    assert md1.getNEvents() > 0
+
+    # a different mask is a different table
+    mask_workspace = LoadEmptyInstrument(InstrumentName="HYSPEC")
+    MaskBTP(mask_workspace, Pixel="1-63,66-128")
+    ConvertDGSToSingleMDE(
+        Filenames=os.path.join(raw_data_folder, "HYS_178922.nxs.h5"), MaskWorkspace=mask_workspace, **parameters
+    )
+    assert len(names) == 3
+    assert names[2] != names[0]
+    assert mtd.doesExist(names[0])
+    assert mtd.doesExist(names[2])
+
+
+def test_get_preprocessed_detectors_name():
+    """Test that the preprocessed detectors name follows the positions of the detectors"""
+    workspace = LoadEmptyInstrument(InstrumentName="HYSPEC", OutputWorkspace="__hyspec_geometry")
+    name = get_preprocessed_detectors_name(workspace)
+    assert name.startswith("__preprocessed_detectors_")
+    assert get_preprocessed_detectors_name(workspace) == name
+
+    RotateInstrumentComponent(workspace, ComponentName="Tank", X=0, Y=1, Z=0, Angle=1e-7, RelativeRotation=1)
+    assert get_preprocessed_detectors_name(workspace) == name
+    RotateInstrumentComponent(workspace, ComponentName="Tank", X=0, Y=1, Z=0, Angle=1.0, RelativeRotation=1)
+    rotated_name = get_preprocessed_detectors_name(workspace)
+    assert rotated_name != name
+
+    MaskBTP(workspace, Pixel="1-8")
+    assert get_preprocessed_detectors_name(workspace) not in (name, rotated_name)
+
+
+def test_get_max_recursion_depth():
+    """Test for the automatic maximum recursion depth of the MDE boxes"""
+    assert get_max_recursion_depth(500, 4) == 1
+    # 625 boxes per level with the default splitting into 5
+    assert get_max_recursion_depth(1000 * 625, 4) == 1
+    assert get_max_recursion_depth(1000 * 625 + 1, 4) == 2
+    assert get_max_recursion_depth(1000 * 625**2 * 10, 4) == 3
+    assert get_max_recursion_depth(10**6, 4, split_into=[2, 2, 2, 1], split_threshold=100) == 5
+    assert get_max_recursion_depth(10**40, 4) == 10
+
+
 def test_convert_dgs_to_single_mde_single_qlab():
     """Test for QFrame=Q_lab option ConvertDGSToSingleMDE"""
 
@@ -299,6 +403,32 @@ def test_convert_dgs_to_single_mde_calculate_t0_ei():
     assert md1.getExperimentInfo(0).run()["Ei"].value == 25
 
 
+def test_get_ei_t0_cache(tmp_path, monkeypatch):
+    """Test that the Ei and T0 fitted from the monitors are cached, and their source recorded"""
+    hyspec_file = os.path.join(os.path.dirname(__file__), "../data/raw", "HYS_178921.nxs.h5")
+    data = LoadEventNexus(hyspec_file)
+    assert get_Ei_T0(data, None, 25.0, Property.EMPTY_DBL, [hyspec_file])[0] == 25.0
+    assert data.getRun()["EiSource"].value == "user"
+    assert data.getRun()["T0Source"].value == "log"
+
+    datafile = os.path.join(os.path.dirname(__file__), "../data/raw", "SEQ_124735.nxs.h5")
+    data = LoadEventNexus(datafile, MetadataOnly=True)
+    cache = EiT0Cache(str(tmp_path / "ei_t0_cache.sqlite"))
+    e_i, t_0 = get_Ei_T0(data, None, Property.EMPTY_DBL, Property.EMPTY_DBL, [datafile], cache=cache)
+    assert cache.get([datafile]) == (approx(e_i), approx(t_0), "monitors")
+    assert data.getRun()["EiSource"].value == "monitors"
+
+    # the monitors are not loaded again
+    def load_monitors(*args, **kwargs):
+        raise AssertionError("the monitors should not be loaded")
+
+    monkeypatch.setattr(shiver.models.convert_dgs_to_single_mde, "LoadNexusMonitors", load_monitors)
+    data = LoadEventNexus(datafile, MetadataOnly=True)
+    assert get_Ei_T0(data, None, Property.EMPTY_DBL, Property.EMPTY_DBL, [datafile], cache=cache) == approx((e_i, t_0))
+    assert data.getRun()["EiSource"].value == "monitors"
+    assert data.getRun()["T0Source"].value == "monitors"
+
+
 def test_convert_dgs_to_single_mde_facility():
     """Test for ConvertDGSToSingleMDE facility"""
 
@@ -325,6 +455,29 @@ def test_convert_dgs_to_single_mde_facility():
         assert ConfigService.getFacility().name() == "HFIR"
 
 
+def test_convert_dgs_to_single_mde_file_group():
+    """Test the files of a group loaded in parallel, with the TOF window, are the same as the sum of the files"""
+    raw_data_folder = os.path.join(os.path.dirname(__file__), "../data/raw")
+    filenames = [os.path.join(raw_data_folder, f"HYS_17892{run}.nxs.h5") for run in (1, 2, 3)]
+    parameters = {"Ei": 25.0, "T0": 112.0, "TimeIndependentBackground": "Default"}
+
+    # the loaded window contains the cropped window
+    tofmin, tofmax = get_load_tof_window(filenames[0], 25.0)
+    data = LoadEventNexus(filenames[0])
+    crop_min, crop_max = get_hyspec_tof_window(25.0, data.getRun()["msd"].getStatistics().mean)
+    assert tofmin < crop_min < crop_max < tofmax
+    assert get_load_tof_window(os.path.join(raw_data_folder, "SEQ_124735.nxs.h5")) is None
+
+    md1 = ConvertDGSToSingleMDE(Filenames="+".join(filenames), **parameters)
+
+    for filename in filenames[1:]:
+        data += LoadEventNexus(filename)
+    md2 = ConvertDGSToSingleMDE(InputWorkspace=data, **parameters)
+
+    assert md1.getNEvents() == md2.getNEvents()
+    assert CompareMDWorkspaces(md1, md2, Tolerance=1e-5, IgnoreBoxID=True)[0]
+
+
 def test_convert_dgs_to_single_mde_merged():
     """Test for merging results and compare to existing data ConvertDGSToSingleMDE"""
 
@@ -393,6 +546,161 @@ def test_generate_dgs_mde():
     assert CompareMDWorkspaces(result_md, expected_md, Tolerance=1e-5, IgnoreBoxID=True)[0]
 
 
+def test_generate_dgs_mde_parallel():
+    """Test that the parallel conversion gives the same results as the serial one in GenerateDGSMDE"""
+
+    data_files = [
+        "HYS_178921.nxs.h5",
+        "HYS_178922.nxs.h5",
+        "HYS_178923.nxs.h5",
+    ]
+
+    raw_data_folder = os.path.join(os.path.dirname(__file__), "../data/raw")
+    filenames = ",".join(os.path.join(raw_data_folder, data_file) for data_file in data_files)
+
+    GenerateDGSMDE(
+        Filenames=filenames,
+        Ei=25.0,
+        T0=112.0,
+        TimeIndependentBackground="Default",
+        MaskInputs="[{'Bank': '1', 'Tube': '1', 'Pixel': '1-8'}]",
+        OutputWorkspace="serial_md",
+    )
+    GenerateDGSMDE(
+        Filenames=filenames,
+        Ei=25.0,
+        T0=112.0,
+        TimeIndependentBackground="Default",
+        MaskInputs="[{'Bank': '1', 'Tube': '1', 'Pixel': '1-8'}]",
+        NumberOfWorkers=2,
+        OutputWorkspace="parallel_md",
+    )
+
+    assert CompareMDWorkspaces("serial_md", "parallel_md", IgnoreBoxID=True)[0]
+
+
+def test_generate_dgs_mde_max_recursion_depth():
+    """Test that the automatic box depth of GenerateDGSMDE is chosen for the events of all the groups"""
+    raw_data_folder = os.path.join(os.path.dirname(__file__), "../data/raw")
+    filenames = [
+        os.path.join(raw_data_folder, data_file)
+        for data_file in ("HYS_178921.nxs.h5", "HYS_178922.nxs.h5", "HYS_178923.nxs.h5")
+    ]
+
+    md = GenerateDGSMDE(
+        Filenames=",".join(filenames),
+        Ei=25.0,
+        T0=112.0,
+        TimeIndependentBackground="Default",
+        SplitInto=[2],
+        SplitThreshold=10,
+        MaxRecursionDepth=0,
+        OutputWorkspace="auto_md",
+    )
+    # deeper than the depth for the events of a single group
+    max_depth = get_max_recursion_depth(get_number_of_events(filenames), 4, [2], 10)
+    assert max_depth > max(get_max_recursion_depth(get_number_of_events([f]), 4, [2], 10) for f in filenames)
+    assert md.getBoxController().getMaxDepth() == max_depth
+
+
+def test_generate_dgs_mde_append():
+    """Test appending new files to an existing workspace with GenerateDGSMDE"""
+
+    data_files = [
+        "HYS_178921.nxs.h5",
+        "HYS_178922.nxs.h5",
+        "HYS_178923.nxs.h5",
+    ]
+
+    raw_data_folder = os.path.join(os.path.dirname(__file__), "../data/raw")
+    filenames = [os.path.join(raw_data_folder, data_file) for data_file in data_files]
+
+    GenerateDGSMDE(
+        Filenames=",".join(filenames),
+        Ei=25.0,
+        T0=112.0,
+        TimeIndependentBackground="Default",
+        OutputWorkspace="all_md",
+    )
+
+    GenerateDGSMDE(
+        Filenames=",".join(filenames[:2]),
+        Ei=25.0,
+        T0=112.0,
+        TimeIndependentBackground="Default",
+        OutputWorkspace="append_md",
+    )
+    save_mde_config_dict("append_md", {"filename": ", ".join(filenames[:2])})
+    GenerateDGSMDE(
+        Filenames=",".join(filenames),
+        Ei=25.0,
+        T0=112.0,
+        TimeIndependentBackground="Default",
+        InputWorkspace="append_md",
+        OutputWorkspace="append_md",
+    )
+
+    assert mtd["append_md"].getNumExperimentInfo() == 3
+    assert CompareMDWorkspaces("all_md", "append_md", IgnoreBoxID=True)[0]
+
+    # files already converted with a different grouping
+    with raises(RuntimeError) as excinfo:
+        GenerateDGSMDE(
+            Filenames="+".join(filenames),
+            Ei=25.0,
+            T0=112.0,
+            TimeIndependentBackground="Default",
+            InputWorkspace="append_md",
+            OutputWorkspace="append_md",
+        )
+    assert "some of the files were already converted with a different grouping" in str(excinfo.value)
+
+
+def test_generate_dgs_mde_cache(tmp_path):
+    """Test the cache of converted MDEs in GenerateDGSMDE"""
+
+    data_files = [
+        "HYS_178921.nxs.h5",
+        "HYS_178922.nxs.h5",
+    ]
+
+    raw_data_folder = os.path.join(os.path.dirname(__file__), "../data/raw")
+    filenames = ",".join(os.path.join(raw_data_folder, data_file) for data_file in data_files)
+    cache_directory = str(tmp_path / "cache")
+
+    GenerateDGSMDE(
+        Filenames=filenames,
+        Ei=25.0,
+        T0=112.0,
+        TimeIndependentBackground="Default",
+        CacheDirectory=cache_directory,
+        OutputWorkspace="converted_md",
+    )
+    assert len(os.listdir(cache_directory)) == 2
+
+    GenerateDGSMDE(
+        Filenames=filenames,
+        Ei=25.0,
+        T0=112.0,
+        TimeIndependentBackground="Default",
+        CacheDirectory=cache_directory,
+        UBParameters="{'a':'4.48', 'b':'4.48', 'c':'10.8', 'v':'0,0,1'}",
+        OutputWorkspace="cached_md",
+    )
+    assert len(os.listdir(cache_directory)) == 2
+    assert CompareMDWorkspaces("converted_md", "cached_md", IgnoreBoxID=True)[0]
+
+    # different parameters are not in the cache
+    GenerateDGSMDE(
+        Filenames=filenames,
+        Ei=25.0,
+        T0=112.0,
+        CacheDirectory=cache_directory,
+        OutputWorkspace="no_tib_md",
+    )
+    assert len(os.listdir(cache_directory)) == 4
+
+
 def test_generate_dgs_mde_bkg():
     """Test background generation using GenerateDGSMDE"""
 
@@ -2,16 +2,21 @@
 
 import os
 import time
+from concurrent.futures import CancelledError, Future, TimeoutError  # pylint: disable=redefined-builtin
 
-from mantid.simpleapi import (  # pylint: disable=no-name-in-module
+import pytest
+
+import shiver.shiver  # noqa: F401 isort: skip #must be imported before mantid
+from mantid.simpleapi import (  # pylint: disable=no-name-in-module, wrong-import-order
     CreateMDWorkspace,
     LoadEmptyInstrument,
+    MakeSlice,
     SaveMD,
     SaveNexusProcessed,
     mtd,
 )
 
-from shiver.models.histogram import HistogramModel
+from shiver.models.histogram import DatasetLoading, HistogramModel, get_mde_load_parameters
 
 
 def test_load_norm(tmp_path):
@@ -58,6 +63,59 @@ def test_load_mde(tmp_path):
     assert "test_mde" in mtd
 
 
+@pytest.mark.parametrize(
+    "user_conf_file",
+    [
+        """
+        [main_tab.load_mde]
+        mde_memory_budget = 0.000001
+        file_backed_cache_size = 100
+    """
+    ],
+    indirect=True,
+)
+def test_load_mde_file_backed(user_conf_file, monkeypatch, tmp_path):
+    """test that MDE files larger than the memory budget are loaded file-backed and can be sliced"""
+    monkeypatch.setattr("shiver.configuration.CONFIG_PATH_FILE", user_conf_file)
+
+    small_file = tmp_path / "small.nxs"
+    small_file.write_bytes(b"0" * 100)
+    assert not get_mde_load_parameters(str(small_file))
+
+    filename = os.path.join(os.path.dirname(__file__), "../data/mde/merged_mde_MnO_25meV_5K_unpol_178921-178926.nxs")
+    parameters = get_mde_load_parameters(filename)
+    # the workspace is backed by a temporary copy, the data file is never written
+    copy_filename = parameters.pop("Filename")
+    assert os.path.dirname(copy_filename) != os.path.dirname(os.path.abspath(filename))
+    assert copy_filename.endswith("merged_mde_MnO_25meV_5K_unpol_178921-178926.nxs")
+    with open(filename, "rb") as original, open(copy_filename, "rb") as copy:
+        assert original.read() == copy.read()
+    assert parameters == {"FileBackEnd": True, "Memory": 100}
+    modified = os.path.getmtime(filename)
+
+    model = HistogramModel()
+    assert model.load(filename, "mde").result(timeout=60) == "merged_mde_MnO_25meV_5K_unpol_178921-178926"
+    assert mtd["merged_mde_MnO_25meV_5K_unpol_178921-178926"].getNEvents() > 0
+
+    MakeSlice(
+        InputWorkspace="merged_mde_MnO_25meV_5K_unpol_178921-178926",
+        QDimension0="0,0,1",
+        QDimension1="1,1,0",
+        QDimension2="-1,1,0",
+        Dimension0Name="QDimension1",
+        Dimension0Binning="0.35,0.025,0.65",
+        Dimension1Name="QDimension0",
+        Dimension1Binning="0.45,0.55",
+        Dimension2Name="QDimension2",
+        Dimension2Binning="-0.2,0.2",
+        Dimension3Name="DeltaE",
+        Dimension3Binning="-0.5,0.5",
+        OutputWorkspace="line",
+    )
+    assert mtd["line"].getSignalArray().shape == (12, 1, 1, 1)
+    assert os.path.getmtime(filename) == modified
+
+
 def test_nonexisted_file():
     """test file doesn't exist"""
     errors = []
@@ -127,7 +185,53 @@ def test_load_dataset():
         "NormalizationDataFile": os.path.join(norm_folder, "TiZr.nxs"),
     }
 
-    ws_data, ws_background, ws_norm = model.load_dataset(dataset_dict)
+    loading = model.load_dataset(dataset_dict)
+    ws_data, ws_background, ws_norm = loading.result(timeout=60)
+    assert loading.done()
     assert ws_data == "merged_mde_MnO_25meV_5K_unpol_178921-178926"
     assert ws_background is None
     assert ws_norm == "TiZr"
+
+
+def test_load_dataset_errors(tmp_path):
+    """test that loading a dataset fails instead of waiting forever, and cancellation"""
+    model = HistogramModel()
+
+    # missing normalization file
+    loading = model.load_dataset({"MdeName": None, "NormalizationDataFile": str(tmp_path / "missing.nxs")})
+    with pytest.raises(ValueError):
+        loading.result(timeout=60)
+
+    # file of the wrong type
+    data = LoadEmptyInstrument(InstrumentName="HYSPEC", DetectorValue=2)
+    SaveNexusProcessed(data, str(tmp_path / "not_mde.nxs"))
+    loading = model.load_dataset({"MdeName": "not_mde", "MdeFolder": str(tmp_path)})
+    with pytest.raises(RuntimeError):
+        loading.result(timeout=60)
+
+
+def test_dataset_loading_timeout_and_cancel():
+    """test the timeout and cancellation of the dataset loading handle"""
+    pending = Future()
+    loading = DatasetLoading([pending, None, "norm"])
+    with pytest.raises(TimeoutError):
+        loading.result(timeout=0.1)
+    assert not loading.done()
+
+    loading.cancel()
+    assert pending.cancelled()
+    with pytest.raises(CancelledError):
+        loading.result(timeout=1)
+
+    # automatic cancellation
+    pending = Future()
+    loading = DatasetLoading([pending, None, None])
+    loading.cancel_after(0.1)
+    with pytest.raises(CancelledError):
+        loading.result(timeout=10)
+
+    # completion
+    pending = Future()
+    loading = DatasetLoading([pending, None, "norm"])
+    pending.set_result("data")
+    assert loading.result(timeout=1) == ("data", None, "norm")
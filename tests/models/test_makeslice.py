@@ -16,6 +16,7 @@ from numpy.testing import assert_allclose
 from pytest import approx
 
 from shiver import __version__
+from shiver.models.mdnorm_cache import MDNormCache, mdnorm_cache
 
 
 def test_make_slice_1d():
@@ -681,3 +682,100 @@ def test_2d_slice():
     )
 
     assert_allclose(slice_de_vs_l.getSignalArray().reshape((10, 8)), expected)
+
+
+def test_make_slice_mdnorm_cache():
+    """Test that the MDNorm outputs are reused when only the smoothing changes"""
+
+    mdnorm_cache.clear()
+    LoadMD(
+        Filename=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "../data/mde/merged_mde_MnO_25meV_5K_unpol_178921-178926.nxs"
+        ),
+        OutputWorkspace="data",
+    )
+
+    parameters = {
+        "InputWorkspace": "data",
+        "BackgroundWorkspace": None,
+        "NormalizationWorkspace": None,
+        "QDimension0": "0,0,1",
+        "QDimension1": "1,1,0",
+        "QDimension2": "-1,1,0",
+        "Dimension0Name": "QDimension1",
+        "Dimension0Binning": "0.35,0.025,0.65",
+        "Dimension1Name": "QDimension0",
+        "Dimension1Binning": "0.45,0.55",
+        "Dimension2Name": "QDimension2",
+        "Dimension2Binning": "-0.2,0.2",
+        "Dimension3Name": "DeltaE",
+        "Dimension3Binning": "-0.5,0.5",
+        "SymmetryOperations": None,
+    }
+
+    MakeSlice(**parameters, OutputWorkspace="line")
+    assert len(mdnorm_cache.entries) == 1
+
+    MakeSlice(**parameters, Smoothing=1, OutputWorkspace="line_smooth")
+    assert len(mdnorm_cache.entries) == 1
+    line_smooth = mtd["line_smooth"].getSignalArray().copy()
+    MakeSlice(**parameters, OutputWorkspace="line_cached")
+    assert_allclose(mtd["line_cached"].getSignalArray(), mtd["line"].getSignalArray())
+
+    # replacing the input workspace removes the entry
+    CloneMDWorkspace("data", OutputWorkspace="data")
+    assert len(mdnorm_cache.entries) == 0
+
+    MakeSlice(**parameters, Smoothing=1, OutputWorkspace="line_smooth")
+    assert_allclose(mtd["line_smooth"].getSignalArray(), line_smooth)
+
+
+def test_make_slice_mdnorm_cache_size():
+    """Test that the MDNorm outputs larger than the cache budget are not kept"""
+
+    mdnorm_cache.clear()
+    LoadMD(
+        Filename=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "../data/mde/merged_mde_MnO_25meV_5K_unpol_178921-178926.nxs"
+        ),
+        OutputWorkspace="data",
+    )
+
+    mdnorm_cache.max_bytes = 1
+    try:
+        MakeSlice(
+            InputWorkspace="data",
+            QDimension0="0,0,1",
+            QDimension1="1,1,0",
+            QDimension2="-1,1,0",
+            Dimension0Name="QDimension1",
+            Dimension0Binning="0.35,0.025,0.65",
+            Dimension1Name="QDimension0",
+            Dimension1Binning="0.45,0.55",
+            Dimension2Name="QDimension2",
+            Dimension2Binning="-0.2,0.2",
+            Dimension3Name="DeltaE",
+            Dimension3Binning="-0.5,0.5",
+            OutputWorkspace="line",
+        )
+        assert mtd.doesExist("line")
+        assert len(mdnorm_cache.entries) == 0
+        assert mdnorm_cache.size == 0
+    finally:
+        mdnorm_cache.max_bytes = None
+
+
+def test_mdnorm_cache_eviction():
+    """Test that the least recently used entries are removed to stay within the budget"""
+    cache = MDNormCache(max_bytes=100)
+    cache.add("a", ["data"], {"OutputWorkspace": "a"}, 40)
+    cache.add("b", ["data"], {"OutputWorkspace": "b"}, 40)
+    assert cache.get("a") == {"OutputWorkspace": "a"}
+    cache.add("c", ["background"], {"OutputWorkspace": "c"}, 40)
+    assert list(cache.entries) == ["a", "c"]
+    assert cache.size == 80
+    assert not cache.fits(101)
+
+    cache.remove("background")
+    assert list(cache.entries) == ["a"]
+    assert cache.size == 40
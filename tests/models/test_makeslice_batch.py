@@ -0,0 +1,118 @@
+"""Tests for the MakeSliceBatch algorithm"""
+
+import os
+
+import pytest
+
+import shiver.shiver  # noqa: F401 isort: skip #must be imported before mantid
+from mantid.simpleapi import (  # pylint: disable=no-name-in-module, wrong-import-order
+    LoadMD,
+    MakeSlice,
+    MakeSliceBatch,
+    mtd,
+)
+from numpy.testing import assert_allclose
+
+COMMON_PARAMETERS = {
+    "QDimension0": "0,0,1",
+    "QDimension1": "1,1,0",
+    "QDimension2": "-1,1,0",
+    "SymmetryOperations": None,
+}
+
+
+def test_make_slice_batch_matches_make_slice():
+    """Test that the slices made from a shared normalization are the same as the ones from MakeSlice"""
+
+    LoadMD(
+        Filename=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "../data/mde/merged_mde_MnO_25meV_5K_unpol_178921-178926.nxs"
+        ),
+        OutputWorkspace="data",
+    )
+
+    slices = [
+        {
+            "Name": "line_fine",
+            "Dimension0Name": "QDimension1",
+            "Dimension0Binning": "0.35,0.025,0.65",
+            "Dimension1Name": "QDimension0",
+            "Dimension1Binning": "0.45,0.55",
+            "Dimension2Name": "QDimension2",
+            "Dimension2Binning": "-0.2,0.2",
+            "Dimension3Name": "DeltaE",
+            "Dimension3Binning": "-0.5,0.5",
+        },
+        {
+            # aligned coarser binning, obtained from the normalization of line_fine
+            "Name": "line_coarse",
+            "Dimension0Name": "QDimension1",
+            "Dimension0Binning": "0.4,0.05,0.6",
+            "Dimension1Name": "QDimension0",
+            "Dimension1Binning": "0.45,0.55",
+            "Dimension2Name": "QDimension2",
+            "Dimension2Binning": "-0.2,0.2",
+            "Dimension3Name": "DeltaE",
+            "Dimension3Binning": "-0.5,0.5",
+            "Smoothing": 1,
+        },
+        {
+            # not aligned, needs its own normalization
+            "Name": "line_shifted",
+            "Dimension0Name": "QDimension1",
+            "Dimension0Binning": "0.36,0.02,0.64",
+            "Dimension1Name": "QDimension0",
+            "Dimension1Binning": "0.45,0.55",
+            "Dimension2Name": "QDimension2",
+            "Dimension2Binning": "-0.2,0.2",
+            "Dimension3Name": "DeltaE",
+            "Dimension3Binning": "-0.5,0.5",
+        },
+    ]
+
+    alg = MakeSliceBatch(
+        InputWorkspace="data",
+        BackgroundWorkspace=None,
+        NormalizationWorkspace=None,
+        Slices=str(slices),
+        **COMMON_PARAMETERS,
+    )
+    assert list(alg) == ["line_fine", "line_coarse", "line_shifted"]
+
+    for description in slices:
+        parameters = {key: value for key, value in description.items() if key != "Name"}
+        MakeSlice(
+            InputWorkspace="data",
+            BackgroundWorkspace=None,
+            NormalizationWorkspace=None,
+            OutputWorkspace="expected",
+            **COMMON_PARAMETERS,
+            **parameters,
+        )
+        result = mtd[description["Name"]]
+        expected = mtd["expected"]
+        assert result.getSignalArray().shape == expected.getSignalArray().shape
+        assert_allclose(result.getSignalArray(), expected.getSignalArray(), rtol=1e-10, equal_nan=True)
+        assert_allclose(result.getErrorSquaredArray(), expected.getErrorSquaredArray(), rtol=1e-10, equal_nan=True)
+
+    # no temporary workspaces left behind, they are hidden from mtd.getObjectNames
+    for description in slices:
+        for suffix in ("", "_data", "_norm", "_smooth_data", "_smooth_norm"):
+            assert not mtd.doesExist(f"__{description['Name']}{suffix}")
+
+
+def test_make_slice_batch_invalid_inputs():
+    """Test the validation of the slice descriptions"""
+
+    LoadMD(
+        Filename=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "../data/mde/merged_mde_MnO_25meV_5K_unpol_178921-178926.nxs"
+        ),
+        OutputWorkspace="data",
+    )
+
+    with pytest.raises(RuntimeError, match="The slice names must be unique"):
+        MakeSliceBatch(InputWorkspace="data", Slices=str([{"Name": "a"}, {"Name": "a"}]), **COMMON_PARAMETERS)
+
+    with pytest.raises(RuntimeError, match="invalid keys: QDimension0"):
+        MakeSliceBatch(InputWorkspace="data", Slices=str([{"Name": "a", "QDimension0": "1,0,0"}]), **COMMON_PARAMETERS)
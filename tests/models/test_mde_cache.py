@@ -0,0 +1,47 @@
+"""Tests for the MDE cache"""
+
+import os
+
+from shiver.models.mde_cache import MDECache
+
+
+def _make_file(path, size):
+    with open(path, "wb") as f:
+        f.write(b"0" * size)
+    return str(path)
+
+
+def test_mde_cache_key(tmp_path):
+    """Test the cache key depends on the files and the parameters"""
+    raw_file = _make_file(tmp_path / "raw.nxs.h5", 10)
+    other_file = _make_file(tmp_path / "other.nxs.h5", 10)
+
+    cache = MDECache(tmp_path / "cache", 1, {"Ei": 25.0, "T0": 112.0})
+    key = cache.key([raw_file])
+    assert key == MDECache(tmp_path / "cache", 1, {"T0": 112.0, "Ei": 25.0}).key([raw_file])
+    assert key != MDECache(tmp_path / "cache", 1, {"Ei": 20.0, "T0": 112.0}).key([raw_file])
+    assert key != cache.key([other_file])
+    assert key != cache.key([raw_file, other_file])
+
+    # modified file
+    _make_file(raw_file, 20)
+    assert key != cache.key([raw_file])
+
+
+def test_mde_cache_lru(tmp_path):
+    """Test the least recently used entries are removed first"""
+    cache = MDECache(tmp_path / "cache", 250e-9, {})
+    assert cache.get("a") is None
+
+    for i, key in enumerate(["a", "b"]):
+        cache.add_file(key, _make_file(tmp_path / f"{key}.nxs", 100))
+        os.utime(cache.path(key), (i, i))
+    assert cache.get("a") == str(cache.path("a"))
+    assert cache.get("b") == str(cache.path("b"))
+
+    # "a" is now more recently used than "b"
+    os.utime(cache.path("b"), (0, 0))
+    cache.add_file("c", _make_file(tmp_path / "c.nxs", 100))
+    assert cache.get("a") is not None
+    assert cache.get("b") is None
+    assert cache.get("c") is not None
@@ -0,0 +1,85 @@
+"""Tests for the hierarchical merge of the partial MDEs"""
+
+import pytest
+from mantid.simpleapi import (  # pylint: disable=no-name-in-module
+    AddSampleLog,
+    CreateMDWorkspace,
+    CreateSampleWorkspace,
+    FakeMDEventData,
+    mtd,
+)
+
+from shiver.models.mde_merge import MDEMergeTree
+
+
+def create_part(name, index):
+    """Create a partial MDE with one experiment info, tagged with its index"""
+    mde = CreateMDWorkspace(
+        Dimensions=4,
+        Extents="-10,10,-10,10,-10,10,-10,10",
+        Names="x,y,z,DeltaE",
+        Units="r.l.u.,r.l.u.,r.l.u.,DeltaE",
+        Frames="QSample,QSample,QSample,General Frame",
+        OutputWorkspace=name,
+    )
+    expt_info = CreateSampleWorkspace()
+    AddSampleLog(expt_info, LogName="part", LogText=str(index), LogType="Number")
+    mde.addExperimentInfo(expt_info)
+    FakeMDEventData(mde, UniformParams=str(100 * (index + 1)), RandomSeed=str(index))
+
+
+@pytest.mark.parametrize("max_workers", [1, 3])
+@pytest.mark.parametrize("order", [[0, 1, 2, 3, 4], [4, 2, 0, 3, 1]])
+def test_mde_merge_tree(max_workers, order):
+    """Test that the parts are merged in the order of the list, whatever the order in which they are ready"""
+    names = [f"__merged_part{i}" for i in range(5)]
+    merge_tree = MDEMergeTree(names, "__merged", max_workers)
+    for i in order:
+        create_part(names[i], i)
+        merge_tree.add(i)
+
+    merged = mtd[merge_tree.result()]
+    assert merged.getNEvents() == sum(100 * (i + 1) for i in range(5))
+    assert merged.getNumExperimentInfo() == 5
+    assert [merged.getExperimentInfo(i).run()["part"].value for i in range(5)] == [0, 1, 2, 3, 4]
+    # the inputs are deleted once merged
+    for name in names:
+        assert not mtd.doesExist(name)
+    merge_tree.close()
+    assert mtd.doesExist(merge_tree.merged)
+    mtd.clear()
+
+
+def test_mde_merge_tree_single_part():
+    """Test that a single part is not merged"""
+    merge_tree = MDEMergeTree(["__single_part0"], "__single")
+    create_part("__single_part0", 0)
+    merge_tree.add(0)
+    assert merge_tree.result() == "__single_part0"
+    merge_tree.close()
+    assert mtd.doesExist("__single_part0")
+
+    # not all the parts are ready
+    merge_tree = MDEMergeTree(["__single_part0", "__single_part1"], "__single")
+    merge_tree.add(0)
+    with pytest.raises(RuntimeError):
+        merge_tree.result()
+    mtd.clear()
+
+
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_mde_merge_tree_close(max_workers):
+    """Test that the parts and merged parts are deleted when the merge is not finished"""
+    names = [f"__closed_part{i}" for i in range(5)]
+    merge_tree = MDEMergeTree(names, "__closed", max_workers)
+    for i in [0, 1, 3, 4]:
+        create_part(names[i], i)
+        merge_tree.add(i)
+    with pytest.raises(RuntimeError):
+        merge_tree.result()
+    # a part that was converted but not added yet
+    create_part(names[2], 2)
+
+    merge_tree.close()
+    for name in names + ["__closed_merge1_0", "__closed_merge1_1", "__closed_merge2_0"]:
+        assert not mtd.doesExist(name)
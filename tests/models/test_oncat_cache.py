@@ -0,0 +1,93 @@
+"""Tests for the ONCat query cache"""
+
+import pytest
+
+from shiver.models.oncat_cache import CachedONCat, ONCatCache, StubONCat
+from shiver.views.oncat import get_dataset_info, get_dataset_names
+
+DATAFILES = [
+    {
+        "facility": "SNS",
+        "instrument": "CNCS",
+        "experiment": "IPTS-1234",
+        "location": f"/SNS/CNCS/IPTS-1234/nexus/CNCS_{run}.nxs.h5",
+        "indexed": {"run_number": run},
+        "metadata": {"entry": {"daslogs": {"omega": {"average_value": angle}, "sequencename": {"value": "dataset"}}}},
+    }
+    for run, angle in [(1, 0.0), (2, 0.01), (3, 1.0)]
+]
+
+
+class CountingStub(StubONCat):
+    """ONCat stub counting the datafile queries"""
+
+    def __init__(self):
+        experiments = [{"id": "IPTS-1234", "facility": "SNS", "instrument": "CNCS"}]
+        super().__init__(experiments=experiments, datafiles=DATAFILES)
+        self.queries = 0
+        self.offline = False
+        datafile_list = self.Datafile.list
+
+        def counting_list(**parameters):
+            if self.offline:
+                raise ConnectionError("ONCat cannot be reached")
+            self.queries += 1
+            return datafile_list(**parameters)
+
+        self.Datafile.list = counting_list
+
+
+def test_oncat_cache(tmp_path):
+    """Test that the ONCat queries are answered from the cache"""
+    stub = CountingStub()
+    agent = CachedONCat(stub, ONCatCache(str(tmp_path / "oncat_cache.sqlite"), ttl=3600))
+
+    assert get_dataset_names(agent, 1234, "CNCS") == ["dataset"]
+    assert stub.queries == 1
+
+    # a different projection of the same IPTS is another query
+    parameters = {"login": agent, "ipts_number": 1234, "instrument": "CNCS", "dataset_name": "dataset"}
+    expected = [[DATAFILES[0]["location"], DATAFILES[1]["location"]], [DATAFILES[2]["location"]]]
+    assert get_dataset_info(group_by_angle=True, angle_bin=0.5, **parameters) == expected
+    assert stub.queries == 2
+
+    # repeated browsing uses the cache, also with a new client on the same database
+    assert get_dataset_info(group_by_angle=True, angle_bin=0.5, **parameters) == expected
+    assert get_dataset_names(agent, 1234, "CNCS") == ["dataset"]
+    agent = CachedONCat(stub, ONCatCache(str(tmp_path / "oncat_cache.sqlite"), ttl=3600))
+    assert get_dataset_names(agent, 1234, "CNCS") == ["dataset"]
+    assert stub.queries == 2
+
+    # the experiments are cached too
+    assert agent.Experiment.list(facility="SNS", instrument="CNCS", projection=["facility"]) == [
+        {"id": "IPTS-1234", "facility": "SNS", "instrument": "CNCS"}
+    ]
+
+    # explicit refresh
+    agent.refresh()
+    assert get_dataset_names(agent, 1234, "CNCS") == ["dataset"]
+    assert stub.queries == 3
+
+
+def test_oncat_cache_ttl_and_offline(tmp_path):
+    """Test the expiration of the cached queries, and the fallback when ONCat cannot be reached"""
+    stub = CountingStub()
+    agent = CachedONCat(stub, ONCatCache(str(tmp_path / "oncat_cache.sqlite"), ttl=-1))
+
+    assert get_dataset_names(agent, 1234, "CNCS") == ["dataset"]
+    assert get_dataset_names(agent, 1234, "CNCS") == ["dataset"]
+    assert stub.queries == 2
+
+    # expired results are used when ONCat cannot be reached
+    stub.offline = True
+    assert get_dataset_names(agent, 1234, "CNCS") == ["dataset"]
+
+    # but not for queries that were never made
+    with pytest.raises(ConnectionError):
+        get_dataset_names(agent, 5678, "CNCS")
+
+    # no client at all, only the cache
+    agent = CachedONCat(None, ONCatCache(str(tmp_path / "oncat_cache.sqlite"), ttl=3600))
+    assert get_dataset_names(agent, 1234, "CNCS") == ["dataset"]
+    with pytest.raises(RuntimeError):
+        get_dataset_names(agent, 5678, "CNCS")
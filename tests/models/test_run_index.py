@@ -0,0 +1,143 @@
+"""Tests for the local run index of the raw data directories"""
+
+import os
+
+import h5py
+import pytest
+
+from shiver.models import run_index
+from shiver.models.run_index import (
+    LocalONCat,
+    RunIndex,
+    get_number_of_events,
+    get_proton_charges,
+    read_number_of_events,
+    read_run_metadata,
+)
+from shiver.views.oncat import get_dataset_info, get_dataset_names
+
+
+def create_raw_file(filename, run_number, omega, sequence_name, proton_charge=1.0e12):
+    """Create a raw data file with only the metadata that is indexed"""
+    with h5py.File(filename, "w") as nexus:
+        entry = nexus.create_group("entry")
+        entry["run_number"] = [str(run_number).encode()]
+        entry["proton_charge"] = [proton_charge]
+        entry["proton_charge"].attrs["units"] = b"picoCoulombs"
+        entry.create_group("DASlogs/Omega")["average_value"] = [omega]
+        entry["DASlogs/Omega/value"] = [omega, omega]
+        entry.create_group("DASlogs/SequenceName")["value"] = [b"alignment", sequence_name.encode()]
+
+
+def test_read_run_metadata():
+    """Test the metadata read from a raw data file"""
+    filename = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data/raw/HYS_178921.nxs.h5")
+    metadata = read_run_metadata(filename)
+    assert metadata["run_number"] == 178921
+    # in microAmp hour
+    assert metadata["proton_charge"] == pytest.approx(2.00238828e11 / 3.6e9)
+    assert metadata["daslogs"]["omega"]["average_value"] == pytest.approx(19.00702329)
+    assert metadata["daslogs"]["s2"]["average_value"] == pytest.approx(-33.00742398)
+    assert metadata["daslogs"]["energyrequest"]["average_value"] == pytest.approx(25)
+    assert "sequencename" not in metadata["daslogs"]
+
+
+def test_get_number_of_events(tmp_path):
+    """Test the number of events read from the size of the event banks, or from the total counts"""
+    raw_data_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data/raw")
+    assert read_number_of_events(os.path.join(raw_data_folder, "HYS_178921.nxs.h5")) == 26938
+    # no event banks
+    assert read_number_of_events(os.path.join(raw_data_folder, "HYS_371495.nxs.h5")) == 6962
+
+    (tmp_path / "CNCS_1.nxs.h5").write_bytes(b"not a NeXus file")
+    filenames = [os.path.join(raw_data_folder, name) for name in ("HYS_178921.nxs.h5", "HYS_178922.nxs.h5")]
+    assert get_number_of_events(filenames + [str(tmp_path / "CNCS_1.nxs.h5")]) == 26938 + 21504
+
+
+def test_run_index(tmp_path, monkeypatch):
+    """Test the incremental update of the run index and the dataset grouping from it"""
+    directory = tmp_path / "nexus"
+    directory.mkdir()
+    for run, omega, sequence_name in [(1, 0.0, "dataset"), (2, 0.01, "dataset"), (3, 1.0, "dataset"), (4, 0, "other")]:
+        create_raw_file(directory / f"CNCS_{run}.nxs.h5", run, omega, sequence_name)
+    (directory / "CNCS_5.nxs.h5").write_bytes(b"not a NeXus file")
+
+    read = []
+
+    def counting_read(filename, logs):
+        read.append(os.path.basename(filename))
+        return read_run_metadata(filename, logs)
+
+    monkeypatch.setattr(run_index, "read_run_metadata", counting_read)
+
+    index = RunIndex(str(tmp_path / "run_index.sqlite"), max_workers=1)
+    assert index.update(str(directory)) == 5
+    assert sorted(read) == [f"CNCS_{run}.nxs.h5" for run in range(1, 6)]
+    # the file that could not be read is not listed
+    runs = index.runs(str(directory))
+    assert [run["run_number"] for run in runs] == [1, 2, 3, 4]
+    assert runs[0]["location"] == str(directory / "CNCS_1.nxs.h5")
+    assert runs[0]["daslogs"]["sequencename"] == {"value": "dataset"}
+
+    # nothing changed
+    read.clear()
+    assert index.update(str(directory)) == 0
+    assert not read
+
+    # modified, new and deleted files
+    create_raw_file(directory / "CNCS_4.nxs.h5", 4, 1.01, "dataset")
+    os.utime(directory / "CNCS_4.nxs.h5", ns=(0, 0))
+    create_raw_file(directory / "CNCS_6.nxs.h5", 6, 5.0, "dataset")
+    os.remove(directory / "CNCS_2.nxs.h5")
+    assert index.update(str(directory)) == 2
+    assert sorted(read) == ["CNCS_4.nxs.h5", "CNCS_6.nxs.h5"]
+    assert [run["run_number"] for run in index.runs(str(directory))] == [1, 3, 4, 6]
+
+    # a log that was not indexed yet, the other logs are kept
+    read.clear()
+    assert index.update(str(directory), logs=("omega", "phi")) == 5
+    assert index.update(str(directory)) == 0
+
+    # the datasets and the angle grouping, as from ONCat
+    agent = LocalONCat(str(directory), index)
+    parameters = {"login": agent, "ipts_number": None, "instrument": "CNCS"}
+    assert get_dataset_names(**parameters) == ["dataset"]
+    assert get_dataset_info(dataset_name="dataset", group_by_angle=True, angle_bin=0.5, **parameters) == [
+        [str(directory / "CNCS_1.nxs.h5")],
+        [str(directory / "CNCS_3.nxs.h5"), str(directory / "CNCS_4.nxs.h5")],
+        [str(directory / "CNCS_6.nxs.h5")],
+    ]
+
+
+def test_get_proton_charges(tmp_path, monkeypatch):
+    """Test the proton charges read from the run index, reading only the new and modified files"""
+    filenames = []
+    for run in range(4):
+        filenames.append(str(tmp_path / f"CNCS_{run}.nxs.h5"))
+        create_raw_file(filenames[-1], run, 0.0, "background", proton_charge=3.6e9 * (10 + run))
+    (tmp_path / "CNCS_4.nxs.h5").write_bytes(b"not a NeXus file")
+    # the other files of the directory are not read
+    create_raw_file(tmp_path / "CNCS_5.nxs.h5", 5, 0.0, "sample")
+
+    read = []
+
+    def counting_read(filename, logs):
+        read.append(os.path.basename(filename))
+        return read_run_metadata(filename, logs)
+
+    monkeypatch.setattr(run_index, "read_run_metadata", counting_read)
+
+    index = RunIndex(str(tmp_path / "run_index.sqlite"), max_workers=1)
+    charges = get_proton_charges(filenames + [str(tmp_path / "CNCS_4.nxs.h5")], index)
+    assert charges == pytest.approx({filename: 10 + run for run, filename in enumerate(filenames)})
+    assert sorted(read) == [f"CNCS_{run}.nxs.h5" for run in range(5)]
+
+    # the charges are cached
+    read.clear()
+    assert get_proton_charges(filenames, index) == charges
+    assert not read
+
+    create_raw_file(filenames[0], 0, 0.0, "background", proton_charge=3.6e9 * 20)
+    os.utime(filenames[0], ns=(0, 0))
+    assert get_proton_charges(filenames, index)[filenames[0]] == pytest.approx(20)
+    assert read == ["CNCS_0.nxs.h5"]
@@ -1,12 +1,15 @@
 #!/usr/bin/env python
 """Test save methods in histogram model."""
 
+import gzip
 import os
 
+import h5py
+import numpy as np
 import pytest
-from mantid.simpleapi import CreateMDHistoWorkspace, LoadMD  # pylint: disable=no-name-in-module
+from mantid.simpleapi import CreateMDHistoWorkspace, LoadMD, mtd  # pylint: disable=no-name-in-module
 
-from shiver.models.histogram import HistogramModel
+from shiver.models.histogram import HistogramModel, dim2array
 
 
 def test_save_to_ascii(tmp_path):
@@ -34,6 +37,88 @@ def test_save_to_ascii(tmp_path):
         assert "# Binning" in content
 
 
+def test_save_to_ascii_chunks_and_compression(tmp_path):
+    """Test that the chunked and compressed ASCII files have the same content as np.savetxt."""
+    filename = os.path.join(
+        os.path.dirname(__file__),
+        "../data/hist",
+        "plot_1.nxs.h5",
+    )
+    LoadMD(filename, OutputWorkspace="plot_1")
+    workspace = mtd["plot_1"]
+
+    # reference file written at once with np.savetxt
+    dims = [workspace.getDimension(i) for i in range(workspace.getNumDims())]
+    newdimarrays = np.meshgrid(*[dim2array(d) for d in dims], indexing="ij")
+    to_print = np.c_[workspace.getSignalArray().flatten(), np.sqrt(workspace.getErrorSquaredArray()).flatten()]
+    for dim in newdimarrays:
+        to_print = np.c_[to_print, dim.flatten()]
+    header = "Intensity Error " + " ".join([d.name for d in dims])
+    header += "\n shape: " + "x".join([str(d.getNBins()) for d in dims])
+    reference_filename = str(tmp_path / "reference.dat")
+    np.savetxt(reference_filename, to_print, fmt="%.6e", header=header)
+    with open(reference_filename, "r", encoding="utf-8") as f:
+        reference = f.read().split("\n")
+    reference = reference[reference.index("# Intensity Error " + " ".join([d.name for d in dims])) :]
+
+    model = HistogramModel()
+
+    # chunks smaller than the workspace, and not a divisor of its size
+    save_filename = str(tmp_path / "test_save_to_ascii_chunks.dat")
+    model.save_to_ascii("plot_1", save_filename, chunk_size=7)
+    with open(save_filename, "r", encoding="utf-8") as f:
+        content = f.read()
+    assert "# Name: plot_1\n" in content
+    content = content.split("\n")
+    assert content[content.index(reference[0]) :] == reference
+
+    # compression from the file extension
+    save_filename = str(tmp_path / "test_save_to_ascii.dat.gz")
+    model.save_to_ascii("plot_1", save_filename)
+    with gzip.open(save_filename, "rt", encoding="utf-8") as f:
+        content = f.read().split("\n")
+    assert content[content.index(reference[0]) :] == reference
+
+
+def test_save_to_hdf5(tmp_path):
+    """Unit test for exporting MDHistoWorkspace to an HDF5 file."""
+    filename = os.path.join(
+        os.path.dirname(__file__),
+        "../data/hist",
+        "plot_1.nxs.h5",
+    )
+    LoadMD(filename, OutputWorkspace="plot_1")
+    workspace = mtd["plot_1"]
+
+    model = HistogramModel()
+
+    for compress in (False, True):
+        save_filename = str(tmp_path / f"test_save_to_hdf5_{compress}.h5")
+        model.save_to_hdf5("plot_1", save_filename, compress=compress)
+
+        with h5py.File(save_filename, "r") as data:
+            np.testing.assert_array_equal(data["signal"][()], workspace.getSignalArray())
+            np.testing.assert_array_equal(data["error"][()], np.sqrt(workspace.getErrorSquaredArray()))
+            np.testing.assert_array_equal(data["num_events"][()], workspace.getNumEventsArray())
+            assert list(data.attrs["dimension_names"]) == [
+                workspace.getDimension(i).name for i in range(workspace.getNumDims())
+            ]
+            for i in range(workspace.getNumDims()):
+                assert len(data[f"dim{i}_edges"]) == workspace.getDimension(i).getNBins() + 1
+            assert "Name: plot_1\n" in data.attrs["header"]
+            assert "Binning" in data.attrs["header"]
+            offset = data["signal"].id.get_offset()
+            shape = data["signal"].shape
+
+        if compress:
+            # chunked datasets have no single offset
+            assert offset is None
+        else:
+            # loaded without copy
+            signal = np.memmap(save_filename, dtype=np.float64, mode="r", offset=offset, shape=shape)
+            np.testing.assert_array_equal(signal, workspace.getSignalArray())
+
+
 def test_save_to_ascii_invalid_workspace():
     """Unit test for exporting invalid workspace to ASCII file."""
     model = HistogramModel()
@@ -127,6 +127,57 @@ def test_advanced_options_apply_filter_valid_inputs(qtbot):
     dialog.close()
 
 
+def test_advanced_options_compression_and_box_splitting(qtbot):
+    """Test for the event compression and box splitting inputs in advanced dialog"""
+    dialog = AdvancedDialog()
+    dialog.show()
+
+    # default case
+    dict_data = dialog.get_advanced_options_dict()
+    assert dict_data["CompressEvents"] is False
+    assert dialog.compress_tolerance_input.isVisible() is False
+    for key in ("CompressEventsTolerance", "SplitInto", "SplitThreshold", "MaxRecursionDepth"):
+        assert dict_data[key] is None
+
+    # compress with the automatic tolerance
+    qtbot.mouseClick(dialog.compress_check, QtCore.Qt.LeftButton)
+    assert dialog.compress_tolerance_input.isVisible() is True
+    dict_data = dialog.get_advanced_options_dict()
+    assert dict_data["CompressEvents"] is True
+    assert dict_data["CompressEventsTolerance"] is None
+    qtbot.keyClicks(dialog.compress_tolerance_input, "0.5")
+    assert dialog.get_advanced_options_dict()["CompressEventsTolerance"] == "0.5"
+
+    # box splitting
+    qtbot.keyClicks(dialog.split_into_input, "4,")
+    assert len(dialog.invalid_fields) == 1
+    qtbot.keyClicks(dialog.split_into_input, "4,4,2")
+    assert len(dialog.invalid_fields) == 0
+    qtbot.keyClicks(dialog.split_threshold_input, "500")
+    qtbot.keyClicks(dialog.depth_input, "5")
+    dict_data = dialog.get_advanced_options_dict()
+    assert dict_data["SplitInto"] == "4,4,4,2"
+    assert dict_data["SplitThreshold"] == "500"
+    assert dict_data["MaxRecursionDepth"] == "5"
+
+    # automatic depth
+    qtbot.mouseClick(dialog.depth_auto_check, QtCore.Qt.LeftButton)
+    assert dialog.depth_input.isEnabled() is False
+    dict_data = dialog.get_advanced_options_dict()
+    assert dict_data["MaxRecursionDepth"] == "auto"
+    dialog.close()
+
+    # populate from the dictionary
+    dialog = AdvancedDialog()
+    dialog.populate_advanced_options_from_dict(dict_data)
+    assert dialog.compress_check.isChecked() is True
+    assert dialog.compress_tolerance_input.text() == "0.5"
+    assert dialog.split_into_input.text() == "4,4,4,2"
+    assert dialog.depth_auto_check.isChecked() is True
+    assert dialog.get_advanced_options_dict() == dict_data
+    dialog.close()
+
+
 def test_advanced_options_apply_tib_valid_input(qtbot):
     """Test for adding valid tib inputs in advanced dialog"""
     dialog = AdvancedDialog()
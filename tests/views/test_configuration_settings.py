@@ -39,11 +39,11 @@ def test_populate_fields(qtbot, monkeypatch, user_conf_file):
     assert dialog.isVisible()
 
     # the total number of sections at the moment
-    total_sections = 6
+    total_sections = 8
     assert dialog.fields_layout.count() == total_sections
 
     # the total number of fields at the moment
-    total_variables = 16
+    total_variables = 23
     variables = []
     sections = []
     for i in range(total_sections):
@@ -55,6 +55,7 @@ def test_populate_fields(qtbot, monkeypatch, user_conf_file):
     assert "software.info" in sections
     assert "generate_tab.oncat" in sections
     assert "generate_tab.parameters" in sections
+    assert "main_tab.load_mde" in sections
 
     assert "keep_logs" in variables
     assert "oncat_url" in variables
@@ -80,7 +81,7 @@ def test_apply_button(qtbot, monkeypatch, user_conf_file):
     assert dialog.isVisible()
 
     # the total number of sections at the moment
-    total_sections = 6
+    total_sections = 8
     assert dialog.fields_layout.count() == total_sections
 
     # the total number of fields at the moment
@@ -178,7 +179,7 @@ def test_reset_button(qtbot, monkeypatch, user_conf_file):  # noqa: R0912 pylint
     assert dialog.isVisible()
 
     # the total number of sections at the moment
-    total_sections = 6
+    total_sections = 8
     assert dialog.fields_layout.count() == total_sections
 
     # the total number of fields at the moment
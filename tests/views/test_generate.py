@@ -66,9 +66,12 @@ def test_mde_type_widget(qtbot):
         "mde_name": "test",
         "output_dir": "/tmp/test",
         "mde_type": "Background (angle integrated)",
+        "mde_append": False,
     }
     #
     assert rst_dict == ref_dict
+    # append is only possible for data
+    assert not mde_type_widget.mde_append.isEnabled()
 
     # check happy path (dict -> ui)
     mde_type_widget.re_init_widget()
@@ -82,8 +85,11 @@ def test_mde_type_widget(qtbot):
 
     #
     ref_dict["mde_type"] = "Data"
+    ref_dict["mde_append"] = True
     mde_type_widget.populate_from_dict(ref_dict)
     assert mde_type_widget.mde_type_data.isChecked() is True
+    assert mde_type_widget.as_dict() == ref_dict
+    ref_dict["mde_append"] = False
     assert len(generate.field_errors[generate.buttons.save_btn]) == 0
     assert len(generate.field_errors[generate.buttons.generate_btn]) == 0
     #
@@ -208,7 +214,7 @@ def test_generate_widget_colors_valid(qtbot):
     assert len(generate.field_errors[generate.buttons.save_btn]) == 1
 
     # set files
-    assert raw_data_widget.files.count() == 0
+    assert raw_data_widget.file_model.rowCount() == 0
 
     directory = os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data/raw"))
     files = ("HYS_178922.nxs.h5", "HYS_178923.nxs.h5", "HYS_178926.nxs.h5")
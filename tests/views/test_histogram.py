@@ -17,7 +17,16 @@ from mantid.simpleapi import (  # pylint: disable=no-name-in-module, wrong-impor
 )
 from qtpy.QtCore import Qt, QTimer
 from qtpy.QtGui import QContextMenuEvent
-from qtpy.QtWidgets import QApplication, QErrorMessage, QInputDialog, QLineEdit, QMenu, QMessageBox, QTextEdit
+from qtpy.QtWidgets import (
+    QApplication,
+    QErrorMessage,
+    QInputDialog,
+    QLineEdit,
+    QMenu,
+    QMessageBox,
+    QTextEdit,
+    QWidget,
+)
 
 from shiver.views.histogram import Histogram
 from shiver.views.workspace_tables import NormList
@@ -34,8 +43,9 @@ def test_histogram(qtbot, shiver_app):
         ),
         OutputWorkspace="data",
     )
-    # check
+    # check, the lists are updated on a timer
     med_list = shiver.main_window.histogram.input_workspaces.mde_workspaces
+    qtbot.waitUntil(lambda: med_list.count() == 1, timeout=2000)
     assert med_list.count() == 1
     assert med_list.item(0).text() == "data"
 
@@ -43,7 +53,7 @@ def test_histogram(qtbot, shiver_app):
     CreateSampleWorkspace(OutputWorkspace="ws2d", BinWidth=20000)
     # check
     norm_list = shiver.main_window.histogram.input_workspaces.norm_workspaces
-    assert norm_list.count() == 1
+    qtbot.waitUntil(lambda: norm_list.count() == 1, timeout=2000)
     assert norm_list.item(0).text() == "ws2d"
 
     # mdh workspace
@@ -68,8 +78,7 @@ def test_histogram(qtbot, shiver_app):
     )
     # check that the workspace
     histogram_list = shiver.main_window.histogram.histogram_workspaces.histogram_workspaces
-    qtbot.wait(100)
-    assert histogram_list.count() == 1
+    qtbot.waitUntil(lambda: histogram_list.count() == 1, timeout=2000)
     assert histogram_list.item(0).text() == "line"
 
 
@@ -551,7 +560,7 @@ def test_populate_ui_from_history_dict_multi_nsf(shiver_app):
     assert config_dict == ref_dict
 
 
-def test_load_dataset_presenter(shiver_app):
+def test_load_dataset_presenter(qtbot, shiver_app):
     """Test the load dataset presenter."""
     shiver = shiver_app
     histogram_presenter = shiver.main_window.histogram_presenter
@@ -578,7 +587,9 @@ def test_load_dataset_presenter(shiver_app):
     }
 
     # load the dataset
-    histogram_presenter.load_dataset(dataset_dict)
+    loading = histogram_presenter.load_dataset(dataset_dict)
+    loading.result(timeout=60)
+    qtbot.waitUntil(lambda: histogram_view.get_selected_normalization() == "TiZr", timeout=5000)
 
     # verify
     workspace_data = histogram_view.gather_workspace_data()
@@ -588,5 +599,71 @@ def test_load_dataset_presenter(shiver_app):
     assert histogram_view.get_selected_normalization() == "TiZr"
 
 
+def test_load_dataset_presenter_error(qtbot, shiver_app, tmp_path):
+    """Test that the dataset loading errors are shown, and the selection is not changed"""
+    shiver = shiver_app
+    histogram_presenter = shiver.main_window.histogram_presenter
+    histogram_view = shiver.main_window.histogram
+
+    errors = []
+    histogram_view.error_message_signal.disconnect()
+    histogram_view.error_message_signal.connect(errors.append)
+
+    loading = histogram_presenter.load_dataset(
+        {"MdeName": None, "NormalizationDataFile": str(tmp_path / "missing.nxs")}
+    )
+    with pytest.raises(ValueError):
+        loading.result(timeout=60)
+    qtbot.waitUntil(lambda: len(errors) == 1, timeout=5000)
+    assert "missing.nxs" in errors[0]
+    assert histogram_view.get_selected_normalization() is None
+
+
+def test_corrections_progress_presenter(qtbot, shiver_app):
+    """Test the progress and the cancellation of the corrections running in the background"""
+    shiver = shiver_app
+    histogram_presenter = shiver.main_window.histogram_presenter
+    histogram_view = shiver.main_window.histogram
+    assert histogram_view.corrections_status.isHidden()
+
+    LoadMD(
+        Filename=os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "../data/mde/merged_mde_MnO_25meV_5K_unpol_178921-178926.nxs"
+        ),
+        OutputWorkspace="data",
+    )
+    histogram_view.input_workspaces.mde_workspaces.set_corrections("data")
+    corrections_table = shiver.main_window.findChild(QWidget, "Corrections - data")
+    corrections_table.debye_waller_correction.setChecked(True)
+    corrections_table.u2.setText("1.2")
+    corrections_table.apply_button.click()
+
+    # the progress bar is complete and hidden once the corrections are finished
+    qtbot.waitUntil(lambda: mtd.doesExist("data_DWF"), timeout=30000)
+    qtbot.waitUntil(histogram_view.corrections_status.isHidden, timeout=5000)
+    assert histogram_view.corrections_progress.value() == 100
+
+    class RunningModel:
+        """Corrections model with a running job"""
+
+        algorithm_running = True
+        cancelled = False
+
+        def cancel(self):
+            self.cancelled = True
+
+    model = RunningModel()
+    histogram_presenter.corrections_models.add(model)
+    histogram_presenter.corrections_progress(0.5, "DebyeWallerFactorCorrectionMD")
+    assert not histogram_view.corrections_status.isHidden()
+    assert histogram_view.corrections_progress.value() == 50
+
+    qtbot.mouseClick(histogram_view.cancel_corrections_btn, Qt.LeftButton)
+    assert model.cancelled
+    model.algorithm_running = False
+    histogram_presenter.corrections_progress(1.0, "Corrections of data cancelled")
+    assert histogram_view.corrections_status.isHidden()
+
+
 if __name__ == "__main__":
     pytest.main([__file__])
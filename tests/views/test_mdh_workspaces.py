@@ -107,6 +107,26 @@ def test_mdh_workspaces_menu(qtbot):
         mdh_table.viewport(), QContextMenuEvent(QContextMenuEvent.Mouse, mdh_table.visualItemRect(item).center())
     )
 
+    # right-click first item and select "Save HDF5 Data"
+    save_hdf5 = []
+
+    def save_hdf5_callback(name, filename):
+        save_hdf5.append((name, filename))
+
+    mdh_table.save_to_hdf5_callback = save_hdf5_callback
+
+    QTimer.singleShot(100, partial(handle_menu, qtbot, mdh_table, 8))
+    QTimer.singleShot(200, partial(handle_dialog, "workspace"))
+
+    QApplication.postEvent(
+        mdh_table.viewport(), QContextMenuEvent(QContextMenuEvent.Mouse, mdh_table.visualItemRect(item).center())
+    )
+
+    qtbot.wait(500)
+    assert len(save_hdf5) == 1
+    assert save_hdf5[0][0] == "mdh1"
+    assert save_hdf5[0][1].endswith("workspace.h5")
+
     # right-click first item and select "Delete"
     deleted = []
 
@@ -118,7 +138,7 @@ def test_mdh_workspaces_menu(qtbot):
     item = mdh_table.item(0)
     assert item.text() == "mdh1"
 
-    QTimer.singleShot(100, partial(handle_menu, qtbot, mdh_table, 8))
+    QTimer.singleShot(100, partial(handle_menu, qtbot, mdh_table, 9))
 
     QApplication.postEvent(
         mdh_table.viewport(), QContextMenuEvent(QContextMenuEvent.Mouse, mdh_table.visualItemRect(item).center())
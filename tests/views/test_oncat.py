@@ -2,10 +2,13 @@
 # pylint: disable=all
 """Test the views for the ONCat application."""
 
+import os
+
 import pytest
 from qtpy.QtCore import Signal
 from qtpy.QtWidgets import QGroupBox, QLabel
 
+from shiver.models.run_index import RunIndex
 from shiver.views.oncat import (
     Oncat,
     get_data_from_oncat,
@@ -87,6 +90,53 @@ def test_oncat(monkeypatch, qtbot):
     assert oncat.get_facility() == "SNS"
 
 
+def test_oncat_local_run_index(monkeypatch, qtbot, tmp_path):
+    """Test the datasets from the local run index when not connected to ONCat."""
+
+    class MockLogin(QGroupBox):
+        connection_updated = Signal(bool)
+        status_label = QLabel("Test")
+
+        def __init__(self, *args, parent, **kwargs):
+            super().__init__(parent=parent)
+            self.is_connected = False
+
+        def get_agent_instance(self):
+            return None
+
+    monkeypatch.setattr("shiver.views.oncat.ONCatLogin", MockLogin)
+
+    oncat = Oncat()
+    qtbot.addWidget(oncat)
+    oncat.run_index = RunIndex(str(tmp_path / "run_index.sqlite"))
+    assert not oncat.has_datasets
+    assert oncat.dataset.count() == 0
+
+    directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data/raw")
+    oncat.set_local_directory(directory)
+    # the directory is indexed in the background
+    assert not oncat.has_datasets
+    qtbot.waitUntil(lambda: oncat.has_datasets, timeout=30000)
+    assert [run["run_number"] for run in oncat.run_index.runs(directory)] == [
+        178921,
+        178922,
+        178923,
+        178925,
+        178926,
+        371495,
+    ]
+    # the test files have no sequence name
+    assert oncat.dataset.count() == 1
+    assert oncat.get_dataset() == "custom"
+    assert oncat.get_suggested_selected_files() == []
+
+    # a new angle process variable is indexed in the background too
+    assert oncat.get_suggested_selected_files(update_angle_pv=True, angle_pv="s1") == []
+    assert not oncat.has_datasets
+    qtbot.waitUntil(lambda: oncat.has_datasets, timeout=30000)
+    assert oncat.get_dataset() == "custom"
+
+
 def test_get_data_from_oncat():
     """Use mock to test get_data_from_oncat."""
 
@@ -432,3 +482,37 @@ def test_get_dataset_info_sort_by_s2(monkeypatch):
 
 if __name__ == "__main__":
     pytest.main(["-v", __file__])
+
+
+def test_get_dataset_info_index_cache(monkeypatch):
+    """Test that the runs are grouped again with another angle bin without querying OnCat"""
+
+    queries = []
+
+    def mock_get_data_from_oncat(*args, **kwargs):
+        queries.append(args)
+        return [
+            {
+                "location": f"/tmp/a{run}",
+                "indexed": {"run_number": run},
+                "metadata": {"entry": {"daslogs": {"sequencename": {"value": "a"}, "omega": {"average_value": angle}}}},
+            }
+            for run, angle in [(1, 0.0), (2, 0.1), (3, 1.0), (4, 1.1)]
+        ]
+
+    monkeypatch.setattr("shiver.views.oncat.get_data_from_oncat", mock_get_data_from_oncat)
+
+    index_cache = {}
+    parameters = {
+        "login": "login",
+        "ipts_number": "ipts",
+        "instrument": "inst",
+        "dataset_name": "a",
+        "group_by_angle": True,
+        "index_cache": index_cache,
+    }
+    assert get_dataset_info(angle_bin=0.5, **parameters) == [["/tmp/a1", "/tmp/a2"], ["/tmp/a3", "/tmp/a4"]]
+    assert get_dataset_info(angle_bin=2.0, **parameters) == [["/tmp/a1", "/tmp/a2", "/tmp/a3"], ["/tmp/a4"]]
+    assert get_dataset_info(angle_bin=0.1, **parameters) == [["/tmp/a1"], ["/tmp/a2"], ["/tmp/a3"], ["/tmp/a4"]]
+    assert len(queries) == 1
+    assert len(index_cache) == 1
@@ -5,7 +5,7 @@ import os
 import pytest
 from qtpy import QtCore, QtWidgets
 
-from shiver.views.data import RawData, _extract_run_number, filename_str_to_list, parse_run_numbers
+from shiver.views.data import DirectoryScanner, RawData, _extract_run_number, filename_str_to_list, parse_run_numbers
 
 
 def test_raw_data_get_selection(qtbot):
@@ -15,7 +15,7 @@ def test_raw_data_get_selection(qtbot):
     qtbot.addWidget(raw_data)
     raw_data.show()
 
-    assert raw_data.files.count() == 0
+    assert raw_data.file_model.rowCount() == 0
 
     directory = os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data/raw"))
 
@@ -35,26 +35,27 @@ def test_raw_data_get_selection(qtbot):
     raw_data.browse.click()
 
     qtbot.wait(200)
+    qtbot.waitUntil(lambda: not raw_data.scanning)
 
-    assert raw_data.files.count() == 8
+    assert raw_data.file_model.rowCount() == 8
     assert raw_data.get_selected() == []
 
     # select 2nd and 4th items
 
     qtbot.wait(100)
 
-    item = raw_data.files.item(1)
-    assert item.text() == "HYS_178922.nxs.h5"
-    qtbot.mouseClick(raw_data.files.viewport(), QtCore.Qt.LeftButton, pos=raw_data.files.visualItemRect(item).center())
+    item = raw_data.file_model.index(1)
+    assert item.data() == "HYS_178922.nxs.h5"
+    qtbot.mouseClick(raw_data.files.viewport(), QtCore.Qt.LeftButton, pos=raw_data.files.visualRect(item).center())
     qtbot.wait(100)
 
-    item = raw_data.files.item(3)
-    assert item.text() == "HYS_178924.nxs.h5"
+    item = raw_data.file_model.index(3)
+    assert item.data() == "HYS_178924.nxs.h5"
     qtbot.mouseClick(
         raw_data.files.viewport(),
         QtCore.Qt.LeftButton,
         modifier=QtCore.Qt.KeyboardModifier.ControlModifier,
-        pos=raw_data.files.visualItemRect(item).center(),
+        pos=raw_data.files.visualRect(item).center(),
     )
     qtbot.wait(100)
 
@@ -71,25 +72,25 @@ def test_raw_data_editing_path(qtbot):
     qtbot.addWidget(raw_data)
     raw_data.show()
 
-    assert raw_data.files.count() == 0
+    assert raw_data.file_model.rowCount() == 0
 
     directory = os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data/raw"))
 
     qtbot.keyClicks(raw_data.path, directory)
     qtbot.keyClick(raw_data.path, QtCore.Qt.Key_Enter)
 
-    qtbot.wait(100)
+    qtbot.waitUntil(lambda: not raw_data.scanning)
 
-    assert raw_data.files.count() == 8
+    assert raw_data.file_model.rowCount() == 8
     assert raw_data.get_selected() == []
 
     # Add non-existing path, make sure list is empty
     qtbot.keyClicks(raw_data.path, "/does/not/exist")
     qtbot.keyClick(raw_data.path, QtCore.Qt.Key_Enter)
 
-    qtbot.wait(100)
+    qtbot.waitUntil(lambda: not raw_data.scanning)
 
-    assert raw_data.files.count() == 0
+    assert raw_data.file_model.rowCount() == 0
     assert raw_data.get_selected() == []
 
 
@@ -99,21 +100,23 @@ def test_raw_data_set_selection(qtbot):
     qtbot.addWidget(raw_data)
     raw_data.show()
 
-    assert raw_data.files.count() == 0
+    assert raw_data.file_model.rowCount() == 0
 
     directory = os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data/raw"))
     files = ("HYS_178922.nxs.h5", "HYS_178923.nxs.h5", "HYS_178926.nxs.h5")
     filenames = [os.path.join(directory, f) for f in files]
 
     raw_data.set_selected(filenames)
+    # the selection is applied at the end of the scan
+    assert raw_data.get_selected() == filenames
 
-    qtbot.wait(100)
+    qtbot.waitUntil(lambda: not raw_data.scanning)
 
-    assert raw_data.files.count() == 8
-    selected = raw_data.files.selectedItems()
+    assert raw_data.file_model.rowCount() == 8
+    selected = raw_data.selected_names()
     assert len(selected) == 3
-    for item in selected:
-        assert item.text() in files
+    for name in selected:
+        assert name in files
 
     assert raw_data.get_selected() == filenames
 
@@ -205,6 +208,7 @@ def test_manual_selection_select(qtbot):
 
     directory = os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data/raw"))
     raw_data._update_file_list(directory)
+    qtbot.waitUntil(lambda: not raw_data.scanning)
 
     # Buttons disabled when field is empty
     assert not raw_data.manual_select.isEnabled()
@@ -223,7 +227,7 @@ def test_manual_selection_select(qtbot):
 
     # Clicking Select selects only the matching files
     raw_data.manual_select.click()
-    selected = sorted(item.text() for item in raw_data.files.selectedItems())
+    selected = raw_data.selected_names()
     assert selected == ["HYS_178922.nxs.h5", "HYS_178923.nxs.h5", "HYS_178924.nxs.h5"]
 
 
@@ -235,13 +239,67 @@ def test_manual_selection_deselect(qtbot):
     directory = os.path.realpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../data/raw"))
     # Preselect runs 178921-178924
     raw_data.set_selected([os.path.join(directory, f"HYS_{r}.nxs.h5") for r in range(178921, 178925)])
+    qtbot.waitUntil(lambda: not raw_data.scanning)
 
     # Deselect 178922 and 178923, leaving 178921 and 178924 selected
     raw_data.manual_selection.setText("178922-178923")
     raw_data.manual_deselect.click()
-    selected = sorted(item.text() for item in raw_data.files.selectedItems())
+    selected = raw_data.selected_names()
     assert selected == ["HYS_178921.nxs.h5", "HYS_178924.nxs.h5"]
 
 
+def test_raw_data_model_sort(qtbot):
+    """Test that the files are sorted by run number at the end of the scan, keeping the selection"""
+    raw_data = RawData()
+    qtbot.addWidget(raw_data)
+
+    model = raw_data.file_model
+    model.add_files(["INST_10.nxs.h5", "INST_9.nxs.h5"])
+    model.add_files(["notes.nxs.h5", "INST_100_event.nxs"])
+    assert model.rowCount() == 4
+    raw_data.files.selectionModel().select(model.index(0), QtCore.QItemSelectionModel.Select)
+    assert raw_data.selected_names() == ["INST_10.nxs.h5"]
+
+    model.sort()
+    assert [model.index(row).data() for row in range(4)] == [
+        "INST_9.nxs.h5",
+        "INST_10.nxs.h5",
+        "INST_100_event.nxs",
+        "notes.nxs.h5",
+    ]
+    assert raw_data.selected_names() == ["INST_10.nxs.h5"]
+    assert model.rows_of_runs([9, 100]) == [0, 2]
+
+
+def test_raw_data_scan_cancel(qtbot, tmp_path):
+    """Test that a new directory cancels the scan of the previous one"""
+    for run in range(1200):
+        (tmp_path / f"INST_{run}.nxs.h5").touch()
+    (tmp_path / "INST_1.txt").touch()
+    (tmp_path / ".INST_2.nxs.h5").touch()
+
+    # batches of names, then the end of the scan
+    batches = []
+    scanner = DirectoryScanner(str(tmp_path), 1, lambda generation, names: batches.append((generation, names)))
+    scanner.start()
+    scanner.thread.join()
+    assert [len(names) for _, names in batches[:-1]] == [500, 500, 200]
+    assert batches[-1] == (1, None)
+
+    raw_data = RawData()
+    qtbot.addWidget(raw_data)
+    raw_data._update_file_list(str(tmp_path))
+    raw_data._update_file_list("/does/not/exist")
+    qtbot.waitUntil(lambda: not raw_data.scanning)
+    qtbot.wait(100)
+    assert raw_data.file_model.rowCount() == 0
+
+    raw_data.set_selected([str(tmp_path / "INST_5.nxs.h5"), str(tmp_path / "INST_1000.nxs.h5")])
+    qtbot.waitUntil(lambda: not raw_data.scanning)
+    assert raw_data.file_model.rowCount() == 1200
+    assert raw_data.file_model.index(5).data() == "INST_5.nxs.h5"
+    assert raw_data.selected_names() == ["INST_5.nxs.h5", "INST_1000.nxs.h5"]
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])